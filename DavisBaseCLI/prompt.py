@@ -27,8 +27,11 @@ CREATE = "create"
 SELECT = "select"
 TABLE = "table"
 INDEX = "index"
+VACUUM = "vacuum"
+STATS = "stats"
 
-davis_base = DavisBase()
+# opened by main, so importing the module does not open the database in the data folder
+davis_base: DavisBase = None
 
 
 # Method to display the splash screen
@@ -67,103 +70,142 @@ def parseCreateTable(tableName, columnInformationString):
     # print(str(parsedColumnInfoList))
 
 
-# Method to parse table name, list of columns and values to be inserted for those columns
-def parseInsert(commandTokens):
-    columnList = commandTokens[3].split(",")
-    tableName = commandTokens[2]
-    valueList = commandTokens[-1].split(",")
-    insertHandler(tableName, valueList, columnList)
-
-
-# Stub method to handle the actions of insert based on table name and column value mapping
-def insertHandler(tableName, valueList, columnList=None):
-    # print("Table name: " + tableName)
-    # print("Value list: " + str(valueList))
-    # print("Column list: " + str(columnList))
-    davis_base.insert(tableName, valueList, columnList)
-
-
-# Method to parse table name, condition1, operator and condition2
+# Method to parse a value of INSERT, UPDATE or WHERE into the value stored, quotes around a text are dropped
+def parseValue(valueString):
+    value = valueString.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    return value
+
+
+# Method to parse table name, list of columns and the rows of values to be inserted for those columns
+# insert into <table_name> [(<column_list>)] values (<value_list>)[, (<value_list>)...]
+def parseInsert(queryString):
+    columnsPart, valuesPart = queryString.replace(";", "").split(" values", 1)
+    tableName = columnsPart.split("(")[0].split(" ")[2]
+    columnList = None
+    if "(" in columnsPart:
+        columnList = [column.strip() for column in re.findall(r'\(([^)]+)', columnsPart)[0].split(",")]
+    rows = [[parseValue(value) for value in values.split(",")] for values in re.findall(r'\(([^)]+)', valuesPart)]
+    insertHandler(tableName, rows, columnList)
+
+
+# Method to handle the actions of insert based on table name and column value mapping, all the rows of the statement
+# are inserted as one batch
+def insertHandler(tableName, rows, columnList=None):
+    davis_base.insert_many(tableName, rows, columnList)
+
+
+# Method to parse a where clause into the condition tree taken by DavisBase. NOT binds tighter than AND and AND
+# tighter than OR, parentheses group conditions.
+# <condition> is <column_name> <operator> <value> or <column_name> IS [NOT] NULL
+def parseWhere(whereString):
+    tokens = re.findall("\\(|\\)|<>|!=|>=|<=|=|<|>|'[^']*'|\"[^\"]*\"|[^\\s()<>=!]+", whereString)
+    where, position = parseOr(tokens, 0)
+    if position != len(tokens):
+        raise ValueError("Unexpected " + tokens[position] + " in where clause")
+    return where
+
+
+def parseOr(tokens, position):
+    conditions = []
+    condition, position = parseAnd(tokens, position)
+    conditions.append(condition)
+    while position < len(tokens) and tokens[position] == "or":
+        condition, position = parseAnd(tokens, position + 1)
+        conditions.append(condition)
+    return (conditions[0] if len(conditions) == 1 else ("or", conditions)), position
+
+
+def parseAnd(tokens, position):
+    conditions = []
+    condition, position = parseNot(tokens, position)
+    conditions.append(condition)
+    while position < len(tokens) and tokens[position] == "and":
+        condition, position = parseNot(tokens, position + 1)
+        conditions.append(condition)
+    return (conditions[0] if len(conditions) == 1 else ("and", conditions)), position
+
+
+def parseNot(tokens, position):
+    if tokens[position] == "not":
+        condition, position = parseNot(tokens, position + 1)
+        return ("not", condition), position
+    if tokens[position] == "(":
+        condition, position = parseOr(tokens, position + 1)
+        if position >= len(tokens) or tokens[position] != ")":
+            raise ValueError("Missing ) in where clause")
+        return condition, position + 1
+    columnName = tokens[position]
+    if tokens[position + 1] == "is":
+        if tokens[position + 2] == "not" and tokens[position + 3] == "null":
+            return (columnName, "is not null"), position + 4
+        if tokens[position + 2] == "null":
+            return (columnName, "is null"), position + 3
+        raise ValueError("Expected NULL in where clause")
+    return (columnName, tokens[position + 1], parseValue(tokens[position + 2])), position + 3
+
+
+# Method to parse the where clause following the where keyword, None when the statement has none
+def parseWhereTokens(commandTokens):
+    if "where" not in commandTokens:
+        return None
+    return parseWhere(" ".join(commandTokens[commandTokens.index("where") + 1:]))
+
+
+# Method to parse table name and where clause
 def parseDelete(commandTokens):
-    condition1 = None
-    operator = None
-    condition2 = None
     tableName = commandTokens[3]
     # print("command tokens", commandTokens)
-    if "where" in commandTokens:
-        condition1 = commandTokens[-3]
-        operator = commandTokens[-2]
-        condition2 = commandTokens[-1]
-    deleteHandler(tableName, condition1, operator, condition2)
+    deleteHandler(tableName, parseWhereTokens(commandTokens))
 
 
-# Stub method to perform delete action.
-# Use the given tableName, condition1, operator and condition2 to identify and delete records from the table
-def deleteHandler(tableName, condition1=None, operator=None, condition2=None):
-    # print("Table name: " + tableName)
-    # if condition1 and condition2 and operator:
-    #     print("Condition 1: " + condition1)
-    #     print("Operator: " + operator)
-    #     print("Condition 2: " + condition2)
-    davis_base.delete(tableName, condition1, operator, condition2)
+# Method to perform delete action.
+# Use the given tableName and where clause to identify and delete records from the table
+def deleteHandler(tableName, where=None):
+    davis_base.delete_where(tableName, where)
 
 
-# Method to parse table name, column names and values to be updated and condition1, operator and condition2
+# Method to parse table name, the column and value to be updated and the where clause
+# update <table_name> set <column_name> = <value> [where <condition>]
 def parseUpdate(commandTokens):
     tableName = commandTokens[1]
-    updateValuesDictionary = {}
-    isColumnName = True
-    mostRecentColumnName = ""
-    for i in range(3, len(commandTokens) - 4):
-        if commandTokens[i] == "=":
-            continue
-        if isColumnName:
-            mostRecentColumnName = commandTokens[i]
-        else:
-            updateValuesDictionary[mostRecentColumnName] = commandTokens[i]
-        isColumnName = not isColumnName
-    condition1 = commandTokens[-3]
-    operator = commandTokens[-2]
-    condition2 = commandTokens[-1]
-    updateHandler(commandTokens)
-
+    whereIndex = commandTokens.index("where") if "where" in commandTokens else len(commandTokens)
+    assignment = commandTokens[3:whereIndex]
+    if len(assignment) != 3 or assignment[1] != "=":
+        print("Only one column can be set by an update. " + ERROR)
+        return
+    updateHandler(tableName, assignment[0], parseValue(assignment[2]), parseWhereTokens(commandTokens))
 
-# Stub method to perform update action. Data to be updated is stored as key / value pairs
-# Key refers to the column name and value refer to the updated value for that particular column
-def updateHandler(commandTokens):
-    # print("Command Tokens" + str(commandTokens))
 
-    # table name, value,
-    # davis_base.update(commandTokens[1], UpdateArgs(0, commandTokens[5], Condition(0, commandTokens[8], commandTokens[9])))
-    davis_base.update(commandTokens[1], commandTokens[3], commandTokens[5], commandTokens[7], commandTokens[8], commandTokens[9])
+# Method to perform update action on the records matching the where clause
+def updateHandler(tableName, columnName, value, where=None):
+    davis_base.update_where(tableName, columnName, value, where)
 
 
 # Identifies column names, table name, conditions from the entered query
+# select <column_list> from <table_name> [where <condition>] [limit <count>] [offset <count>]
 def parseSelect(commandTokens):
-    condition1 = None
-    operator = None
-    condition2 = None
+    limit = None
+    offset = 0
+    if "offset" in commandTokens:
+        offset = int(commandTokens[commandTokens.index("offset") + 1])
+        del commandTokens[commandTokens.index("offset"):commandTokens.index("offset") + 2]
+    if "limit" in commandTokens:
+        limit = int(commandTokens[commandTokens.index("limit") + 1])
+        del commandTokens[commandTokens.index("limit"):commandTokens.index("limit") + 2]
     columnNames = commandTokens[1].split(',')
     tableName = commandTokens[3]
-    if "where" in commandTokens:
-        condition1 = commandTokens[5]
-        operator = commandTokens[6]
-        condition2 = commandTokens[7]
-    # print (columnNames, tableName, condition1, operator, condition2)
-    selectHandler(columnNames, tableName, condition1, operator, condition2)
-
-
-# Stub method to perform action based on select command
-# Write your select action here.
-def selectHandler(columnNames, tableName, condition1=None, operator=None, condition2=None):
-    # print("Column names: " + str(columnNames))
-    # print("Table names: " + tableName)
-    # if condition1 and condition2 and operator:
-    #     print("Condition 1: " + condition1)
-    #     print("Operator: " + operator)
-    #     print("Condition 2: " + condition2)
-    result = davis_base.select(tableName, condition1, operator, condition2, columnNames)
-    for r in result:
+    selectHandler(columnNames, tableName, parseWhereTokens(commandTokens), limit, offset)
+
+
+# Method to perform action based on select command, the where clause is compiled once for the whole scan. Rows are
+# printed as the scan produces them and the scan stops once limit rows were printed.
+def selectHandler(columnNames, tableName, where=None, limit=None, offset=0):
+    if columnNames == ["count(*)"]:
+        print(davis_base.count_where(tableName, where))
+        return
+    for r in davis_base.cursor(tableName, where, columnNames, limit, offset):
         print(str([str(c) for c in r]))
 
 
@@ -171,14 +213,24 @@ def selectHandler(columnNames, tableName, condition1=None, operator=None, condit
 def dropTableHandler(tableToBeDropped):
     davis_base.drop_table(tableToBeDropped)
 
+# Rewrite a table file without the space left by deleted records
+def vacuumHandler(tableName):
+    davis_base.vacuum(tableName)
+
+
 # Display all tables present in Davisbase
 def showTablesHandler():
     davis_base.show_tables()
 
 
-# Method to create index based on table name
-def createIndexHandler(tableName):
-    print("Create Index Table Name: " + tableName)
+# Display the work done by the statements run on every table since Davisbase was started
+def showStatsHandler():
+    davis_base.show_stats()
+
+
+# Method to create index based on table name and column name
+def createIndexHandler(tableName, columnName):
+    davis_base.create_index(tableName, columnName)
 
 
 # Method to display commands supported in Davisbase
@@ -188,13 +240,26 @@ def help():
     print("All commands below are case insensitive\n")
     print("SHOW TABLES")
     print("\tDisplay the names of all tables.\n")
+    print("SHOW STATS")
+    print("\tDisplay the pages read and written, cells decoded, rows matched, bytes")
+    print("\tserialized and time spent by the statements run on every table.\n")
     print("SELECT * FROM <table_name>")
     print("Display all records in the table <table_name>.\n")
-    print("SELECT <column_list> FROM <table_name> [WHERE <condition>]")
+    print("SELECT <column_list> FROM <table_name> [WHERE <condition>] [LIMIT <count>] [OFFSET <count>]")
     print("\tDisplay table records whose optional <condition>")
-    print("\tis <column_name> = <value>.\n")
+    print("\tis <column_name> <operator> <value> or <column_name> IS [NOT] NULL,")
+    print("\twith <operator> one of =, <>, !=, <, <=, >, >=. Conditions can be")
+    print("\tjoined with AND, OR and NOT and grouped with parentheses.\n")
+    print("SELECT COUNT(*) FROM <table_name> [WHERE <condition>]")
+    print("\tDisplay the number of records whose optional <condition> is true.\n")
+    print("CREATE INDEX ON <table_name> (<column_name>)")
+    print("\tIndex the column, conditions on it with =, <, <=, > or >= use the index.\n")
+    print("INSERT INTO <table_name> [(<column_list>)] VALUES (<value_list>)[, (<value_list>)...]")
+    print("\tInsert one or more records into the table <table_name>.\n")
     print("DROP TABLE <table_name>")
     print("\tRemove table data (i.e. all records) and its schema.\n")
+    print("VACUUM <table_name>")
+    print("\tRewrite the table file without the space left by deleted records.\n")
     print(
         "UPDATE TABLE <table_name> SET <column_name> = <value> [WHERE <condition>]")
     print("\tModify records data whose optional <condition> is\n")
@@ -219,8 +284,7 @@ def parseUserCommand(queryString):
         commandTokens = queryString.replace(",", "").replace(";", "").split(" ")
         parseUpdate(commandTokens)
     elif commandType == INSERT:
-        commandTokens = queryString.replace(", ", ",").replace(";", "").replace("(", "").replace(")", "").split(" ")
-        parseInsert(commandTokens)
+        parseInsert(queryString)
     elif commandType == DELETE:
         commandTokens = queryString.replace(";", "").split(" ")
         parseDelete(commandTokens)
@@ -230,18 +294,25 @@ def parseUserCommand(queryString):
         createType = queryString.split(" ")[1]
         if createType == TABLE:
             tableName = queryString.replace(";", "").split(" ")[2]
-            columnInformationString = re.findall('\(([^)]+)', queryString)[0].split(", ")
+            columnInformationString = re.findall(r'\(([^)]+)', queryString)[0].split(", ")
             parseCreateTable(tableName, columnInformationString)
         elif createType == INDEX:
-            tableName = queryString.replace(";", "").split(" ")[-1]
-            createIndexHandler(tableName)
+            # create index [on] <table_name> (<column_name>)
+            tableName = queryString.split("(")[0].split()[-1]
+            columnName = re.findall(r'\(([^)]+)', queryString)[0].strip()
+            createIndexHandler(tableName, columnName)
         else:
             print(ERROR)
     elif commandType == DROP:
         tableToBeDropped = queryString.replace(";", "").split(" ")[-1]
         dropTableHandler(tableToBeDropped)
     elif commandType == SHOW:
-        showTablesHandler()
+        if queryString.replace(";", "").split(" ")[-1] == STATS:
+            showStatsHandler()
+        else:
+            showTablesHandler()
+    elif commandType == VACUUM:
+        vacuumHandler(queryString.replace(";", "").split(" ")[-1])
 
     # Miscellaneous commands'
     elif commandType == HELP:
@@ -256,6 +327,9 @@ def parseUserCommand(queryString):
 
 # Entry point of application. Runs until exit or quit command is entered.
 def main():
+    global davis_base
+    if davis_base is None:
+        davis_base = DavisBase()
 
     splashScreen()
     while not isExit:
@@ -266,7 +340,7 @@ def main():
             print("Error while running statement", e)
     print("\nExiting...")
 
-    davis_base.commit()
+    davis_base.close()
 
 
 if __name__ == "__main__":
@@ -1,28 +1,154 @@
 import bisect
 import os
-import pickle
+import struct
 
+from constants import INDEX_BTREE_INTERIOR_PAGE, INDEX_BTREE_LEAF_PAGE
+from core.datum import DavisBaseType
+from core.util import STRUCT_FORMATS, NATIVE_ORDER_TYPES, get_column_size
 
 page_size = 512
+data_dir = os.curdir
+DEFAULT_ORDER = 32
+# share of a page filled by a bulk load, the rest is left for later inserts
+DEFAULT_FILL_FACTOR = 0.9
+
+# Index pages follow the table pages: a header, the cell offsets and the cells written from the end of the page.
+# Page type, number of cells, content area offset, page number, right child page (next free page for a free page)
+# and the first free page, which is only used on the root page.
+INDEX_PAGE_HEADER = struct.Struct('>BHHIII')
+CELL_OFFSET = struct.Struct('>H')
+LEFT_CHILD_PAGE = struct.Struct('>I')
+# payload size, key type, value type
+CELL_PAYLOAD_HEADER = struct.Struct('>HBB')
+FREE_PAGE = 0
+ROOT_PAGE = 0
+MAX_TEXT_SIZE = 114 - 11
+
+
+def value_type(value):
+    if isinstance(value, DavisBaseType):
+        data_type = value.get_type_number()
+        return data_type if data_type < 11 else value_type(value.value)
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return 4
+    if isinstance(value, float):
+        return 6
+    if isinstance(value, str):
+        size = len(value.encode('utf-8'))
+        if size > MAX_TEXT_SIZE:
+            raise ValueError("index key too long: %r" % value)
+        return 11 + size
+    raise TypeError("cannot index %r" % value)
+
+
+def key_prefix(value, size=MAX_TEXT_SIZE):
+    # the longest prefix of a text that fits in size bytes, longer texts are indexed by it. Other values are their
+    # own key.
+    if not isinstance(value, str) or len(value) * 4 <= size:
+        return value
+    encoded = value.encode('utf-8')
+    if len(encoded) <= size:
+        return value
+    return encoded[:size].decode('utf-8', 'ignore')
+
+
+def encode_value(value):
+    data_type = value_type(value)
+    if isinstance(value, DavisBaseType):
+        value = value.value
+    if data_type == 0:
+        return data_type, b''
+    if data_type >= 11:
+        return data_type, value.encode('utf-8')
+    byte_order = '=' if data_type in NATIVE_ORDER_TYPES else '>'
+    return data_type, struct.pack(byte_order + STRUCT_FORMATS[data_type], value)
+
+
+def decode_value(data_type, buffer, offset):
+    if data_type == 0:
+        return None
+    size = get_column_size(data_type)
+    if data_type >= 11:
+        return bytes(buffer[offset:offset + size]).decode('utf-8')
+    byte_order = '=' if data_type in NATIVE_ORDER_TYPES else '>'
+    return struct.unpack_from(byte_order + STRUCT_FORMATS[data_type], buffer, offset)[0]
+
+
+def value_size(value):
+    if isinstance(value, DavisBaseType):
+        return value_size(value.value) if isinstance(value.value, str) else len(value)
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    return 0 if value is None else 8
+
+
+def element_size(element, interior):
+    # bytes taken by the element cell and its entry in the cell offsets
+    return CELL_OFFSET.size + (LEFT_CHILD_PAGE.size if interior else 0) + CELL_PAYLOAD_HEADER.size \
+        + value_size(element[0]) + value_size(element[1])
+
+
+class IndexFile(object):
+    def __init__(self, path, page_size=page_size):
+        self.path = path
+        self.page_size = page_size
+        self.page_count = os.path.getsize(path) // page_size if os.path.isfile(path) else 0
+
+    def read_page(self, page_number):
+        with open(self.path, "rb") as f:
+            f.seek(page_number * self.page_size)
+            return f.read(self.page_size)
+
+    def write_pages(self, pages):
+        # writes each page at its own offset, the rest of the file is left untouched
+        with open(self.path, "r+b" if os.path.isfile(self.path) else "wb") as f:
+            for page_number in sorted(pages):
+                f.seek(page_number * self.page_size)
+                f.write(pages[page_number])
+            f.flush()
+            os.fsync(f.fileno())
+
 
 class _NodeInTree(object):
-    __buckets__ = ["tree", "value", "children"]
+    __buckets__ = ["tree", "value", "children", "page_number"]
 
-    def __init__(self, tree, value=None, children=None):
+    def __init__(self, tree, value=None, children=None, page_number=None):
         self.tree = tree
         self.value = value or []
-      
+        # page numbers of the children, the nodes are read through the tree when they are needed
         self.children = children or []
         if self.children:
             assert len(self.value) + 1 == len(self.children)
+        self.next_free_page = None
+        self.page_number = tree.allocate() if page_number is None else page_number
+        if page_number is None:
+            tree.nodes[self.page_number] = self
+            tree.touch(self)
 
     def __repr__(self):
         name = getattr(self, "children", 0) and "Branch" or "Leaf"
         return "<%s %s>" % (name, ", ".join(map(str, self.value)))
 
+    def child(self, ind):
+        return self.tree.node(self.children[ind])
+
+    def size(self):
+        interior = bool(self.children)
+        return INDEX_PAGE_HEADER.size + sum([element_size(element, interior) for element in self.value])
+
+    def is_overflowing(self):
+        return len(self.value) > self.tree.order or self.size() > self.tree.page_size
+
+    def has_room_for(self, element):
+        return len(self.value) < self.tree.order \
+            and self.size() + element_size(element, bool(self.children)) <= self.tree.page_size
+
     def lateral(self, parent, parent_ind, dest, dest_ind):
         if parent_ind > dest_ind:
             dest.value.append(parent.value[dest_ind])
+            parent.value[dest_ind] = self.value.pop(0)
             if self.children:
                 dest.children.append(self.children.pop(0))
         else:
@@ -30,6 +156,7 @@ class _NodeInTree(object):
             parent.value[parent_ind] = self.value.pop()
             if self.children:
                 dest.children.insert(0, self.children.pop())
+        self.tree.touch(self, parent, dest)
 
     def contract(self, predecessor):
         parent = None
@@ -37,32 +164,35 @@ class _NodeInTree(object):
             parent, parent_ind = predecessor.pop()
             # try to lend to the left neighboring sibling
             if parent_ind:
-                left_sib = parent.children[parent_ind - 1]
-                if len(left_sib.value) < self.tree.order:
+                left_sib = parent.child(parent_ind - 1)
+                if left_sib.has_room_for(parent.value[parent_ind - 1]):
                     self.lateral(
                             parent, parent_ind, left_sib, parent_ind - 1)
                     return
 
             # try the right neighbor
             if parent_ind + 1 < len(parent.children):
-                right_sib = parent.children[parent_ind + 1]
-                if len(right_sib.value) < self.tree.order:
+                right_sib = parent.child(parent_ind + 1)
+                if right_sib.has_room_for(parent.value[parent_ind]):
                     self.lateral(
                             parent, parent_ind, right_sib, parent_ind + 1)
                     return
 
-        middle = len(self.value) // 2
         sibling, push = self.split()
 
         if not parent:
-            parent, parent_ind = self.tree.BRANCH(
-                    self.tree, children=[self]), 0
-            self.tree._root = parent
+            # the root stays on the first page, its content moves to a new page under it
+            moved = type(self)(self.tree, self.value, self.children)
+            self.value = [push]
+            self.children = [moved.page_number, sibling.page_number]
+            self.tree.touch(self)
+            return
 
         # pass the median up to the parent
         parent.value.insert(parent_ind, push)
-        parent.children.insert(parent_ind + 1, sibling)
-        if len(parent.value) > parent.tree.order:
+        parent.children.insert(parent_ind + 1, sibling.page_number)
+        self.tree.touch(self, parent)
+        if parent.is_overflowing():
             parent.contract(predecessor)
 
     def expand(self, predecessor):
@@ -72,14 +202,14 @@ class _NodeInTree(object):
 
         # try to borrow from the right sibling
         if parent_ind + 1 < len(parent.children):
-            right_sib = parent.children[parent_ind + 1]
+            right_sib = parent.child(parent_ind + 1)
             if len(right_sib.value) > minm:
                 right_sib.lateral(parent, parent_ind + 1, self, parent_ind)
                 return
 
         # try to borrow from the left sibling
         if parent_ind:
-            left_sib = parent.children[parent_ind - 1]
+            left_sib = parent.child(parent_ind - 1)
             if len(left_sib.value) > minm:
                 left_sib.lateral(parent, parent_ind - 1, self, parent_ind)
                 return
@@ -92,6 +222,9 @@ class _NodeInTree(object):
                 left_sib.children.extend(self.children)
             parent.value.pop(parent_ind - 1)
             parent.children.pop(parent_ind)
+            self.tree.touch(left_sib, parent)
+            self.tree.free(self)
+            merged = left_sib
         else:
             self.value.append(parent.value[parent_ind])
             self.value.extend(right_sib.value)
@@ -99,14 +232,20 @@ class _NodeInTree(object):
                 self.children.extend(right_sib.children)
             parent.value.pop(parent_ind)
             parent.children.pop(parent_ind + 1)
+            self.tree.touch(self, parent)
+            self.tree.free(right_sib)
+            merged = self
 
         if len(parent.value) < minm:
             if predecessor:
                 # parent is not the root
                 parent.expand(predecessor)
             elif not parent.value:
-                # parent is root, and its now empty
-                self.tree._root = left_sib or self
+                # parent is root, and its now empty, the remaining child moves up to the first page
+                parent.value = merged.value
+                parent.children = merged.children
+                self.tree.touch(parent)
+                self.tree.free(merged)
 
     def split(self):
         middle = len(self.value) // 2
@@ -117,11 +256,13 @@ class _NodeInTree(object):
                 self.children[middle + 1:])
         self.value = self.value[:middle]
         self.children = self.children[:middle + 1]
+        self.tree.touch(self)
         return sibling, median
 
     def insert(self, ind, element, predecessor):
         self.value.insert(ind, element)
-        if len(self.value) > self.tree.order:
+        self.tree.touch(self)
+        if self.is_overflowing():
             self.contract(predecessor)
 
     def remove(self, ind, predecessor):
@@ -131,38 +272,182 @@ class _NodeInTree(object):
             # try promoting from the right subtree first,
             # but only if it won't have to resize
             add_ancestors = [(self, ind + 1)]
-            descendent = self.children[ind + 1]
+            descendent = self.child(ind + 1)
             while descendent.children:
                 add_ancestors.append((descendent, 0))
-                descendent = descendent.children[0]
+                descendent = descendent.child(0)
             if len(descendent.value) > minm:
                 predecessor.extend(add_ancestors)
                 self.value[ind] = descendent.value[0]
+                self.tree.touch(self)
                 descendent.remove(0, predecessor)
                 return
 
             # fall back to the left child
             add_ancestors = [(self, ind)]
-            descendent = self.children[ind]
+            descendent = self.child(ind)
             while descendent.children:
                 add_ancestors.append(
                         (descendent, len(descendent.children) - 1))
-                descendent = descendent.children[-1]
+                descendent = descendent.child(-1)
             predecessor.extend(add_ancestors)
             self.value[ind] = descendent.value[-1]
+            self.tree.touch(self)
             descendent.remove(len(descendent.children) - 1, predecessor)
         else:
             self.value.pop(ind)
+            self.tree.touch(self)
             if len(self.value) < minm and predecessor:
                 self.expand(predecessor)
 
-
+    def __bytes__(self):
+        interior = bool(self.children)
+        cells = []
+        for ind, element in enumerate(self.value):
+            key_type, key_bytes = encode_value(element[0])
+            value_type, value_bytes = encode_value(element[1])
+            payload = CELL_PAYLOAD_HEADER.pack(len(key_bytes) + len(value_bytes), key_type, value_type) \
+                + key_bytes + value_bytes
+            cells.append(LEFT_CHILD_PAGE.pack(self.children[ind]) + payload if interior else payload)
+        if self.next_free_page is not None:
+            page_type, right_child_page = FREE_PAGE, self.next_free_page
+        elif interior:
+            page_type, right_child_page = INDEX_BTREE_INTERIOR_PAGE, self.children[-1]
+        else:
+            page_type, right_child_page = INDEX_BTREE_LEAF_PAGE, 0
+        offsets = []
+        location = self.tree.page_size
+        for cell in cells:
+            location -= len(cell)
+            offsets.append(CELL_OFFSET.pack(location))
+        header = INDEX_PAGE_HEADER.pack(page_type, len(cells), location, self.page_number, right_child_page,
+                                        self.tree.free_page if self.page_number == ROOT_PAGE else 0)
+        header += b''.join(offsets)
+        return header + bytes(location - len(header)) + b''.join(reversed(cells))
+
+    @classmethod
+    def from_bytes(cls, tree, page_bytes):
+        page_type, number_of_cells, content_area_offset, page_number, right_child_page, free_page = \
+            INDEX_PAGE_HEADER.unpack_from(page_bytes)
+        node = cls(tree, page_number=page_number)
+        if page_number == ROOT_PAGE:
+            tree.free_page = free_page
+        if page_type == FREE_PAGE:
+            node.next_free_page = right_child_page
+            return node
+        interior = page_type == INDEX_BTREE_INTERIOR_PAGE
+        for ind in range(number_of_cells):
+            offset, = CELL_OFFSET.unpack_from(page_bytes, INDEX_PAGE_HEADER.size + ind * CELL_OFFSET.size)
+            if interior:
+                node.children.append(LEFT_CHILD_PAGE.unpack_from(page_bytes, offset)[0])
+                offset += LEFT_CHILD_PAGE.size
+            payload_size, key_type, value_type = CELL_PAYLOAD_HEADER.unpack_from(page_bytes, offset)
+            offset += CELL_PAYLOAD_HEADER.size
+            key = decode_value(key_type, page_bytes, offset)
+            node.value.append([key, decode_value(value_type, page_bytes, offset + get_column_size(key_type))])
+        if interior:
+            node.children.append(right_child_page)
+        return node
+
+
+# B-tree of [key, value] elements kept in pages of an index file. Nodes are read from the file when a path first
+# reaches them and the nodes changed by an insert or remove are written back by flush, so a change touches the pages
+# on one root to leaf path and the siblings used for rebalancing. The root always stays on the first page. Without a
+# filename the tree only lives in memory.
 class Index_Btree(object):
     BRANCH = LEAF = _NodeInTree
 
-    def __init__(self, order):
+    def __init__(self, order, filename=None, page_size=page_size):
         self.order = order
-        self._root = self._bottom = self.LEAF(self)
+        self.page_size = page_size
+        self.file = IndexFile(filename, page_size) if filename else None
+        self.nodes = {}
+        self.dirty = set()
+        # dirty pages not written to the write ahead log yet
+        self.unlogged = set()
+        # pages changed by the running insert or remove
+        self.touched = set()
+        # first page of the chain of free pages, 0 when there is none since the root page is never free
+        self.free_page = 0
+        self.page_count = self.file.page_count if self.file else 0
+        # images of the dirty pages as last logged and the page count then, put back by roll_back
+        self.logged = {}
+        self.logged_page_count = self.page_count
+        if self.page_count:
+            self._root = self._bottom = self.node(ROOT_PAGE)
+        else:
+            self._root = self._bottom = self.LEAF(self)
+
+    def node(self, page_number):
+        node = self.nodes.get(page_number)
+        if node is None:
+            node = self.nodes[page_number] = self.LEAF.from_bytes(self, self.file.read_page(page_number))
+        return node
+
+    def allocate(self):
+        if self.free_page:
+            page_number = self.free_page
+            self.free_page = self.node(page_number).next_free_page
+            del self.nodes[page_number]
+            self.dirty.add(ROOT_PAGE)
+            self.unlogged.add(ROOT_PAGE)
+            return page_number
+        self.page_count += 1
+        return self.page_count - 1
+
+    def free(self, node):
+        node.value = []
+        node.children = []
+        node.next_free_page = self.free_page
+        self.free_page = node.page_number
+        self.touch(node)
+        self.dirty.add(ROOT_PAGE)
+        self.unlogged.add(ROOT_PAGE)
+
+    def touch(self, *nodes):
+        for node in nodes:
+            self.dirty.add(node.page_number)
+            self.unlogged.add(node.page_number)
+            self.touched.add(node.page_number)
+
+    def flush(self, filename=None):
+        if filename and (self.file is None or os.path.abspath(filename) != os.path.abspath(self.file.path)):
+            # writing to another file, every page goes
+            for page_number in range(self.page_count):
+                self.node(page_number)
+            self.file = IndexFile(filename, self.page_size)
+            self.dirty = set(range(self.page_count))
+            if os.path.isfile(filename):
+                os.remove(filename)
+        self.file.write_pages({page_number: bytes(self.nodes[page_number]) for page_number in self.dirty})
+        self.file.page_count = self.page_count
+        self.dirty = set()
+        self.unlogged = set()
+        self.logged = {}
+        self.logged_page_count = self.page_count
+
+    def take_unlogged(self):
+        # images of the pages changed since the last call, the pages stay dirty until the next flush
+        pages = {page_number: bytes(self.nodes[page_number]) for page_number in self.unlogged}
+        self.unlogged = set()
+        self.logged.update(pages)
+        self.logged_page_count = self.page_count
+        return pages
+
+    def roll_back(self):
+        # undoes the changes since the last take_unlogged, the changed nodes are read again from their logged image
+        # or from the file and the nodes allocated since are dropped
+        for page_number in self.unlogged:
+            if page_number in self.logged:
+                self.nodes[page_number] = self.LEAF.from_bytes(self, self.logged[page_number])
+            else:
+                self.nodes.pop(page_number, None)
+                self.dirty.discard(page_number)
+        self.unlogged = set()
+        self.touched = set()
+        self.page_count = self.logged_page_count
+        # reading the root also brings back the first free page
+        self._root = self._bottom = self.node(ROOT_PAGE)
 
     def _path_to(self, element):
         curr = self._root
@@ -174,7 +459,7 @@ class Index_Btree(object):
             if ind < len(curr.value) \
                     and curr.value[ind] == element:
                 return ancestry
-            curr = curr.children[ind]
+            curr = curr.child(ind)
 
         ind = bisect.bisect_left(curr.value, element)
         ancestry.append((curr, ind))
@@ -187,33 +472,140 @@ class Index_Btree(object):
         last, ind = predecessor[-1]
         return ind < len(last.value) and last.value[ind] == element
 
+    def _find(self, key):
+        # first element found with the key on the way down, [key] sorts before every [key, value]
+        curr = self._root
+        while True:
+            ind = bisect.bisect_left(curr.value, [key])
+            if ind < len(curr.value) and curr.value[ind][0] == key:
+                return curr.value[ind]
+            if not curr.children:
+                return None
+            curr = curr.child(ind)
+
+    def _split_overflowing(self):
+        # with variable sized keys moving an element to a parent or a sibling can make that node too large for its
+        # page, such a node is split with the path found again from one of its elements
+        while self.touched:
+            node = self.nodes.get(self.touched.pop())
+            if node is not None and node.next_free_page is None and node.is_overflowing():
+                predecessor = self._path_to(node.value[0])
+                predecessor.pop()
+                node.contract(predecessor)
+
+    def _check_size(self, element):
+        # a page has to hold at least three elements for a split to leave both halves non empty
+        value_type(element[0])
+        value_type(element[1])
+        if INDEX_PAGE_HEADER.size + 3 * element_size(element, True) > self.page_size:
+            raise ValueError("%r does not fit in a %d byte index page" % (element, self.page_size))
+
+    def bulk_load(self, elements, fill_factor=DEFAULT_FILL_FACTOR):
+        # builds an empty tree bottom up instead of inserting the elements one by one. The sorted elements are packed
+        # into leaves up to fill_factor of the order and of the page, the elements left between two leaves make the
+        # level above, which is packed the same way until a single node is left for the root.
+        if self._root.value:
+            raise ValueError("bulk load needs an empty %s" % self.__class__.__name__)
+        elements = sorted(elements)
+        for element in elements:
+            self._check_size(element)
+        children = None
+        while elements:
+            nodes, separators = self._pack_level(elements, children, fill_factor)
+            if len(nodes) == 1:
+                self._root.value, self._root.children = nodes[0]
+                self.touch(self._root)
+                break
+            children = [self.BRANCH(self, value, node_children).page_number for value, node_children in nodes]
+            elements = separators
+        self.touched = set()
+
+    def _pack_level(self, elements, children, fill_factor):
+        # returns the (elements, children) of the nodes of one level and the elements between them
+        interior = children is not None
+        capacity = max(2, int(self.order * fill_factor))
+        limit = int(self.page_size * fill_factor)
+        bounds = []
+        start = 0
+        while start < len(elements):
+            end, size = start, INDEX_PAGE_HEADER.size
+            while end < len(elements) and end - start < capacity:
+                size += element_size(elements[end], interior)
+                if end - start > 1 and size > limit:
+                    break
+                end += 1
+            bounds.append([start, end])
+            start = end + 1
+        if bounds[-1][1] < len(elements):
+            # the last element ended up between two nodes with nothing after it
+            bounds[-1][1] -= 1
+            bounds.append([len(elements) - 1, len(elements)])
+        if len(bounds) > 1 and bounds[-1][1] - bounds[-1][0] < self.order // 2:
+            # evens out a small last node with the one before it
+            previous, last = bounds[-2], bounds[-1]
+            middle = (previous[0] + last[1]) // 2
+            size = INDEX_PAGE_HEADER.size + sum([element_size(element, interior)
+                                                 for element in elements[middle + 1:last[1]]])
+            if middle < previous[1] and size <= self.page_size:
+                previous[1], last[0] = middle, middle + 1
+        nodes = [(elements[start:end], children[start:end + 1] if interior else []) for start, end in bounds]
+        return nodes, [elements[end] for start, end in bounds[:-1]]
+
     def insert(self, element, ):
+        self._check_size(element)
         curr = self._root
         predecessor = self._path_to(element)
         node, ind = predecessor[-1]
         while getattr(node, "children", None):
-            node = node.children[ind]
+            node = node.child(ind)
             ind = bisect.bisect_left(node.value, element)
             predecessor.append((node, ind))
         node, ind = predecessor.pop()
         node.insert(ind, element, predecessor)
+        self._split_overflowing()
 
     def search(self, element):
-        curr = self._root
-        if element in dict(self):
-            return dict(self)[element]
+        found = self._find(element)
+        if found is not None:
+            return found[1]
         return None
 
-    def remove(self, element):
-        if self.search(element):
-            element = [element, (self.search(element))]
+    def search_all(self, key):
+        return [element[1] for element in self.range(key, key)]
+
+    def range(self, lo=None, hi=None, include_lo=True, include_hi=True):
+        # streams the elements with a key between lo and hi in order, None leaves that side unbounded. The walk starts
+        # at the lower bound and stops after the upper bound, so only the pages holding the range are read.
+        def _recurse(node):
+            start = 0 if lo is None else bisect.bisect_left(node.value, [lo])
+            for ind in range(start, len(node.value)):
+                if node.children:
+                    for child_item in _recurse(node.child(ind)):
+                        yield child_item
+                yield node.value[ind]
+            if node.children:
+                for child_item in _recurse(node.child(-1)):
+                    yield child_item
+
+        for element in _recurse(self._root):
+            if not include_lo and element[0] == lo:
+                continue
+            if hi is not None and (element[0] > hi or not include_hi and element[0] == hi):
+                return
+            yield element
+
+    def remove(self, element, value=None):
+        if value is None:
+            found = self._find(element)
+            element = found if found is not None else [element, None]
         else:
-            element = [element, None]
+            element = [element, value]
         curr = self._root
         predecessor = self._path_to(element)
         if self._current(element, predecessor):
             node, ind = predecessor.pop()
             node.remove(ind, predecessor)
+            self._split_overflowing()
         else:
             raise ValueError("%r not in %s" % (element, self.__class__.__name__))
 
@@ -225,11 +617,11 @@ class Index_Btree(object):
     def __iter__(self):
         def _recurse(node):
             if node.children:
-                for child, element in zip(node.children, node.value):
-                    for child_item in _recurse(child):
+                for ind, element in enumerate(node.value):
+                    for child_item in _recurse(node.child(ind)):
                         yield child_item
                     yield element
-                for child_item in _recurse(node.children[-1]):
+                for child_item in _recurse(node.child(-1)):
                     yield child_item
             else:
                 for element in node.value:
@@ -243,34 +635,34 @@ class Index_Btree(object):
     def __repr__(self):
         def recurse(node, accum, depth):
             accum.append(("  " * depth) + repr(node))
-            for node in getattr(node, "children", []):
-                recurse(node, accum, depth + 1)
+            for ind in range(len(node.children)):
+                recurse(node.child(ind), accum, depth + 1)
 
         accum = []
         recurse(self._root, accum, 0)
         return "\n".join(accum)
 
 
+def index_file_path(table_name, column_name):
+    return os.path.join(data_dir, str(table_name) + "_" + str(column_name) + ".ndx")
+
+
 def insert_index_entry(table_name, column_name, key, value):
-    file_list = os.listdir(data_dir)
-    filename = str(table_name) + "_" + str(column_name) + ".ndx"
+    filename = index_file_path(table_name, column_name)
 
-    if filename not in file_list:
-    	dicti = {}
-    	dicti[key] = value
-    	initialize_tree(table_name, column_name, dicti)
+    if not os.path.isfile(filename):
+        initialize_tree(table_name, column_name, {key: value})
     else:
         tree = read_tree_from_file(table_name, column_name)
-        tree.insert([key,value])
+        tree.insert([key, value])
         write_tree_to_file(filename, tree)
-    return 
+    return
 
 def remove_index_entry(table_name, column_name, key):
-    file_list = os.listdir(data_dir)
-    filename = str(table_name) + "_" + str(column_name) + ".ndx"
+    filename = index_file_path(table_name, column_name)
 
-    if filename not in file_list:
-    	return False
+    if not os.path.isfile(filename):
+        return False
     else:
         tree = read_tree_from_file(table_name, column_name)
         tree.remove(key)
@@ -278,24 +670,23 @@ def remove_index_entry(table_name, column_name, key):
     return True
 
 def initialize_tree(table_name, column_name, tree_values):
-	new_tree = Index_Btree(5)
-	for key, value in tree_values:
-		new_tree.insert([key, value])
-	filename = str(table_name) + "_" + str(column_name) + ".ndx"
-	write_tree_to_file(filename, new_tree)
-	return
+    filename = index_file_path(table_name, column_name)
+    if os.path.isfile(filename):
+        os.remove(filename)
+    new_tree = Index_Btree(DEFAULT_ORDER, filename)
+    new_tree.bulk_load([[key, value] for key, value in
+                        (tree_values.items() if isinstance(tree_values, dict) else tree_values)])
+    write_tree_to_file(filename, new_tree)
+    return
 
 def write_tree_to_file(filename, new_tree):
-    with open(filename, "wb") as f:
-        pickle.dump(new_tree, f)
+    # only the pages changed since the tree was read are written when it comes from the same file
+    new_tree.flush(filename)
     return
 
 
 def read_tree_from_file(table_name, column_name):
-    filename = str(table_name) + "_" + str(column_name) + ".ndx"
-    with open(filename, "rb") as f:
-        tree = pickle.load(f)
-    return tree
+    return Index_Btree(DEFAULT_ORDER, index_file_path(table_name, column_name))
 
 def search(table_name, column_name, key):
     tree = read_tree_from_file(table_name, column_name)
@@ -0,0 +1,47 @@
+import sys
+import time
+
+from core.datum import Int
+from core.model import DavisTable, TableColumnsMetadata, ColumnDefinition, PageReader, PAGE_SIZE, SelectArgs, \
+    Condition
+
+
+def build_pages(rows: int) -> bytes:
+    table = DavisTable("bench", columns_metadata=TableColumnsMetadata({
+        "id": ColumnDefinition("INT", 0),
+        "small": ColumnDefinition("SMALLINT", 1),
+        "price": ColumnDefinition("DOUBLE", 2),
+        "name": ColumnDefinition("TEXT", 3),
+        "created": ColumnDefinition("DATETIME", 4),
+    }))
+    table.insert([[str(i), str(i % 1000), str(i * 0.5), 'name ' + str(i), str(1500000000 + i)] for i in range(rows)])
+    return bytes(table)
+
+
+def decode_pages(data: bytes) -> float:
+    start = time.perf_counter()
+    for offset in range(0, len(data), PAGE_SIZE):
+        PageReader(data[offset:offset + PAGE_SIZE]).read_page()
+    return time.perf_counter() - start
+
+
+def select_pages(data: bytes, args: SelectArgs) -> float:
+    # reads every page and runs a select on it, which only decodes the columns of the condition and projection
+    start = time.perf_counter()
+    for offset in range(0, len(data), PAGE_SIZE):
+        PageReader(data[offset:offset + PAGE_SIZE]).read_page().select(args)
+    return time.perf_counter() - start
+
+
+def main(rows: int = 100000, repeat: int = 3):
+    data = build_pages(rows)
+    pages = len(data) // PAGE_SIZE
+    best = min(decode_pages(data) for _ in range(repeat))
+    print("decoded {} pages ({} rows) in {:.3f}s, {:.0f} pages/s".format(pages, rows, best, pages / best))
+    args = SelectArgs([1], Condition(0, '>=', Int(rows // 2)))
+    best = min(select_pages(data, args) for _ in range(repeat))
+    print("selected 1 of 5 columns from {} pages in {:.3f}s, {:.0f} pages/s".format(pages, best, pages / best))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
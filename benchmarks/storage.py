@@ -0,0 +1,191 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from core.model import DavisBase, TableColumnsMetadata, ColumnDefinition
+
+DEFAULT_ROWS = [10000, 100000, 1000000]
+# statements timed one by one, each is a separate statement of the engine
+POINT_SELECTS = 1000
+RANGE_SELECTS = 10
+UPDATES = 200
+DELETES = 200
+# rows selected by a range select
+RANGE_ROWS = 1000
+# the legacy engine keeps its list of pages in the first page of the file, it fails past about 300 rows
+LEGACY_MAX_ROWS = 250
+FIRST_DATE = 1546300800  # 2019-01-01
+
+# the schema of the legacy engine, which is fixed, so both engines store the same rows
+COLUMNS = [("person_id", "INT"), ("name", "TEXT"), ("dob", "DATE"), ("email", "TEXT"), ("dept_no", "INT")]
+
+
+def generate_rows(rows: int, seed: int = 0) -> list:
+    # (person_id, name, dob as epoch seconds, email, dept_no) of every row, the same for every run with the same seed
+    generator = random.Random(seed)
+    return [(i, 'name {}'.format(generator.randrange(rows)), FIRST_DATE + 86400 * generator.randrange(3650),
+             'user{}@example.com'.format(i), generator.randrange(50)) for i in range(rows)]
+
+
+def timed(results: list, engine: str, rows: int, operation: str, count: int, function):
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    results.append({"engine": engine, "rows": rows, "operation": operation, "count": count,
+                    "seconds": round(seconds, 6), "us_per_op": round(seconds / count * 1e6, 3) if count else None})
+
+
+def bench_davis_base(rows: int, seed: int, results: list):
+    engine = "core.model"
+    folder = tempfile.mkdtemp(prefix="davisbase-bench-")
+    data = generate_rows(rows, seed)
+    generator = random.Random(seed + 1)
+    davis_base = DavisBase(folder)
+    davis_base.create_table("bench", TableColumnsMetadata({name: ColumnDefinition(data_type, position)
+                                                           for position, (name, data_type) in enumerate(COLUMNS)}))
+    column_names = [name for name, data_type in COLUMNS]
+    timed(results, engine, rows, "insert", rows,
+          lambda: davis_base.insert_many("bench", [[str(value) for value in row] for row in data], column_names))
+    timed(results, engine, rows, "commit", 1, davis_base.commit)
+
+    row_ids = [generator.randrange(1, rows + 1) for _ in range(POINT_SELECTS)]
+    timed(results, engine, rows, "point select", len(row_ids),
+          lambda: [davis_base.select_where("bench", ("rowid", "=", str(row_id))) for row_id in row_ids])
+    starts = [generator.randrange(max(rows - RANGE_ROWS, 1)) for _ in range(RANGE_SELECTS)]
+    timed(results, engine, rows, "range select", len(starts),
+          lambda: [davis_base.select_where("bench", ("and", [("person_id", ">=", str(start)),
+                                                             ("person_id", "<", str(start + RANGE_ROWS))]))
+                   for start in starts])
+    row_ids = [generator.randrange(1, rows + 1) for _ in range(UPDATES)]
+    timed(results, engine, rows, "update", len(row_ids),
+          lambda: [davis_base.update_where("bench", "dept_no", "99", ("rowid", "=", str(row_id)))
+                   for row_id in row_ids])
+    row_ids = generator.sample(range(1, rows + 1), min(DELETES, rows))
+    timed(results, engine, rows, "delete", len(row_ids),
+          lambda: [davis_base.delete_where("bench", ("rowid", "=", str(row_id))) for row_id in row_ids])
+    timed(results, engine, rows, "commit", 1, davis_base.commit)
+    davis_base.close()
+
+    def reopen():
+        # opening the database and the table, and finding one row
+        reopened = DavisBase(folder)
+        reopened.select_where("bench", ("rowid", "=", "1"))
+        reopened.close()
+    timed(results, engine, rows, "reopen", 1, reopen)
+    shutil.rmtree(folder)
+
+
+def legacy_engine_class():
+    # Table.py runs a small demo when it is imported, in the working directory, and needs tabulate
+    with contextlib.redirect_stdout(io.StringIO()):
+        import Table
+    return type(Table.Table)
+
+
+def bench_legacy(rows: int, seed: int, results: list):
+    folder = tempfile.mkdtemp(prefix="legacy-bench-")
+    working_directory = os.getcwd()
+    # every call of the engine works in the data folder of the working directory and prints its progress
+    os.chdir(folder)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            bench_legacy_rows(legacy_engine_class(), rows, seed, results)
+    finally:
+        os.chdir(working_directory)
+        shutil.rmtree(folder)
+
+
+def bench_legacy_rows(table_class, rows: int, seed: int, results: list):
+    engine = "Table.Table"
+    data = generate_rows(rows, seed)
+    generator = random.Random(seed + 1)
+    table = table_class("bench")
+    table.create_table("bench")
+
+    def legacy_row(row: tuple) -> list:
+        person_id, name, dob, email, dept_no = row
+        return [person_id, name, time.strftime('%m.%d.%Y', time.localtime(dob)), email, dept_no]
+    timed(results, engine, rows, "insert", rows,
+          lambda: [table.insert_into_table("bench", legacy_row(row)) for row in data])
+    # rows are written through to the file, there is nothing to commit
+    person_ids = [generator.randrange(rows) for _ in range(POINT_SELECTS // 10)]
+    timed(results, engine, rows, "point select", len(person_ids),
+          lambda: [table.select_from_table("bench", ['*'], "person_id", "=", person_id) for person_id in person_ids])
+    starts = [generator.randrange(rows) for _ in range(RANGE_SELECTS)]
+    timed(results, engine, rows, "range select", len(starts),
+          lambda: [table.select_from_table("bench", ['*'], "person_id", ">=", start) for start in starts])
+    person_ids = [generator.randrange(rows) for _ in range(UPDATES // 10)]
+    timed(results, engine, rows, "update", len(person_ids),
+          lambda: [table.update_record("bench", "dept_no", 99, "person_id", "=", person_id)
+                   for person_id in person_ids])
+    person_ids = generator.sample(range(rows), DELETES // 10)
+    timed(results, engine, rows, "delete", len(person_ids),
+          lambda: [table.delete_record("bench", "person_id", "=", person_id) for person_id in person_ids])
+    timed(results, engine, rows, "reopen", 1, lambda: table_class("bench").get_root_node(table.table_file_path))
+
+
+def run(row_counts: list, seed: int = 0, legacy: bool = True) -> dict:
+    results = []
+    for rows in row_counts:
+        print("core.model", rows, "rows", file=sys.stderr)
+        bench_davis_base(rows, seed, results)
+    if legacy:
+        for rows in sorted({min(rows, LEGACY_MAX_ROWS) for rows in row_counts}):
+            print("Table.Table", rows, "rows", file=sys.stderr)
+            try:
+                bench_legacy(rows, seed, results)
+            except ImportError as error:
+                results.append({"engine": "Table.Table", "rows": rows, "skipped": str(error)})
+        for rows in row_counts:
+            if rows > LEGACY_MAX_ROWS:
+                results.append({"engine": "Table.Table", "rows": rows,
+                                "skipped": "the engine holds about 300 rows, it was run with {}".format(
+                                    min(rows, LEGACY_MAX_ROWS))})
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "time": time.strftime('%Y-%m-%dT%H:%M:%S'), "seed": seed, "results": results}
+
+
+def compare(previous: dict, current: dict) -> list:
+    # (engine, rows, operation, previous seconds, current seconds, ratio) of the operations both runs timed
+    timings = {(result["engine"], result["rows"], result["operation"]): result["seconds"]
+               for result in previous["results"] if "seconds" in result}
+    lines = []
+    for result in current["results"]:
+        key = (result["engine"], result["rows"], result.get("operation"))
+        if "seconds" in result and timings.get(key):
+            lines.append(key + (timings[key], result["seconds"], round(result["seconds"] / timings[key], 3)))
+    return lines
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Times the storage engines on synthetic tables")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file the results are written to, standard output by default")
+    parser.add_argument("--compare", help="JSON file of an earlier run, the ratios of the timings are printed")
+    parser.add_argument("--no-legacy", dest="legacy", action="store_false")
+    args = parser.parse_args(argv)
+    report = run(args.rows, args.seed, args.legacy)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        with open(args.compare) as previous:
+            for engine, rows, operation, before, after, ratio in compare(json.load(previous), report):
+                print("{:12} {:>8} {:14} {:10.4f}s {:10.4f}s {:6.2f}x".format(engine, rows, operation, before, after,
+                                                                           ratio), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+from typing import Dict, List, Set, Tuple
+
+from core.stats import Stats
+
+DEFAULT_BUFFER_POOL_PAGES = 4096
+
+
+class Frame:
+    def __init__(self, page):
+        self.page = page
+        self.pin_count: int = 0
+        self.dirty: bool = False
+
+
+# Page cache shared by all the tables of a database, keyed by (file, page number). Pages are read on demand through
+# file.read_page and the least recently used unpinned clean page is evicted once the pool holds more than capacity
+# pages. Dirty pages are never evicted, they stay until the file is committed and marked clean, so the pool can
+# temporarily grow past its capacity while a large write is pending. Dirty pages not written to the write ahead log
+# yet are tracked apart, so every statement only logs the pages it changed, and a statement that fails puts the pages
+# it changed back as they were logged.
+class BufferPool:
+    def __init__(self, capacity: int = DEFAULT_BUFFER_POOL_PAGES, stats: Stats = None):
+        self.capacity: int = capacity
+        # pages read from their files are counted for the running statement
+        self.stats: Stats = stats if stats is not None else Stats()
+        self.frames: Dict[Tuple[object, int], Frame] = {}
+        # frames that can be evicted, least recently used first
+        self.evictable: OrderedDict = OrderedDict()
+        self.dirty: Dict[object, Set[int]] = {}
+        self.unlogged: Dict[object, Set[int]] = {}
+        # images of the dirty pages as last logged and the page count of their file then, kept until it is clean
+        self.logged: Dict[object, Dict[int, bytes]] = {}
+        self.page_counts: Dict[object, int] = {}
+
+    def fetch(self, file, page_number: int):
+        key = (file, page_number)
+        frame = self.frames.get(key)
+        if frame is None:
+            frame = Frame(file.read_page(page_number))
+            self.frames[key] = frame
+            self.stats.current.pages_read += 1
+            self.evict()
+        self.evictable.pop(key, None)
+        frame.pin_count += 1
+        return frame.page
+
+    def unpin(self, file, page_number: int, dirty: bool = False):
+        key = (file, page_number)
+        frame = self.frames[key]
+        frame.pin_count -= 1
+        if dirty:
+            self.set_dirty(key, frame)
+        if frame.pin_count == 0 and not frame.dirty:
+            self.evictable[key] = frame
+
+    def add(self, file, page):
+        # registers a page that only exists in memory so far
+        key = (file, page.page_number)
+        self.evictable.pop(key, None)
+        frame = Frame(page)
+        self.frames[key] = frame
+        self.set_dirty(key, frame)
+        self.evict()
+
+    def mark_dirty(self, file, page):
+        key = (file, page.page_number)
+        frame = self.frames.get(key)
+        if frame is None:
+            # the page was evicted while the caller held on to it
+            frame = Frame(page)
+            self.frames[key] = frame
+        frame.page = page
+        self.evictable.pop(key, None)
+        self.set_dirty(key, frame)
+
+    def set_dirty(self, key: Tuple[object, int], frame: Frame):
+        frame.dirty = True
+        self.dirty.setdefault(key[0], set()).add(key[1])
+        self.unlogged.setdefault(key[0], set()).add(key[1])
+
+    def take_unlogged(self, file) -> Dict[int, bytes]:
+        # images of the pages of the file changed since the last call, they stay dirty until the file is marked clean
+        images = {page_number: bytes(self.frames[(file, page_number)].page)
+                  for page_number in sorted(self.unlogged.pop(file, ()))}
+        self.logged.setdefault(file, {}).update(images)
+        self.page_counts[file] = file.page_count
+        return images
+
+    def roll_back(self, file):
+        # undoes the changes to the file since the last take_unlogged: changed pages get their logged image back or
+        # are read again from the file, pages allocated since are dropped
+        logged = self.logged.get(file, {})
+        written = file.written_page_count()
+        for page_number in self.unlogged.pop(file, ()):
+            key = (file, page_number)
+            frame = self.frames[key]
+            if page_number in logged:
+                frame.page = file.decode_page(logged[page_number])
+                continue
+            frame.dirty = False
+            self.dirty[file].discard(page_number)
+            if frame.pin_count == 0:
+                del self.frames[key]
+            elif page_number < written:
+                # still pinned by the failed statement, it is unpinned once that lets go of the page
+                frame.page = file.read_page(page_number)
+        file.page_count = self.page_counts.get(file, written)
+
+    def unlogged_files(self) -> List:
+        return [file for file, page_numbers in self.unlogged.items() if page_numbers]
+
+    def dirty_pages(self, file) -> List:
+        return [self.frames[(file, page_number)].page for page_number in sorted(self.dirty.get(file, ()))]
+
+    def mark_clean(self, file):
+        self.unlogged.pop(file, None)
+        self.logged.pop(file, None)
+        self.page_counts.pop(file, None)
+        for page_number in self.dirty.pop(file, ()):
+            key = (file, page_number)
+            frame = self.frames[key]
+            frame.dirty = False
+            if frame.pin_count == 0:
+                self.evictable[key] = frame
+        self.evict()
+
+    def discard(self, file):
+        for key in [key for key in self.frames if key[0] is file]:
+            del self.frames[key]
+            self.evictable.pop(key, None)
+        self.dirty.pop(file, None)
+        self.unlogged.pop(file, None)
+        self.logged.pop(file, None)
+        self.page_counts.pop(file, None)
+
+    def evict(self):
+        while len(self.frames) > self.capacity and self.evictable:
+            key, frame = self.evictable.popitem(last=False)
+            del self.frames[key]
+
+    def __len__(self) -> int:
+        return len(self.frames)
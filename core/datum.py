@@ -3,10 +3,20 @@ import datetime
 import struct
 
 
+# Values are created for every column of every row read, so they only have a value slot and no __dict__.
 class DavisBaseType:
+    __slots__ = ('value',)
+
     def __init__(self, value: int or str or bytes = None):
         self.value: int or str or bytes = value
 
+    @classmethod
+    def decoded(cls, value: int or float or str = None) -> 'DavisBaseType':
+        # wraps a value already decoded from a page, skipping the conversions and checks done by __init__
+        datum = cls.__new__(cls)
+        datum.value = value
+        return datum
+
     def get_type_number(self) -> int:
         pass
 
@@ -18,6 +28,7 @@ class DavisBaseType:
 
 
 class Null(DavisBaseType):
+    __slots__ = ()
 
     def get_type_number(self) -> int:
         return 0
@@ -51,6 +62,7 @@ class Null(DavisBaseType):
 
 
 class DavisBaseTypeComparable(DavisBaseType):
+    __slots__ = ()
 
     def __eq__(self, other: 'DavisBaseTypeComparable') -> bool:
         return self.value == other.value
@@ -84,6 +96,7 @@ class DavisBaseTypeComparable(DavisBaseType):
 
 
 class Number(DavisBaseTypeComparable):
+    __slots__ = ()
 
     def __init__(self, value: int or float or bytes or str):
         super(Number, self).__init__(value)
@@ -91,6 +104,9 @@ class Number(DavisBaseTypeComparable):
             self.value: int or float = int.from_bytes(value, 'big', signed=True)
         if isinstance(value, str):
             self.value: int or float = self.from_str(value)
+        self.check()
+
+    def check(self):
         self.__bytes__()  # try and build the bytes to see if it is possible
 
     def from_str(self, value: str) -> int:
@@ -109,6 +125,8 @@ class Number(DavisBaseTypeComparable):
 
 
 class Int(Number):
+    __slots__ = ()
+
     def get_type_number(self) -> int:
         return 3
 
@@ -118,8 +136,16 @@ class Int(Number):
     def __bytes__(self) -> bytes:
         return int.to_bytes(self.value, len(self), 'big', signed=True)
 
+    def check(self):
+        # a range check instead of building the bytes, which still gives the error when the value does not fit
+        bound = 1 << (8 * len(self) - 1)
+        if not isinstance(self.value, int) or not -bound <= self.value < bound:
+            self.__bytes__()
+
 
 class TinyInt(Int):
+    __slots__ = ()
+
     def get_type_number(self) -> int:
         return 1
 
@@ -128,6 +154,8 @@ class TinyInt(Int):
 
 
 class SmallInt(Int):
+    __slots__ = ()
+
     def get_type_number(self) -> int:
         return 2
 
@@ -136,6 +164,8 @@ class SmallInt(Int):
 
 
 class Long(Int):
+    __slots__ = ()
+
     def get_type_number(self) -> int:
         return 4
 
@@ -144,11 +174,15 @@ class Long(Int):
 
 
 class Float(Number):
+    __slots__ = ()
+
     def __init__(self, value: int or float or bytes or str):
         super(Number, self).__init__(value)
         if isinstance(value, bytes):
             v= struct.unpack('f', value)
             self.value: float = v[0]
+        if isinstance(value, str):
+            self.value: float = self.from_str(value)
 
     def from_str(self, value: str) -> float:
         return float(value)
@@ -164,11 +198,17 @@ class Float(Number):
 
 
 class Double(Number):
+    __slots__ = ()
 
     def __init__(self, value: int or float or bytes or str):
         super(Number, self).__init__(value)
         if isinstance(value, bytes):
-            self.value: int or float = struct.unpack('d', value)
+            self.value: float = struct.unpack('d', value)[0]
+        if isinstance(value, str):
+            self.value: float = self.from_str(value)
+
+    def from_str(self, value: str) -> float:
+        return float(value)
 
     def get_type_number(self) -> int:
         return 6
@@ -181,6 +221,8 @@ class Double(Number):
 
 
 class Year(TinyInt):
+    __slots__ = ()
+
     def get_type_number(self) -> int:
         return 7
 
@@ -189,11 +231,15 @@ class Year(TinyInt):
 
 
 class Time(Int):
+    __slots__ = ()
+
     def get_type_number(self) -> int:
         return 8
 
 
 class DateTime(Long):
+    __slots__ = ()
+
     def get_type_number(self) -> int:
         return 9
 
@@ -202,6 +248,8 @@ class DateTime(Long):
 
 
 class Date(Long):
+    __slots__ = ()
+
     def get_type_number(self) -> int:
         return 10
 
@@ -210,6 +258,8 @@ class Date(Long):
 
 
 class Text(DavisBaseTypeComparable):
+    __slots__ = ()
+
     def __init__(self, value: str or bytes):
         super(Text, self).__init__(value)
         if isinstance(value, bytes):
@@ -219,10 +269,48 @@ class Text(DavisBaseTypeComparable):
         return 11 + len(self)
 
     def __len__(self):
-        return len(self.value)
+        # size of the encoded text, which the type number holds
+        return len(self.value) if self.value.isascii() else len(self.value.encode('utf-8'))
 
     def __bytes__(self):
         return bytes(self.value, 'utf-8')
 
     def __str__(self) -> str:
         return self.value
+
+
+# Text too long to be kept in its record. The record only holds the size of the encoded text and the first page of
+# the chain of overflow pages holding it, the text is read from the chain the first time its value is used.
+class OverflowText(Text):
+    __slots__ = ('size', 'first_page', 'file', 'text')
+    TYPE_NUMBER = 115
+
+    def __init__(self, size: int, first_page: int, file=None, value: str = None):
+        self.size: int = size
+        self.first_page: int = first_page
+        # the table file holding the chain, see TableFile.read_text
+        self.file = file
+        self.text: str = value
+
+    @classmethod
+    def decoded(cls, value: int = None) -> 'OverflowText':
+        return cls(value >> 32, value & 0xFFFFFFFF)
+
+    @property
+    def value(self) -> str:
+        if self.text is None:
+            self.text = self.file.read_text(self.first_page, self.size)
+        return self.text
+
+    def get_type_number(self) -> int:
+        return self.TYPE_NUMBER
+
+    def __len__(self):
+        return 8
+
+    def __bytes__(self):
+        return struct.pack('>II', self.size, self.first_page)
+
+    def __reduce__(self):
+        # sent to other processes as the text itself, the chain can not be read from there
+        return Text, (self.value,)
@@ -1,13 +1,25 @@
 import os
 import math
-from typing import AnyStr, List, Dict
-from io import BytesIO
-
-from core.datum import DavisBaseType, Null
+import mmap
+import bisect
+import struct
+import functools
+from array import array
+import threading
+from typing import AnyStr, List, Dict, Callable
+
+from Index import Index_Btree, DEFAULT_ORDER, DEFAULT_FILL_FACTOR, MAX_TEXT_SIZE, key_prefix
+from core.buffer import BufferPool, DEFAULT_BUFFER_POOL_PAGES
+from core.stats import Stats, Counters, COUNTS, TIMES, clock
+from core.parallel import ParallelScanner
+from core.wal import WriteAheadLog, Checkpointer, encode_statement, decode_statement
+from core.datum import DavisBaseType, Null, Int, Text, OverflowText
+from core.vector import ColumnVector, COMPARISONS, is_vectorizable, is_available as vector_available, positions, \
+    all_rows
 
 # Constants
-from core.util import int_to_bytes, data_type_encodings, bytes_to_int, log_debug, flatten, leaf_cell_header_size, \
-    get_column_size, DATA_TYPES
+from core.util import int_to_bytes, data_type_encodings, log_debug, leaf_cell_header_size, \
+    get_column_size, DATA_TYPES, STRUCT_FORMATS, NATIVE_ORDER_TYPES, TEXT_TYPE, MAX_INLINE_TEXT_SIZE
 
 INDEX_BTREE_INTERIOR_PAGE = 2
 INDEX_BTREE_LEAF_PAGE = 10
@@ -15,6 +27,25 @@ INDEX_BTREE_LEAF_PAGE = 10
 # Constants
 TABLE_BTREE_INTERIOR_PAGE = 5
 TABLE_BTREE_LEAF_PAGE = 13
+# a page taken out of the b+tree, waiting on the free page list to be used again
+FREE_PAGE = 0
+# a page of the chain holding a text too long for its record
+OVERFLOW_PAGE = 1
+
+PAGE_SIZE = 512
+ROOT_PAGE = 0
+ROW_ID_COLUMN = 'rowid'
+# largest cell kept whole in a leaf, so a leaf always holds two cells. The longest texts of larger records are moved
+# to overflow pages.
+MAX_LOCAL_CELL_SIZE = (PAGE_SIZE - 13) // 2 - 2
+# size of the write ahead log that starts a checkpoint in the background
+DEFAULT_CHECKPOINT_BYTES = 4 * 1024 * 1024
+# structs kept by a record encoder, one for every combination of text sizes of the records
+MAX_ENCODER_LAYOUTS = 4096
+# condition operators that can be answered with a range of an index
+INDEXED_OPERATORS = {"=", "<", "<=", ">", ">="}
+# leaves whose condition column is decoded into one array by a vectorized scan
+SCAN_BATCH_PAGES = 64
 
 
 class ColumnDefinition:
@@ -45,8 +76,12 @@ class TableColumnsMetadata:
 
 
 class Record:
-    def __init__(self, values: List[DavisBaseType]):
+    __slots__ = ('values', 'encoder')
+
+    def __init__(self, values: List[DavisBaseType], encoder: 'RecordEncoder' = None):
         self.values: List[DavisBaseType] = values
+        # encoder of the schema of the table, when the record was made for one
+        self.encoder: RecordEncoder = encoder
 
     def set(self, index: int, value: DavisBaseType):
         self.values[index] = value
@@ -63,25 +98,115 @@ class Record:
     def payload(self) -> bytes:
         return b''.join([bytes(value) for value in self.values])
 
+    def overflow_columns(self) -> List[int]:
+        return [index for index, value in enumerate(self.values) if type(value) is OverflowText]
+
     def __len__(self) -> int:
+        if self.encoder is not None:
+            size = self.encoder.size(self.values)
+            if size is not None:
+                return size
         return self.header_size() + self.body_size()
 
     def __getitem__(self, index: int) -> DavisBaseType:
         return self.values[index]
 
     def __bytes__(self) -> bytes:
+        if self.encoder is not None:
+            encoded = self.encoder.encode(self.values)
+            if encoded is not None:
+                return encoded
         return self.header_bytes() + self.payload()
 
     def __str__(self) -> str:
         return str([str(value) for value in self.values])
 
 
+# Record read from a page. The values are decoded one column at a time on first access, so a query only pays for
+# the columns it filters on or projects. The record keeps its bytes until a value is changed or the whole value list
+# is requested, an untouched record is written back as it was read.
+class LazyRecord(Record):
+    __slots__ = ('page_bytes', 'offset', 'size', 'decoder', 'file', 'values_offset', 'decoded_values',
+                 'materialized_values')
+
+    def __init__(self, page_bytes: bytes, offset: int, size: int, decoder: 'RecordDecoder', file: 'TableFile' = None):
+        # offset of the record header in the page and size of the whole record
+        self.page_bytes: bytes = page_bytes
+        self.offset: int = offset
+        self.size: int = size
+        self.decoder: RecordDecoder = decoder
+        self.encoder: RecordEncoder = None
+        # file the record was read from, where the overflow pages of its long texts are
+        self.file: TableFile = file
+        self.values_offset: int = offset + 1 + decoder.column_count
+        # values decoded so far by column, the list is only allocated by the first decoded value
+        self.decoded_values: List[DavisBaseType] = None
+        self.materialized_values: List[DavisBaseType] = None
+
+    @property
+    def values(self) -> List[DavisBaseType]:
+        if self.materialized_values is None:
+            # callers may change the list, from here on the record is encoded from its values
+            decoded_values = self.decoded_values or [None] * self.decoder.column_count
+            self.materialized_values = [value if value is not None else self.decode_column(index)
+                                        for index, value in enumerate(decoded_values)]
+            self.page_bytes = None
+            self.decoded_values = None
+        return self.materialized_values
+
+    @values.setter
+    def values(self, values: List[DavisBaseType]):
+        self.materialized_values = values
+        self.page_bytes = None
+        self.decoded_values = None
+
+    def is_decoded(self, index: int) -> bool:
+        return self.materialized_values is not None \
+            or self.decoded_values is not None and self.decoded_values[index] is not None
+
+    def decode_column(self, index: int) -> DavisBaseType:
+        value = self.decoder.decode_column(self.page_bytes, self.values_offset, index)
+        if value.__class__ is OverflowText:
+            value.file = self.file
+        return value
+
+    def overflow_columns(self) -> List[int]:
+        if self.materialized_values is None:
+            return self.decoder.overflow_columns
+        return super(LazyRecord, self).overflow_columns()
+
+    def __len__(self) -> int:
+        if self.materialized_values is None:
+            return self.size
+        return super(LazyRecord, self).__len__()
+
+    def __getitem__(self, index: int) -> DavisBaseType:
+        if self.materialized_values is not None:
+            return self.materialized_values[index]
+        decoded_values = self.decoded_values
+        if decoded_values is None:
+            decoded_values = self.decoded_values = [None] * self.decoder.column_count
+        value = decoded_values[index]
+        if value is None:
+            value = decoded_values[index] = self.decode_column(index)
+        return value
+
+    def __bytes__(self) -> bytes:
+        if self.materialized_values is None:
+            return self.page_bytes[self.offset:self.offset + self.size]
+        return super(LazyRecord, self).__bytes__()
+
+
 class PageCell:
+    __slots__ = ('row_id',)
+
     def __init__(self, row_id: int):
         self.row_id = row_id
 
 
 class InternalCell(PageCell):
+    __slots__ = ('left_child_page',)
+
     def __init__(self, row_id: int, left_child_page: int):
         super(InternalCell, self).__init__(row_id)
         self.left_child_page: int = left_child_page
@@ -94,8 +219,11 @@ class InternalCell(PageCell):
 
 
 class LeafCell(PageCell):
+    __slots__ = ('record',)
+
     def __init__(self, row_id: int, record: Record = None):
-        super(LeafCell, self).__init__(row_id)
+        # leaf cells are made for every row read, the base class constructor is inlined
+        self.row_id = row_id
         self.record: Record = record
 
     def set(self, index: int, value: DavisBaseType):
@@ -117,28 +245,190 @@ class LeafCell(PageCell):
         return self.record[index]
 
     def __bytes__(self) -> AnyStr:
-        return self.header_bytes() + self.payload()
+        # the record is encoded once, its size in the header is the length of the encoding
+        payload = self.payload()
+        return LEAF_CELL_ROW.pack(len(payload), self.row_id) + payload
 
     def __str__(self) -> str:
         return "{}: {}".format(self.row_id, self.record)
 
 
+# A condition of a WHERE clause. The predicate testing a cell is compiled once, when the condition is built, and
+# compares the raw values of the cells, so evaluating it allocates nothing per cell. Conditions marked vectorized are
+# evaluated over a whole list of cells at once by mask instead. NULL only satisfies != and IS NULL, NOT negates
+# the result of the condition.
 class Condition:
-    def __init__(self, column_index: int, operator: str, value: DavisBaseType):
+    def __init__(self, column_index: int, operator: str, value: DavisBaseType, negated: bool = False):
         self.column_index: int = column_index
-        self.operator: str = operator
+        self.operator: str = "!=" if operator == "<>" else operator
         self.value: DavisBaseType = value
+        self.negated: bool = negated
+        # evaluated over a whole column at once by matching_batch instead of cell by cell
+        self.vectorized: bool = False
+        self.predicate: Callable[[LeafCell], bool] = self.compile()
+
+    def compile(self) -> Callable[[LeafCell], bool]:
+        index = self.column_index
+        value = self.value.value
+        compare = COMPARISONS[self.operator]
+        if self.operator == "!=":
+            def predicate(cell: LeafCell) -> bool:
+                return cell[index].value != value
+        else:
+            def predicate(cell: LeafCell) -> bool:
+                cell_value = cell[index].value
+                return cell_value is not None and compare(cell_value, value)
+        return negate(predicate) if self.negated else predicate
 
-    def is_satisfied(self, cell: LeafCell):
-        result = {
-            "=": lambda a, b: a == b,
-            "!=": lambda a, b: a != b,
-            ">": lambda a, b: a > b,
-            ">=": lambda a, b: a >= b,
-            "<": lambda a, b: a < b,
-            "<=": lambda a, b: a <= b
-        }[self.operator](cell[self.column_index], self.value)
-        return result
+    def is_satisfied(self, cell: LeafCell) -> bool:
+        return self.predicate(cell)
+
+    def __getstate__(self) -> dict:
+        # conditions are sent to scan workers without their predicate, which is compiled again on arrival
+        state = dict(self.__dict__)
+        del state['predicate']
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.predicate = self.compile()
+
+    def is_vectorizable(self) -> bool:
+        return is_vectorizable(self.value.get_type_number(), self.operator)
+
+    def mask(self, cells: List[LeafCell]):
+        mask = column_vector(cells, self.column_index, self.value.get_type_number()).mask(self.operator,
+                                                                                         self.value.value)
+        return ~mask if self.negated else mask
+
+    def row_id_range(self) -> (int, int):
+        # bounds of the leaves that need to be visited, None meaning unbounded
+        return None, None
+
+
+def negate(predicate: Callable[[LeafCell], bool]) -> Callable[[LeafCell], bool]:
+    return lambda cell: not predicate(cell)
+
+
+# condition on the implicit row id of a cell, answered from the b+tree keys
+class RowIdCondition(Condition):
+
+    def __init__(self, operator: str, value: DavisBaseType, negated: bool = False):
+        super(RowIdCondition, self).__init__(None, operator, value, negated)
+
+    def compile(self) -> Callable[[LeafCell], bool]:
+        value = self.value.value
+        compare = COMPARISONS[self.operator]
+
+        def predicate(cell: LeafCell) -> bool:
+            return compare(cell.row_id, value)
+        return negate(predicate) if self.negated else predicate
+
+    def is_vectorizable(self) -> bool:
+        return False
+
+    def row_id_range(self) -> (int, int):
+        if self.negated:
+            return None, None
+        return {
+            "=": (self.value.value, self.value.value),
+            ">": (self.value.value + 1, None),
+            ">=": (self.value.value, None),
+            "<": (None, self.value.value - 1),
+            "<=": (None, self.value.value),
+        }.get(self.operator, (None, None))
+
+
+def is_point_lookup(condition: Condition) -> bool:
+    return condition.__class__ is RowIdCondition and condition.operator == "=" and not condition.negated
+
+
+# <column> IS NULL, or IS NOT NULL when negated
+class IsNullCondition(Condition):
+
+    def __init__(self, column_index: int, data_type: int, negated: bool = False):
+        self.data_type: int = data_type
+        super(IsNullCondition, self).__init__(column_index, "is null", Null(), negated)
+
+    def compile(self) -> Callable[[LeafCell], bool]:
+        index = self.column_index
+        if self.negated:
+            return lambda cell: cell[index].value is not None
+        return lambda cell: cell[index].value is None
+
+    def is_vectorizable(self) -> bool:
+        return is_vectorizable(self.data_type, "=")
+
+    def mask(self, cells: List[LeafCell]):
+        mask = column_vector(cells, self.column_index, self.data_type).null_mask()
+        return ~mask if self.negated else mask
+
+
+# conditions joined by AND. Without conditions every cell is matched, which is how a statement without a WHERE
+# clause is run.
+class AndCondition(Condition):
+
+    def __init__(self, conditions: List[Condition] = None, negated: bool = False):
+        self.conditions: List[Condition] = conditions if conditions is not None else []
+        super(AndCondition, self).__init__(None, "and", None, negated)
+
+    def compile(self) -> Callable[[LeafCell], bool]:
+        predicates = [condition.predicate for condition in self.conditions]
+        if not predicates:
+            predicate = lambda cell: True
+        elif len(predicates) == 1:
+            predicate = predicates[0]
+        else:
+            def predicate(cell: LeafCell) -> bool:
+                for condition_predicate in predicates:
+                    if not condition_predicate(cell):
+                        return False
+                return True
+        return negate(predicate) if self.negated else predicate
+
+    def is_vectorizable(self) -> bool:
+        return vector_available() and all([condition.is_vectorizable() for condition in self.conditions])
+
+    def mask(self, cells: List[LeafCell]):
+        mask = all_rows(len(cells))
+        for condition in self.conditions:
+            mask &= condition.mask(cells)
+        return ~mask if self.negated else mask
+
+    def row_id_range(self) -> (int, int):
+        # a row has to be in the range of every condition
+        if self.negated:
+            return None, None
+        ranges = [condition.row_id_range() for condition in self.conditions]
+        lows = [low for low, high in ranges if low is not None]
+        highs = [high for low, high in ranges if high is not None]
+        return max(lows) if lows else None, min(highs) if highs else None
+
+
+class OrCondition(Condition):
+
+    def __init__(self, conditions: List[Condition], negated: bool = False):
+        self.conditions: List[Condition] = conditions
+        super(OrCondition, self).__init__(None, "or", None, negated)
+
+    def compile(self) -> Callable[[LeafCell], bool]:
+        predicates = [condition.predicate for condition in self.conditions]
+
+        def predicate(cell: LeafCell) -> bool:
+            for condition_predicate in predicates:
+                if condition_predicate(cell):
+                    return True
+            return False
+        return negate(predicate) if self.negated else predicate
+
+    def is_vectorizable(self) -> bool:
+        return vector_available() and all([condition.is_vectorizable() for condition in self.conditions])
+
+    def mask(self, cells: List[LeafCell]):
+        mask = ~all_rows(len(cells))
+        for condition in self.conditions:
+            mask |= condition.mask(cells)
+        return ~mask if self.negated else mask
 
 
 class CreateArgs:
@@ -210,255 +500,1420 @@ class TablePage:
         return 'TablePage(page_number={}, page_parent={})'.format(self.page_number, self.page_parent)
 
 
+# Page of the free page list. The parent field of a free page holds the next free page and the parent field of the
+# root page, which has no parent, holds the first one. 0 ends the list since the root page is never free.
+class FreePage(TablePage):
+    PAGE_TYPE = FREE_PAGE
+
+    def __init__(self, page_number: int, next_free_page: int):
+        super(FreePage, self).__init__(page_number=page_number, page_parent=next_free_page, cells={})
+
+    def values(self) -> List[str or int]:
+        return []
+
+    def __bytes__(self) -> AnyStr:
+        return PAGE_HEADER.pack(self.PAGE_TYPE, 0, PAGE_SIZE, self.page_number, self.page_parent) \
+               + bytes(PAGE_SIZE - PAGE_HEADER.size)
+
+    def __str__(self):
+        return 'FreePage(page_number={}, next_free_page={})'.format(self.page_number, self.page_parent)
+
+
+# Page of the chain of overflow pages holding a long text. The parent field holds the next page of the chain, 0 on
+# the last page, and the content area offset field the number of bytes of text on the page.
+class OverflowPage(TablePage):
+    PAGE_TYPE = OVERFLOW_PAGE
+
+    def __init__(self, page_number: int, next_page: int, data: bytes):
+        super(OverflowPage, self).__init__(page_number=page_number, page_parent=next_page, cells={})
+        self.data: bytes = data
+
+    def values(self) -> List[str or int]:
+        return []
+
+    def __bytes__(self) -> AnyStr:
+        return PAGE_HEADER.pack(self.PAGE_TYPE, 0, len(self.data), self.page_number, self.page_parent) + self.data \
+               + bytes(PAGE_SIZE - PAGE_HEADER.size - len(self.data))
+
+    def __str__(self):
+        return 'OverflowPage(page_number={}, next_page={})'.format(self.page_number, self.page_parent)
+
+
+# Cells of a leaf page read from a file, left packed in the page bytes. Only the row id and the offset of every cell
+# are kept, in two arrays ordered by row id, and a LeafCell is made for a row when it is looked up, so a page held by
+# the buffer pool costs its bytes plus a few bytes per row instead of a cell, a record and their values per row. The
+# cells can be read like the dict of a page that was changed: by row id, in row id order or in reverse.
+class PageCells:
+    __slots__ = ('page_bytes', 'row_ids', 'offsets', 'file', 'cells_size')
+
+    def __init__(self, page_bytes: bytes, row_ids: array, offsets: array, cells_size: int, file: 'TableFile' = None):
+        self.page_bytes: bytes = page_bytes
+        self.row_ids: array = row_ids
+        self.offsets: array = offsets
+        self.cells_size: int = cells_size
+        self.file: TableFile = file
+
+    def cell(self, position: int) -> LeafCell:
+        page_bytes = self.page_bytes
+        offset = self.offsets[position]
+        payload_size, row_id, number_of_columns = LEAF_CELL_HEADER.unpack_from(page_bytes, offset)
+        types_offset = offset + LEAF_CELL_HEADER.size
+        data_types = page_bytes[types_offset:types_offset + number_of_columns]
+        decoder = RecordDecoder.DECODERS.get(data_types) or RecordDecoder.for_types(data_types)
+        return LeafCell(row_id, LazyRecord(page_bytes, types_offset - 1, payload_size, decoder, self.file))
+
+    def is_contiguous(self) -> bool:
+        # whether the cells fill the end of the page with no gap, as written by TableLeafPage
+        return not self.offsets or min(self.offsets) == PAGE_SIZE - self.cells_size
+
+    def position(self, row_id: int) -> int:
+        position = bisect.bisect_left(self.row_ids, row_id)
+        if position < len(self.row_ids) and self.row_ids[position] == row_id:
+            return position
+        return -1
+
+    def get(self, row_id: int, default: LeafCell = None) -> LeafCell:
+        position = self.position(row_id)
+        return self.cell(position) if position >= 0 else default
+
+    def keys(self):
+        return iter(self.row_ids)
+
+    def values(self):
+        return map(self.cell, range(len(self.offsets)))
+
+    def items(self):
+        return zip(self.row_ids, self.values())
+
+    def __getitem__(self, row_id: int) -> LeafCell:
+        position = self.position(row_id)
+        if position < 0:
+            raise KeyError(row_id)
+        return self.cell(position)
+
+    def __contains__(self, row_id: int) -> bool:
+        return self.position(row_id) >= 0
+
+    def __iter__(self):
+        return iter(self.row_ids)
+
+    def __reversed__(self):
+        return reversed(self.row_ids)
+
+    def __len__(self) -> int:
+        return len(self.row_ids)
+
+
+# Leaf page of the table b+tree. The page keeps the total size of its cells up to date as cells are added, removed,
+# moved to a sibling or changed, so checking whether a cell fits is O(1) instead of a sum over every cell.
 class TableLeafPage(TablePage):
-    PAGE_TYPE = 13
+    PAGE_TYPE = TABLE_BTREE_LEAF_PAGE
 
     def __init__(self, page_number: int, page_parent: int, cells=None):
         super(TableLeafPage, self).__init__(page_number=page_number, page_parent=page_parent, cells=cells)
         if cells is None:
             cells = {}
-        self.cells: Dict[int, LeafCell] = cells
+        # the cells of a page read from a file stay packed until the page is first changed
+        self.cells: Dict[int, LeafCell] or PageCells = cells
+        # bytes taken by the cells in the content area, without their entries in the cell locations array
+        if isinstance(cells, PageCells):
+            self.cells_size: int = cells.cells_size
+        else:
+            self.cells_size: int = sum([len(cell) for cell in cells.values()])
 
-    def select(self, args: SelectArgs):
-        selected = []
-        for row_id in self.cells:
-            if args.condition.is_satisfied(self.cells[row_id]):
-                selected.append([self.cells[row_id].values()[i] for i in args.column_indexes])
-        return selected
+    def unpack(self):
+        # cells made by PageCells are not kept, so before a change the page takes a dict of cells it owns
+        if isinstance(self.cells, PageCells):
+            self.cells = dict(self.cells.items())
 
-    def update(self, args: UpdateArgs):
-        for row_id in self.cells:
-            if args.condition.is_satisfied(self.cells[row_id]):
-                self.cells[row_id].record.values[args.column_index] = args.value
+    # select, update and delete work on the cells matching the condition of the args, unless the matching cells were
+    # already found by a vectorized scan
 
-    def delete(self, args: DeleteArgs):
-        row_ids_to_be_deleted = []
-        for row_id in self.cells:
-            if args.condition.is_satisfied(self.cells[row_id]):
-                row_ids_to_be_deleted.append(row_id)
-        for row_id in row_ids_to_be_deleted:
-            del self.cells[row_id]
+    def select(self, args: SelectArgs, cells: List[LeafCell] = None):
+        if cells is None:
+            cells = self.matching(args.condition)
+        return [[cell[i] for i in args.column_indexes] for cell in cells]
+
+    def update(self, args: UpdateArgs, cells: List[LeafCell] = None) -> int:
+        if cells is None:
+            cells = self.matching(args.condition)
+        self.unpack()
+        value_size = len(args.value)
+        for cell in [self.cells[cell.row_id] for cell in cells]:
+            self.cells_size += value_size - len(cell[args.column_index])
+            cell.set(args.column_index, args.value)
+        return len(cells)
+
+    def delete(self, args: DeleteArgs, cells: List[LeafCell] = None) -> int:
+        if cells is None:
+            cells = self.matching(args.condition)
+        for cell in cells:
+            self.remove_record(cell.row_id)
+        return len(cells)
+
+    def matching(self, condition: Condition) -> List[LeafCell]:
+        if is_point_lookup(condition):
+            # a point lookup by row id reads a single cell
+            cell = self.cells.get(condition.value.value)
+            return [cell] if cell is not None else []
+        predicate = condition.predicate
+        return [cell for cell in self.cells.values() if predicate(cell)]
 
     def values(self) -> List[str or int]:
         return [self.cells[row_id].values() for row_id in self.cells]
 
+    def insert(self, row_id: int, cell: LeafCell):
+        self.add_cell(row_id, cell)
+
     def add_record(self, row_id: int, record: Record):
-        self.cells[row_id] = LeafCell(row_id, record)
+        self.add_cell(row_id, LeafCell(row_id, record))
+
+    def remove_record(self, row_id: int):
+        self.unpack()
+        self.cells_size -= len(self.cells.pop(row_id))
 
     def get_column_values(self, column_index: int) -> List[str or int]:
         return [self.cells[row_id][column_index] for row_id in self.cells]
 
     def add_cell(self, row_id: int, cell: LeafCell = None):
-        self.cells[row_id] = cell
+        self.unpack()
+        previous = self.cells.get(row_id)
+        if previous is not None:
+            self.cells_size -= len(previous)
+        self.cells_size += len(cell)
+        if self.cells and row_id < next(reversed(self.cells)):
+            # keep the cells ordered by row id, appends are the common case
+            self.cells[row_id] = cell
+            self.cells = {key: self.cells[key] for key in sorted(self.cells)}
+        else:
+            self.cells[row_id] = cell
 
     def is_full(self, leaf_cell: LeafCell = None):
-        size = self.header_size() + self.payload_size()
-        return leaf_cell and size + len(leaf_cell) >= 512 or size >= 512
+        size = self.header_size() + self.cells_size
+        if leaf_cell:
+            # the new cell also needs a 2 byte entry in the cell locations array
+            return size + len(leaf_cell) + 2 > PAGE_SIZE
+        return size >= PAGE_SIZE
+
+    def is_underfull(self) -> bool:
+        return self.header_size() + self.cells_size < PAGE_SIZE // 2
+
+    def can_merge(self, sibling: 'TableLeafPage') -> bool:
+        return self.header_size() + self.cells_size + 2 * len(sibling.cells) + sibling.cells_size <= PAGE_SIZE
+
+    def merge(self, sibling: 'TableLeafPage'):
+        # takes every cell of the sibling on the right, whose row ids are all greater
+        self.unpack()
+        for row_id, cell in sibling.cells.items():
+            self.cells[row_id] = cell
+        self.cells_size += sibling.cells_size
+
+    def split_into(self, sibling: 'TableLeafPage', row_id: int) -> int:
+        # moves the upper part of the cells to the sibling and returns the separator row id, the largest row id
+        # that stays on this page. Appending the highest row id leaves this page full instead of half full.
+        self.unpack()
+        sibling.unpack()
+        row_ids = list(self.cells)
+        middle = len(row_ids) if row_id > row_ids[-1] else len(row_ids) // 2
+        for moved_row_id in row_ids[middle:]:
+            cell = self.cells.pop(moved_row_id)
+            cell_size = len(cell)
+            self.cells_size -= cell_size
+            sibling.cells[moved_row_id] = cell
+            sibling.cells_size += cell_size
+        return row_ids[middle - 1] if middle else row_id
 
     def header_size(self) -> int:
         return 13 + 2 * len(self.cells)
 
     def payload_size(self) -> int:
-        return sum([len(self.cells[row_id]) for row_id in self.cells])
+        return self.cells_size
 
     def header_bytes(self) -> AnyStr:
+        return self.encode_header(self.cell_locations_bytes())
+
+    def encode_header(self, locations: bytes) -> bytes:
         return b''.join([
             int_to_bytes(self.PAGE_TYPE, 1),
             int_to_bytes(len(self.cells), 2),
-            int_to_bytes(512 - self.payload_size(), 2),
+            int_to_bytes(PAGE_SIZE - self.cells_size, 2),
             int_to_bytes(self.page_number),
             int_to_bytes(self.page_parent),
-            self.cell_locations_bytes()])
+            locations])
 
     def cell_locations_bytes(self) -> AnyStr:
-        locations_bytes = b''
-        location = 512
-        for row_id in self.cells:
-            location -= len(self.cells[row_id])
-            locations_bytes += int_to_bytes(location, 2)
-        return locations_bytes
+        return cell_locations(len(cell) for cell in self.cells.values())
 
     def payload(self) -> AnyStr:
         return b''.join([bytes(self.cells[row_id]) for row_id in self.cells][::-1])
 
     def __bytes__(self) -> AnyStr:
-        return self.header_bytes() \
-               + bytes([0 for _ in range(512 - self.header_size() - self.payload_size())]) \
-               + self.payload()
+        if isinstance(self.cells, PageCells) and self.cells.is_contiguous():
+            # the page was not changed since it was read, only its header may differ
+            return PAGE_HEADER.pack(self.PAGE_TYPE, len(self.cells), PAGE_SIZE - self.cells_size, self.page_number,
+                                    self.page_parent) + self.cells.page_bytes[PAGE_HEADER.size:]
+        # every cell is encoded once, the locations array is worked out from the encoded cells
+        cells = [bytes(cell) for cell in self.cells.values()]
+        payload_size = sum([len(cell) for cell in cells])
+        return self.encode_header(cell_locations(len(cell) for cell in cells)) \
+               + bytes(PAGE_SIZE - self.header_size() - payload_size) \
+               + b''.join(cells[::-1])
 
     def __len__(self):
-        return len(self.header_bytes()) + len(self.payload())
+        return self.header_size() + self.cells_size
 
     def __str__(self):
         return "{" + ", ".join([str(self.cells[row_id]) for row_id in self.cells]) + "}"
 
 
+def column_vector(cells: List[LeafCell], column_index: int, data_type: int) -> ColumnVector:
+    # values still in the page bytes are gathered without being decoded, the others come from the decoded datums
+    vector = ColumnVector(data_type, len(cells))
+    stored_type = DATA_TYPES[data_type]
+    for position, cell in enumerate(cells):
+        record = cell.record
+        if isinstance(record, LazyRecord) and record.materialized_values is None:
+            value_type, column_decoder, column_offset, is_text = record.decoder.column_decoders[column_index]
+            if value_type is stored_type:
+                vector.add_stored(position, record.page_bytes, record.values_offset + column_offset)
+                continue
+        value = record[column_index]
+        if not isinstance(value, Null):
+            vector.add_value(position, value.value)
+    return vector.gather()
+
+
+def matching_batch(leaves: List[TableLeafPage], condition: Condition):
+    # (leaf, matching cells) for every leaf, the condition column of all the leaves is compared in one go
+    cells = [cell for leaf in leaves for cell in leaf.cells.values()]
+    if not cells:
+        return [(leaf, []) for leaf in leaves]
+    matched = positions(condition.mask(cells))
+    batch = []
+    start = 0
+    first = 0
+    for leaf in leaves:
+        end = start + len(leaf.cells)
+        last = bisect.bisect_left(matched, end, first)
+        batch.append((leaf, [cells[position] for position in matched[first:last]]))
+        start = end
+        first = last
+    return batch
+
+
+def cell_locations(cell_sizes) -> bytes:
+    # offsets of cells written from the end of the page towards its header, in the order of the sizes
+    locations = []
+    location = PAGE_SIZE
+    for cell_size in cell_sizes:
+        location -= cell_size
+        locations.append(location)
+    return struct.pack('>{}H'.format(len(locations)), *locations)
+
+
+# Interior page of the table b+tree. Every cell holds a row id and the page holding the row ids lower than or equal
+# to it, row ids greater than the last cell live under right_child_page. The cells are kept ordered by row id.
+class TableInteriorPage(TablePage):
+    PAGE_TYPE = TABLE_BTREE_INTERIOR_PAGE
+
+    def __init__(self, page_number: int, page_parent: int, cells=None, right_child_page: int = 0):
+        super(TableInteriorPage, self).__init__(page_number=page_number, page_parent=page_parent, cells=cells)
+        if cells is None:
+            cells = {}
+        self.cells: Dict[int, InternalCell] = cells
+        self.right_child_page: int = right_child_page
+        self.row_ids: List[int] = sorted(self.cells)
+
+    def child_pages(self) -> List[int]:
+        return [self.cells[row_id].left_child_page for row_id in self.row_ids] + [self.right_child_page]
+
+    def child_page(self, row_id: int) -> int:
+        index = bisect.bisect_left(self.row_ids, row_id)
+        if index < len(self.row_ids):
+            return self.cells[self.row_ids[index]].left_child_page
+        return self.right_child_page
+
+    def insert_child(self, row_id: int, left_child_page: int, right_child_page: int):
+        # left_child_page was split at row_id, the row ids above it moved to right_child_page
+        if self.right_child_page == left_child_page:
+            self.right_child_page = right_child_page
+        else:
+            for cell in self.cells.values():
+                if cell.left_child_page == left_child_page:
+                    cell.left_child_page = right_child_page
+                    break
+        self.add_cell(row_id, InternalCell(row_id, left_child_page))
+
+    def add_cell(self, row_id: int, cell: InternalCell = None):
+        self.cells[row_id] = cell
+        self.row_ids = sorted(self.cells)
+        self.cells = {key: self.cells[key] for key in self.row_ids}
+
+    def remove_record(self, row_id: int):
+        del self.cells[row_id]
+        self.row_ids.remove(row_id)
+
+    def set_child_page(self, position: int, child_page: int):
+        if position == len(self.row_ids):
+            self.right_child_page = child_page
+        else:
+            self.cells[self.row_ids[position]].left_child_page = child_page
+
+    def remove_child(self, position: int):
+        # drops the child at position of child_pages, its row ids go to the child on its left, or to the next child
+        # for the first one. The page must keep at least one child.
+        if position:
+            self.set_child_page(position, self.child_pages()[position - 1])
+            self.remove_record(self.row_ids[position - 1])
+        else:
+            self.remove_record(self.row_ids[0])
+
+    def split_into(self, sibling: 'TableInteriorPage') -> int:
+        # moves the cells above the middle one to the sibling, the middle row id moves up to the parent
+        middle = len(self.row_ids) // 2
+        separator = self.row_ids[middle]
+        sibling.cells = {row_id: self.cells[row_id] for row_id in self.row_ids[middle + 1:]}
+        sibling.row_ids = self.row_ids[middle + 1:]
+        sibling.right_child_page = self.right_child_page
+        self.right_child_page = self.cells[separator].left_child_page
+        self.cells = {row_id: self.cells[row_id] for row_id in self.row_ids[:middle]}
+        self.row_ids = self.row_ids[:middle]
+        return separator
+
+    def values(self) -> List[str or int]:
+        return []
+
+    def row_count(self) -> int:
+        return 0
+
+    def is_full(self, cell: InternalCell = None):
+        return self.header_size() + self.payload_size() > PAGE_SIZE
+
+    def header_size(self) -> int:
+        return 17 + 2 * len(self.cells)
+
+    def payload_size(self) -> int:
+        return 8 * len(self.cells)
+
+    def header_bytes(self) -> AnyStr:
+        return b''.join([
+            int_to_bytes(self.PAGE_TYPE, 1),
+            int_to_bytes(len(self.cells), 2),
+            int_to_bytes(PAGE_SIZE - self.payload_size(), 2),
+            int_to_bytes(self.page_number),
+            int_to_bytes(self.page_parent),
+            int_to_bytes(self.right_child_page),
+            b''.join([int_to_bytes(PAGE_SIZE - 8 * (i + 1), 2) for i in range(len(self.cells))])])
+
+    def payload(self) -> AnyStr:
+        return b''.join([bytes(self.cells[row_id]) for row_id in self.row_ids][::-1])
+
+    def __bytes__(self) -> AnyStr:
+        return self.header_bytes() + bytes(PAGE_SIZE - self.header_size() - self.payload_size()) + self.payload()
+
+    def __len__(self):
+        return len(self.header_bytes()) + len(self.payload())
+
+    def __str__(self):
+        return "[" + ", ".join(["{} <= {}".format(self.cells[row_id].left_child_page, row_id)
+                                for row_id in self.row_ids] + ["{}".format(self.right_child_page)]) + "]"
+
+
 def resize_text_data_types(data_types: List[int], record: List[int or str]):
     return [data_types[i] if data_types[i] < 12 else len(record[i]) + 12 for i in range(len(data_types))]
 
 
+# secondary index on one column of a table, a b-tree of [value, row id] elements in its own file. Null values are
+# not indexed.
+class DavisIndex:
+    def __init__(self, name: str, column_index: int, tree: Index_Btree):
+        self.name: str = name
+        self.column_index: int = column_index
+        self.tree: Index_Btree = tree
+
+    def row_ids(self, condition: Condition) -> List[int]:
+        # texts longer than a key are kept by their prefix, so the rows found can include rows the condition does not
+        # match and the leaves are checked against it. Prefixes ending in characters of different widths can sort
+        # below the prefix of the value, a lower bound shorter by the widest character still finds them.
+        value = condition.value.value
+        key = key_prefix(value)
+        low = key_prefix(value, MAX_TEXT_SIZE - 4)
+        bounds = {
+            "=": (key, key, True, True),
+            ">": (low, None, low != value, True),
+            ">=": (low, None, True, True),
+            "<": (None, value, True, False),
+            "<=": (None, value, True, True),
+        }[condition.operator]
+        return sorted([row_id for key, row_id in self.tree.range(*bounds)])
+
+    def insert(self, value: DavisBaseType, row_id: int):
+        if not isinstance(value, Null):
+            self.tree.insert([key_prefix(value.value), row_id])
+
+    def remove(self, value: DavisBaseType, row_id: int):
+        if not isinstance(value, Null):
+            self.tree.remove(key_prefix(value.value), row_id)
+
+
+# Directory of the leaves of a table: the first row id every leaf holds, or could hold, and its page number, in row id
+# order. A row id is mapped to its leaf with one bisect instead of a walk down the interior pages, and a row id range
+# to a run of leaves. Splits add the fence of the new leaf, so appends keep the directory up to date, while removing
+# or moving leaves drops it and the next lookup builds it again from the interior pages.
+class RowIdDirectory:
+    def __init__(self):
+        self.fences: array = array('q')
+        self.page_numbers: array = array('I')
+
+    def append(self, first_row_id: int, page_number: int):
+        self.fences.append(first_row_id)
+        self.page_numbers.append(page_number)
+
+    def add(self, first_row_id: int, page_number: int):
+        position = bisect.bisect_right(self.fences, first_row_id)
+        self.fences.insert(position, first_row_id)
+        self.page_numbers.insert(position, page_number)
+
+    def page_for(self, row_id: int) -> int:
+        return self.page_numbers[max(bisect.bisect_right(self.fences, row_id) - 1, 0)]
+
+    def pages_in_range(self, low: int = None, high: int = None) -> array:
+        start = 0 if low is None else max(bisect.bisect_right(self.fences, low) - 1, 0)
+        end = len(self.fences) if high is None else bisect.bisect_right(self.fences, high)
+        return self.page_numbers[start:end]
+
+    def __len__(self) -> int:
+        return len(self.fences)
+
+
 class DavisTable:
-    def __init__(self, name: str, current_row_id: int = 1, columns_metadata: TableColumnsMetadata = None, pages=None):
+    def __init__(self, name: str, current_row_id: int = 1, columns_metadata: TableColumnsMetadata = None, pages=None,
+                 file: 'TableFile' = None, pool: BufferPool = None, vectorized: bool = True,
+                 scanner: ParallelScanner = None):
         self.name: str = name
+        # full scans of large committed tables are run by the scanner's worker processes when one is given
+        self.scanner: ParallelScanner = scanner
+        # conditions on fixed width columns are evaluated with numpy when it is installed
+        self.vectorized: bool = vectorized
         self.columns_metadata: TableColumnsMetadata = columns_metadata
-        if not pages:
-            pages = [TableLeafPage(0, 0)]
-        self.pages: List[TablePage] = pages
+        # records of new rows are encoded by the encoder compiled for the schema
+        self.encoder: RecordEncoder = RecordEncoder.for_types(columns_metadata.data_type_ints()) \
+            if columns_metadata is not None else None
+        self.file: TableFile = file if file is not None else TableFile()
+        self.pool: BufferPool = pool if pool is not None else BufferPool()
+        # work of the statements on the table is counted with the rest of the database
+        self.stats: Stats = self.pool.stats
+        # overflow pages not committed yet are only in the pool
+        self.file.chain_page = self.page
+        # indexes by the position of the indexed column
+        self.indexes: Dict[int, DavisIndex] = {}
+        # leaves by row id, built on the first lookup
+        self.directory: RowIdDirectory = None
+        for page in pages or []:
+            self.add_page(page)
+        if self.page_count() == 0:
+            self.add_page(TableLeafPage(ROOT_PAGE, ROOT_PAGE))
         self.current_row_id: int = current_row_id
+        if self.is_flat_list_of_leaves():
+            # tables written before the b+tree only have a flat list of leaves
+            self.rebuild()
+
+    def condition(self, column_name: str, operator: str, value: str = None, negated: bool = False) -> Condition:
+        if column_name is None:
+            condition = AndCondition()
+        elif operator in ("is null", "is not null"):
+            condition = IsNullCondition(self.columns_metadata.index(column_name),
+                                        self.columns_metadata.column_definition(column_name).data_type_int,
+                                        negated != (operator == "is not null"))
+        elif column_name == ROW_ID_COLUMN and column_name not in self.columns_metadata.columns:
+            condition = RowIdCondition(operator, Int(value), negated)
+        else:
+            condition = Condition(self.columns_metadata.index(column_name), operator,
+                                  self.columns_metadata.value(column_name, value), negated)
+        condition.vectorized = self.vectorized and condition.is_vectorizable()
+        return condition
+
+    def where(self, clause: tuple = None) -> Condition:
+        # compiles a WHERE clause given as a tree of tuples, ("and", [clause, ...]), ("or", [clause, ...]),
+        # ("not", clause), (column, "is null"), (column, "is not null") or (column, operator, value). No clause
+        # matches every row.
+        condition = self.clause_condition(clause) if clause is not None else AndCondition()
+        condition.vectorized = self.vectorized and condition.is_vectorizable()
+        return condition
+
+    def clause_condition(self, clause: tuple, negated: bool = False) -> Condition:
+        if clause[0] == "not" and isinstance(clause[1], tuple):
+            return self.clause_condition(clause[1], not negated)
+        if clause[0] == "and" and isinstance(clause[1], list):
+            return AndCondition([self.clause_condition(child) for child in clause[1]], negated)
+        if clause[0] == "or" and isinstance(clause[1], list):
+            return OrCondition([self.clause_condition(child) for child in clause[1]], negated)
+        return self.condition(*clause, negated=negated)
 
     def select(self, column_name: str, operator: str, value: str, column_names: List[str] = None) -> List[DavisBaseType]:
-        index = self.columns_metadata.index(column_name)
-        value = self.columns_metadata.value(column_name, value)
+        return self.select_where(self.condition(column_name, operator, value), column_names)
 
+    def select_where(self, condition: Condition, column_names: List[str] = None, limit: int = None,
+                     offset: int = 0) -> List[DavisBaseType]:
+        return list(self.cursor(condition, column_names, limit, offset))
+
+    def cursor(self, condition: Condition, column_names: List[str] = None, limit: int = None, offset: int = 0):
+        # generator of the selected rows in row id order, produced one leaf at a time. The scan stops as soon as
+        # limit rows after the first offset ones were produced, closing the cursor early unpins the current leaf.
         if not column_names or column_names[0] == "*":
-            args = SelectArgs([i for i in range(len(self.columns_metadata.columns))], Condition(index, operator, value))
+            args = SelectArgs([i for i in range(len(self.columns_metadata.columns))], condition)
         else:
-            args = SelectArgs([self.columns_metadata.index(n) for n in column_names], Condition(index, operator, value))
-        return flatten([page.select(args) for page in self.pages])
+            args = SelectArgs([self.columns_metadata.index(n) for n in column_names], condition)
+        if limit is not None and limit <= 0:
+            return
+        # projected text columns, whose long values are read from their overflow pages before the rows are returned
+        text_positions = [position for position, index in enumerate(args.column_indexes) if self.is_text(index)]
+        if limit is None and self.scans_in_parallel(condition):
+            rows = self.scanner.select(self.file.path, self.page_count(), condition, args.column_indexes)
+            self.count_parallel_scan(len(rows))
+            yield from rows[offset:]
+            return
+        matches = self.matches(condition)
+        try:
+            for page, cells in matches:
+                if offset >= len(cells):
+                    # rows skipped by the offset are never projected
+                    offset -= len(cells)
+                    continue
+                cells = cells[offset:] if limit is None else cells[offset:offset + limit]
+                offset = 0
+                rows = page.select(args, cells)
+                if text_positions:
+                    read_overflow(rows, text_positions)
+                yield from rows
+                if limit is not None:
+                    limit -= len(cells)
+                    if limit == 0:
+                        return
+        finally:
+            matches.close()
+
+    def count_where(self, condition: Condition) -> int:
+        if self.scans_in_parallel(condition):
+            count = self.scanner.count(self.file.path, self.page_count(), condition)
+            self.count_parallel_scan(count)
+            return count
+        return sum([len(cells) for page, cells in self.matches(condition)])
+
+    def count_parallel_scan(self, rows_matched: int):
+        # the workers read every page of the file, the cells they decode are not sent back
+        counters = self.stats.current
+        counters.pages_read += self.page_count()
+        counters.rows_matched += rows_matched
+
+    def scans_in_parallel(self, condition: Condition) -> bool:
+        # workers read the table file, so it has to hold every page and the plan has to be a scan of every leaf
+        return self.scanner is not None and self.scanner.is_worthwhile(self.page_count()) \
+            and self.file.path is not None and self.file.file_size == self.page_count() * PAGE_SIZE \
+            and not self.pool.dirty.get(self.file) \
+            and self.indexed_condition(condition) is None and row_id_range(condition) == (None, None)
 
     def insert(self, records: List[List[str]], column_names: List[str] = None):
-
+        # (position, type) of every given value, worked out once for all the records
+        if column_names:
+            definitions = [self.columns_metadata.column_definition(column_name) for column_name in column_names]
+            targets = [(definition.index, DATA_TYPES[definition.data_type_int]) for definition in definitions]
+        else:
+            targets = list(enumerate([DATA_TYPES[data_type] for data_type in self.columns_metadata.data_type_ints()]))
+        has_text = bool(self.text_columns())
+        cells = []
         for record in records:
-            values = [Null() for _ in record]
-            if column_names:
-                index = 0
-                for column_name in column_names:
-                    column_definition = self.columns_metadata.column_definition(column_name)
-                    values[column_definition.index] = DATA_TYPES[column_definition.data_type_int](record[index])
-                    index += 1
-            else:
-                values = []
-                for index in range(len(record)):
-                    data_types = self.columns_metadata.data_type_ints()
-                    values.append(DATA_TYPES[data_types[index]](record[index]))
-
-            cell = LeafCell(self.current_row_id, Record(values))
-            if self.current_page().is_full(cell):
-                self.pages.append(TableLeafPage(len(self.pages), 0))
+            if len(record) != len(targets):
+                raise ValueError("{} values given for {} columns".format(len(record), len(targets)))
+            values = [Null() for _ in self.columns_metadata.columns]
+            for value, (position, data_type) in zip(record, targets):
+                values[position] = data_type(value)
+            cell = LeafCell(self.current_row_id, Record(values, self.encoder))
+            if has_text and len(cell) > MAX_INLINE_TEXT_SIZE:
+                self.spill(values)
+            cells.append(cell)
             self.current_row_id += 1
-            self.current_page().add_cell(self.current_row_id, cell)
+        self.append_cells(cells)
+        for column_index, index in self.indexes.items():
+            for cell in cells:
+                index.insert(cell[column_index], cell.row_id)
+
+    def append_cells(self, cells: List[LeafCell]):
+        # new row ids are larger than every row id of the table, so the cells fill the right most leaf in order and
+        # a full leaf is split with all its cells staying in place
+        leaf = None
+        for cell in cells:
+            if leaf is None or leaf.is_full(cell):
+                if leaf is not None:
+                    self.mark_dirty(leaf)
+                leaf = self.leaf_for(cell.row_id)
+                while leaf.is_full(cell):
+                    if not leaf.cells:
+                        raise ValueError("Record of {} bytes does not fit in a page".format(len(cell)))
+                    leaf = self.split_leaf(leaf, cell.row_id)
+            leaf.add_cell(cell.row_id, cell)
+        if leaf is not None:
+            self.mark_dirty(leaf)
 
     def update(self, column_name: str, value: str, condition_column_name: str, operator: str,
                condition_column_value: str):
+        self.update_where(column_name, value, self.condition(condition_column_name, operator, condition_column_value))
+
+    def update_where(self, column_name: str, value: str, condition: Condition):
         index = self.columns_metadata.index(column_name)
         update_value = self.columns_metadata.value(column_name, value)
-        condition_index = self.columns_metadata.index(condition_column_name)
-        condition_value = self.columns_metadata.value(condition_column_name, condition_column_value)
-        for page in self.pages:
-            page.update(UpdateArgs(index, update_value, Condition(condition_index, operator, condition_value)))
+        column_index = self.indexes.get(index)
+        is_text = self.is_text(index)
+        overflowing = []
+        for page, cells in self.matches(condition):
+            if not cells:
+                continue
+            if column_index:
+                for cell in cells:
+                    column_index.remove(cell[index], cell.row_id)
+                    column_index.insert(update_value, cell.row_id)
+            if is_text:
+                self.free_overflow(cells, [index])
+            if is_text and len(update_value) > MAX_INLINE_TEXT_SIZE:
+                # every row gets its own chain of overflow pages
+                for cell in cells:
+                    page.update(UpdateArgs(index, self.write_overflow(update_value), condition), [cell])
+            else:
+                page.update(UpdateArgs(index, update_value, condition), cells)
+            if is_text:
+                for cell in cells:
+                    self.spill_cell(page, page.cells[cell.row_id], condition)
+            self.mark_dirty(page)
+            if len(page) > PAGE_SIZE:
+                overflowing.append(next(iter(page.cells)))
+        for row_id in overflowing:
+            self.split_if_overflowing(self.leaf_for(row_id))
 
     def delete(self, condition_column_name: str, operator: str, condition_column_value: str):
-        index = self.columns_metadata.index(condition_column_name)
-        value = self.columns_metadata.value(condition_column_name, condition_column_value)
-        for page in self.pages:
-            page.delete(DeleteArgs(Condition(index, operator, value)))
+        self.delete_where(self.condition(condition_column_name, operator, condition_column_value))
+
+    def delete_where(self, condition: Condition):
+        underfull = []
+        for page, cells in self.matches(condition):
+            if self.indexes:
+                for cell in cells:
+                    for column_index, index in self.indexes.items():
+                        index.remove(cell[column_index], cell.row_id)
+            self.free_overflow(cells)
+            if page.delete(DeleteArgs(condition), cells):
+                self.mark_dirty(page)
+                if page.is_underfull():
+                    underfull.append(page.page_number)
+        # the tree is only reshaped once the scan is over
+        self.reclaim(underfull)
+
+    def reclaim(self, page_numbers: List[int]):
+        # empty leaves are taken out of the tree and leaves under half full are merged with a sibling when their
+        # cells fit in one page. The pages left over go to the free page list, where splits take new pages from.
+        if not page_numbers:
+            return
+        for page_number in page_numbers:
+            leaf = self.page(page_number)
+            if page_number == ROOT_PAGE or not isinstance(leaf, TableLeafPage) or not leaf.is_underfull():
+                continue
+            parent = self.page(leaf.page_parent)
+            children = parent.child_pages()
+            position = children.index(page_number)
+            if not leaf.cells:
+                self.remove_child(parent, position)
+                self.free(page_number)
+                continue
+            # the leaf joins its left sibling, or else its right sibling joins it
+            for right_position in [position, position + 1]:
+                if right_position == 0 or right_position == len(children):
+                    continue
+                left, right = self.page(children[right_position - 1]), self.page(children[right_position])
+                if left.can_merge(right):
+                    left.merge(right)
+                    self.mark_dirty(left)
+                    self.remove_child(parent, right_position)
+                    self.free(right.page_number)
+                    break
+        self.shrink_root()
+
+    def remove_child(self, parent: TableInteriorPage, position: int):
+        self.directory = None
+        if parent.row_ids:
+            parent.remove_child(position)
+            self.mark_dirty(parent)
+        elif parent.page_number == ROOT_PAGE:
+            # the last leaf of the table was emptied
+            self.set_page(TableLeafPage(ROOT_PAGE, parent.page_parent))
+        else:
+            grandparent = self.page(parent.page_parent)
+            self.remove_child(grandparent, grandparent.child_pages().index(parent.page_number))
+            self.free(parent.page_number)
+
+    def shrink_root(self):
+        # a root left with a single child takes the content of the child, the reverse of grow_root
+        root = self.root()
+        while isinstance(root, TableInteriorPage) and not root.row_ids:
+            self.directory = None
+            child = self.page(root.right_child_page)
+            if isinstance(child, TableInteriorPage):
+                root = TableInteriorPage(ROOT_PAGE, root.page_parent, child.cells, child.right_child_page)
+                self.set_page(root)
+                self.reparent(root)
+            else:
+                root = TableLeafPage(ROOT_PAGE, root.page_parent, child.cells)
+                self.set_page(root)
+            self.free(child.page_number)
+            root = self.root()
+
+    def free(self, page_number: int):
+        root = self.root()
+        self.set_page(FreePage(page_number, root.page_parent))
+        root.page_parent = page_number
+        self.mark_dirty(root)
+
+    def is_text(self, column_index: int) -> bool:
+        return column_index in self.text_columns()
+
+    def text_columns(self) -> List[int]:
+        return [index for index, data_type in enumerate(self.columns_metadata.data_type_ints())
+                if data_type >= TEXT_TYPE]
+
+    def spill(self, values: List[DavisBaseType]):
+        # texts too long for a type number are moved to overflow pages, then the longest texts until the cell fits
+        for position, value in enumerate(values):
+            if value.__class__ is Text and len(value) > MAX_INLINE_TEXT_SIZE:
+                values[position] = self.write_overflow(value)
+        size = len(LeafCell(0, Record(values)))
+        pointer_size = get_column_size(OverflowText.TYPE_NUMBER)
+        while size > MAX_LOCAL_CELL_SIZE:
+            texts = [position for position, value in enumerate(values)
+                     if value.__class__ is Text and len(value) > pointer_size]
+            if not texts:
+                break
+            position = max(texts, key=lambda text_position: len(values[text_position]))
+            size -= len(values[position]) - pointer_size
+            values[position] = self.write_overflow(values[position])
+
+    def spill_cell(self, page: TableLeafPage, cell: LeafCell, condition: Condition):
+        # an updated text can leave the cell too large for a page, its texts are then spilled as on insert
+        if len(cell) <= MAX_LOCAL_CELL_SIZE:
+            return
+        values = list(cell.values())
+        self.spill(values)
+        for position, value in enumerate(values):
+            if value is not cell[position]:
+                page.update(UpdateArgs(position, value, condition), [cell])
+
+    def write_overflow(self, text: Text) -> OverflowText:
+        data = bytes(text)
+        page_size = PAGE_SIZE - PAGE_HEADER.size
+        pages = [self.add_page(OverflowPage(self.new_page_number(), 0, data[start:start + page_size]))
+                 for start in range(0, len(data), page_size)]
+        for page, next_page in zip(pages, pages[1:]):
+            page.page_parent = next_page.page_number
+        return OverflowText(len(data), pages[0].page_number, self.file, text.value)
+
+    def free_overflow(self, cells: List[LeafCell], column_indexes: List[int] = None):
+        # frees the overflow pages of the texts of the cells, of every column or of the given ones
+        for cell in cells:
+            for column_index in cell.record.overflow_columns():
+                if column_indexes is None or column_index in column_indexes:
+                    page_number = cell[column_index].first_page
+                    while page_number:
+                        next_page = self.page(page_number).page_parent
+                        self.free(page_number)
+                        page_number = next_page
+
+    def new_page_number(self) -> int:
+        # the first free page, or else a page past the end of the file
+        root = self.root()
+        if not root.page_parent:
+            return self.page_count()
+        page_number = root.page_parent
+        root.page_parent = self.page(page_number).page_parent
+        self.mark_dirty(root)
+        return page_number
+
+    def vacuum(self):
+        # rewrites the table with full leaves and without free pages, the file shrinks to the pages it needs. Row
+        # ids do not change, so the indexes stay valid.
+        cells = [cell for leaf in self.leaves() for cell in leaf.cells.values()]
+        spilled = [cell for cell in cells if cell.record.overflow_columns()]
+        for cell in spilled:
+            # the texts are read before their pages are dropped and written again to new chains
+            for column_index in cell.record.overflow_columns():
+                cell.set(column_index, Text(cell[column_index].value))
+        self.pool.discard(self.file)
+        self.file.page_count = 0
+        self.directory = None
+        self.add_page(TableLeafPage(ROOT_PAGE, ROOT_PAGE))
+        for cell in spilled:
+            self.spill(cell.record.values)
+        self.append_cells(cells)
+
+    def add_index(self, index: DavisIndex, fill_factor: float = DEFAULT_FILL_FACTOR):
+        # one scan collects the values of the column, the index is then built bottom up from them
+        elements = []
+        for page in self.leaves():
+            for cell in page.cells.values():
+                value = cell[index.column_index]
+                if not isinstance(value, Null):
+                    elements.append([key_prefix(value.value), cell.row_id])
+        index.tree.bulk_load(elements, fill_factor)
+        self.indexes[index.column_index] = index
+
+    def index_for(self, condition: Condition) -> DavisIndex:
+        if type(condition) is not Condition or condition.negated or condition.operator not in INDEXED_OPERATORS:
+            return None
+        return self.indexes.get(condition.column_index)
+
+    def indexed_condition(self, condition: Condition) -> Condition:
+        # the condition, or one of the conditions joined by AND, that an index can answer
+        if isinstance(condition, AndCondition) and not condition.negated:
+            return next((child for child in condition.conditions if self.index_for(child) is not None), None)
+        return condition if self.index_for(condition) is not None else None
+
+    def leaves_matching(self, condition: Condition):
+        # the plan of a statement: leaves in a row id range for row id conditions, the leaves of the row ids found in
+        # an index on a condition column, or else every leaf
+        indexed = self.indexed_condition(condition)
+        if indexed is None:
+            return self.leaves(*row_id_range(condition))
+        return self.leaves_for(self.indexes[indexed.column_index].row_ids(indexed))
+
+    def matches(self, condition: Condition):
+        # (leaf, cells matching the condition) for the leaves of the plan. Vectorized conditions are evaluated over
+        # batches of leaves, the leaves of a batch are no longer pinned but nothing else fetches them meanwhile. The
+        # batches double up to SCAN_BATCH_PAGES leaves, so a scan stopped after its first rows reads few leaves.
+        if not condition.vectorized:
+            is_point = is_point_lookup(condition)
+            for leaf in self.leaves_matching(condition):
+                cells = leaf.matching(condition)
+                self.count_scan(len(cells) if is_point else len(leaf.cells), len(cells))
+                yield leaf, cells
+            return
+        batch = []
+        batch_size = 1
+        for leaf in self.leaves_matching(condition):
+            batch.append(leaf)
+            if len(batch) == batch_size:
+                yield from self.matching_batch(batch, condition)
+                batch = []
+                batch_size = min(2 * batch_size, SCAN_BATCH_PAGES)
+        yield from self.matching_batch(batch, condition)
+
+    def matching_batch(self, leaves: List[TableLeafPage], condition: Condition):
+        batch = matching_batch(leaves, condition)
+        self.count_scan(sum([len(leaf.cells) for leaf in leaves]), sum([len(cells) for leaf, cells in batch]))
+        return batch
+
+    def count_scan(self, cells_decoded: int, rows_matched: int):
+        counters = self.stats.current
+        counters.cells_decoded += cells_decoded
+        counters.rows_matched += rows_matched
 
     def values(self):
-        return [page.values() for page in self.pages]
+        return [page.values() for page in self.leaves()]
 
     def row_count(self):
-        return sum([page.row_count() for page in self.pages])
+        return sum([page.row_count() for page in self.leaves()])
 
     def current_page(self) -> TablePage:
-        return self.pages[len(self.pages) - 1]
-
-    def __bytes__(self) -> bytes:
-        return b''.join([bytes(page) for page in self.pages])
-
-    def __str__(self) -> str:
-        return str([str(page) for page in self.pages])
-
+        page = self.root()
+        while isinstance(page, TableInteriorPage):
+            page = self.page(page.right_child_page)
+        return page
 
-class DavisIndex:
-    def __init__(self, name):
-        self.name = name
+    def page(self, page_number: int) -> TablePage:
+        # the page is not pinned, callers that change it mark it dirty before fetching any other page
+        page = self.pool.fetch(self.file, page_number)
+        self.pool.unpin(self.file, page_number)
+        return page
 
+    def page_count(self) -> int:
+        return self.file.page_count
 
-class PageReader:
-    def __init__(self, page_bytes):
-        self.page_bytes = page_bytes
-        self.reader = BytesIO(self.page_bytes)
+    def root(self) -> TablePage:
+        return self.page(ROOT_PAGE)
 
-    def read(self, size: int) -> bytes:
-        return self.reader.read(size)
+    def add_page(self, page: TablePage) -> TablePage:
+        if page.page_number == self.page_count():
+            self.file.allocate()
+        self.pool.add(self.file, page)
+        return page
 
-    def seek(self, n: int, whence: int = 0) -> int:
-        return self.reader.seek(n, whence)
+    def set_page(self, page: TablePage):
+        self.pool.mark_dirty(self.file, page)
+
+    def mark_dirty(self, *pages: TablePage):
+        for page in pages:
+            self.pool.mark_dirty(self.file, page)
+
+    def leaves(self, low: int = None, high: int = None):
+        # leaf pages holding the row ids between low and high (inclusive, None is unbounded) in row id order,
+        # each leaf stays pinned until the caller moves on to the next one
+        for page_number in self.row_id_directory().pages_in_range(low, high):
+            page = self.pool.fetch(self.file, page_number)
+            try:
+                yield page
+            finally:
+                self.pool.unpin(self.file, page_number)
+
+    def row_id_directory(self) -> RowIdDirectory:
+        if self.directory is None:
+            # the interior pages above the leaves give the first row id of every leaf, the leaves are not read
+            self.directory = RowIdDirectory()
+            self.add_fences(ROOT_PAGE, 0, self.depth())
+        return self.directory
+
+    def add_fences(self, page_number: int, first_row_id: int, depth: int):
+        if depth == 1:
+            self.directory.append(first_row_id, page_number)
+            return
+        page = self.page(page_number)
+        for row_id, child_page in zip(page.row_ids + [None], page.child_pages()):
+            self.add_fences(child_page, first_row_id, depth - 1)
+            if row_id is not None:
+                first_row_id = row_id + 1
+
+    def leaves_for(self, row_ids: List[int]):
+        # leaves holding the given sorted row ids, each visited once and pinned while the caller uses it
+        position = 0
+        while position < len(row_ids):
+            page_number = self.leaf_for(row_ids[position]).page_number
+            leaf = self.pool.fetch(self.file, page_number)
+            last_row_id = max(next(reversed(leaf.cells)), row_ids[position]) if leaf.cells else row_ids[position]
+            try:
+                yield leaf
+            finally:
+                self.pool.unpin(self.file, page_number)
+            position = bisect.bisect_right(row_ids, last_row_id, position)
+
+    def leaf_for(self, row_id: int) -> TableLeafPage:
+        return self.page(self.row_id_directory().page_for(row_id))
+
+    def find(self, row_id: int) -> LeafCell:
+        return self.leaf_for(row_id).cells.get(row_id)
+
+    def max_row_id(self) -> int:
+        page = self.current_page()
+        if not page.cells:
+            # the right most leaf was emptied by deletes
+            row_ids = [row_id for leaf in self.leaves() for row_id in leaf.cells]
+            return row_ids[-1] if row_ids else 0
+        return next(reversed(page.cells))
+
+    def depth(self) -> int:
+        depth = 1
+        page = self.root()
+        while isinstance(page, TableInteriorPage):
+            page = self.page(page.right_child_page)
+            depth += 1
+        return depth
+
+    def insert_cell(self, cell: LeafCell):
+        leaf = self.leaf_for(cell.row_id)
+        while leaf.is_full(cell):
+            if not leaf.cells:
+                raise ValueError("Record of {} bytes does not fit in a page".format(len(cell)))
+            leaf = self.split_leaf(leaf, cell.row_id)
+        leaf.add_cell(cell.row_id, cell)
+        self.mark_dirty(leaf)
+
+    def split_leaf(self, leaf: TableLeafPage, row_id: int) -> TableLeafPage:
+        # splits a full leaf and returns the leaf where row_id belongs afterwards
+        if leaf.page_number == ROOT_PAGE:
+            leaf = self.grow_root()
+        sibling = self.add_page(TableLeafPage(self.new_page_number(), leaf.page_parent))
+        separator = leaf.split_into(sibling, row_id)
+        if self.directory is not None:
+            self.directory.add(separator + 1, sibling.page_number)
+        self.mark_dirty(leaf)
+        self.insert_into_parent(leaf, separator, sibling)
+        return leaf if row_id <= separator else sibling
+
+    def split_interior(self, page: TableInteriorPage):
+        if page.page_number == ROOT_PAGE:
+            page = self.grow_root()
+        sibling = self.add_page(TableInteriorPage(self.new_page_number(), page.page_parent))
+        separator = page.split_into(sibling)
+        self.mark_dirty(page)
+        self.reparent(sibling)
+        self.insert_into_parent(page, separator, sibling)
+
+    def insert_into_parent(self, page: TablePage, separator: int, sibling: TablePage):
+        parent = self.page(page.page_parent)
+        parent.insert_child(separator, page.page_number, sibling.page_number)
+        sibling.page_parent = parent.page_number
+        self.mark_dirty(parent, sibling)
+        if parent.is_full():
+            self.split_interior(parent)
+
+    def reparent(self, page: TableInteriorPage):
+        for child_page in page.child_pages():
+            child = self.page(child_page)
+            child.page_parent = page.page_number
+            self.mark_dirty(child)
+
+    def grow_root(self) -> TablePage:
+        # the root always stays on the first page, so its content moves to a new child page instead
+        self.directory = None
+        page_number = self.new_page_number()
+        root = self.root()
+        if isinstance(root, TableInteriorPage):
+            child = self.add_page(TableInteriorPage(page_number, ROOT_PAGE, root.cells, root.right_child_page))
+            self.reparent(child)
+        else:
+            child = self.add_page(TableLeafPage(page_number, ROOT_PAGE, root.cells))
+        self.set_page(TableInteriorPage(ROOT_PAGE, root.page_parent, right_child_page=child.page_number))
+        return child
+
+    def split_if_overflowing(self, leaf: TableLeafPage):
+        # updates can grow text values past what the page can hold
+        if len(leaf) <= PAGE_SIZE or len(leaf.cells) < 2:
+            return
+        row_ids = list(leaf.cells)
+        leaf = self.split_leaf(leaf, row_ids[0])
+        self.split_if_overflowing(leaf)
+        self.split_if_overflowing(self.leaf_for(row_ids[-1]))
+
+    def is_flat_list_of_leaves(self) -> bool:
+        # a b+tree whose root is a leaf can only have more pages when they are overflow or free pages
+        if self.page_count() == 1 or not isinstance(self.root(), TableLeafPage) or self.root().page_parent:
+            return False
+        return all([isinstance(self.page(page_number), TableLeafPage) for page_number in range(self.page_count())])
+
+    def rebuild(self):
+        cells = sorted([cell for page_number in range(self.page_count())
+                        for cell in self.page(page_number).cells.values() if isinstance(cell, LeafCell)],
+                       key=lambda c: c.row_id)
+        self.pool.discard(self.file)
+        self.file.page_count = 0
+        self.directory = None
+        self.add_page(TableLeafPage(ROOT_PAGE, ROOT_PAGE))
+        for cell in cells:
+            self.insert_cell(cell)
+
+    def dirty_pages(self) -> List[TablePage]:
+        return self.pool.dirty_pages(self.file)
 
-    def tell(self):
-        return self.tell()
+    def __bytes__(self) -> bytes:
+        return b''.join([bytes(self.page(page_number)) for page_number in range(self.page_count())])
 
-    def read_int(self, size: int = 4) -> int:
-        return bytes_to_int(self.reader.read(size))
+    def __str__(self) -> str:
+        return str([str(page) for page in self.leaves()])
+
+
+def row_id_range(condition: Condition) -> (int, int):
+    return condition.row_id_range()
+
+
+def read_overflow(rows: List[List[DavisBaseType]], positions: List[int]):
+    # replaces the long texts of the rows by their value, read from the overflow pages while they are still there
+    for row in rows:
+        for position in positions:
+            value = row[position]
+            if value.__class__ is OverflowText:
+                row[position] = Text.decoded(value.value)
+
+
+PAGE_HEADER = struct.Struct('>BHHII')  # page type, number of cells, content area offset, page number, page parent
+RIGHT_CHILD_PAGE = struct.Struct('>I')
+LEAF_CELL_HEADER = struct.Struct('>HIB')  # payload size, row id, number of columns
+LEAF_CELL_ROW = struct.Struct('>HI')  # payload size, row id
+INTERIOR_CELL = struct.Struct('>II')  # left child page, row id
+CELL_OFFSETS: Dict[int, struct.Struct] = {}
+
+
+def cell_offsets_struct(number_of_cells: int) -> struct.Struct:
+    offsets = CELL_OFFSETS.get(number_of_cells)
+    if offsets is None:
+        offsets = CELL_OFFSETS[number_of_cells] = struct.Struct('>{}H'.format(number_of_cells))
+    return offsets
+
+
+# Decodes the values of a record with one struct call for the big endian integers and text and one for the floats,
+# which are stored in native byte order. A decoder is compiled once for every distinct sequence of column types.
+# Single columns can also be decoded on their own, from their offset in the record payload.
+class RecordDecoder:
+    DECODERS: Dict[bytes, 'RecordDecoder'] = {}
+    COLUMN_STRUCTS: Dict[str, struct.Struct] = {}
+
+    def __init__(self, data_types: bytes):
+        big_endian = '>'
+        native = '='
+        big_endian_count = 0
+        native_values = []
+        # (type, index in the unpacked values, is text) for every column
+        self.columns = []
+        # (type, struct, offset in the payload, is text) for every column
+        self.column_decoders = []
+        self.column_count: int = len(data_types)
+        # columns holding a text moved to overflow pages
+        self.overflow_columns: List[int] = [index for index, data_type in enumerate(data_types)
+                                            if data_type == OverflowText.TYPE_NUMBER]
+        column_offset = 0
+        for data_type in data_types:
+            size = get_column_size(data_type)
+            if data_type == 0:
+                self.columns.append((Null, None, False))
+                self.column_decoders.append((Null, None, column_offset, False))
+                continue
+            byte_order = '=' if data_type in NATIVE_ORDER_TYPES else '>'
+            column_format = STRUCT_FORMATS.get(data_type, '{}s'.format(size))
+            self.column_decoders.append((DATA_TYPES[data_type], column_struct(byte_order + column_format),
+                                         column_offset, data_type not in STRUCT_FORMATS))
+            column_offset += size
+            if data_type in NATIVE_ORDER_TYPES:
+                big_endian += '{}x'.format(size)
+                native += column_format
+                native_values.append(len(self.columns))
+                self.columns.append((DATA_TYPES[data_type], None, False))
+            else:
+                big_endian += column_format
+                native += '{}x'.format(size)
+                self.columns.append((DATA_TYPES[data_type], big_endian_count, data_type not in STRUCT_FORMATS))
+                big_endian_count += 1
+        for native_index, column in enumerate(native_values):
+            self.columns[column] = (self.columns[column][0], big_endian_count + native_index, False)
+        self.big_endian = struct.Struct(big_endian) if big_endian_count else None
+        self.native = struct.Struct(native) if native_values else None
+
+    @classmethod
+    def for_types(cls, data_types: bytes) -> 'RecordDecoder':
+        decoder = cls.DECODERS.get(data_types)
+        if decoder is None:
+            decoder = cls.DECODERS[data_types] = RecordDecoder(data_types)
+        return decoder
+
+    def decode(self, buffer, offset: int) -> List[DavisBaseType]:
+        values = (self.big_endian.unpack_from(buffer, offset) if self.big_endian else ()) \
+                 + (self.native.unpack_from(buffer, offset) if self.native else ())
+        return [data_type.decoded(None if index is None else values[index].decode('utf-8') if is_text else values[index])
+                for data_type, index, is_text in self.columns]
+
+    def decode_column(self, buffer, offset: int, index: int) -> DavisBaseType:
+        data_type, column_decoder, column_offset, is_text = self.column_decoders[index]
+        if column_decoder is None:
+            return data_type.decoded()
+        value, = column_decoder.unpack_from(buffer, offset + column_offset)
+        return data_type.decoded(value.decode('utf-8') if is_text else value)
+
+
+# Encoder of the records of one table schema, compiled once from the declared column types. A record is packed by
+# one struct holding its header and every column, texts being fixed size strings of the struct. The struct only
+# depends on the sizes of the texts of the record, so the structs and headers are kept by text sizes. Floats are
+# stored in native byte order, they are packed on their own first and go in the struct as strings. Records holding a
+# NULL, a text moved to overflow pages or a value of another type are left to Record, size and encode return None.
+class RecordEncoder:
+    ENCODERS: Dict[tuple, 'RecordEncoder'] = {}
+
+    def __init__(self, data_types: tuple):
+        self.data_types: tuple = data_types
+        self.value_types: List[type] = [DATA_TYPES[data_type] for data_type in data_types]
+        self.text_columns: List[int] = [index for index, data_type in enumerate(data_types) if data_type >= TEXT_TYPE]
+        # (index, struct) of the columns stored in native byte order
+        self.native_columns: List[tuple] = [(index, struct.Struct('=' + STRUCT_FORMATS[data_type]))
+                                            for index, data_type in enumerate(data_types)
+                                            if data_type in NATIVE_ORDER_TYPES]
+        self.fixed_size: int = 1 + len(data_types) + sum([get_column_size(data_type) for data_type in data_types
+                                                          if data_type < TEXT_TYPE])
+        # text sizes -> (header bytes, struct of the columns)
+        self.layouts: Dict[tuple, tuple] = {}
+
+    @classmethod
+    def for_types(cls, data_types: List[int]) -> 'RecordEncoder':
+        data_types = tuple(data_types)
+        encoder = cls.ENCODERS.get(data_types)
+        if encoder is None:
+            encoder = cls.ENCODERS[data_types] = RecordEncoder(data_types)
+        return encoder
+
+    def layout(self, text_sizes: tuple) -> tuple:
+        type_numbers = list(self.data_types)
+        column_formats = []
+        for index, data_type in enumerate(self.data_types):
+            if data_type >= TEXT_TYPE:
+                size = text_sizes[self.text_columns.index(index)]
+                type_numbers[index] = TEXT_TYPE + size
+                column_formats.append('{}s'.format(size))
+            elif data_type in NATIVE_ORDER_TYPES:
+                column_formats.append('{}s'.format(get_column_size(data_type)))
+            else:
+                column_formats.append(STRUCT_FORMATS[data_type])
+        layout = (bytes([len(type_numbers)] + type_numbers), struct.Struct('>' + ''.join(column_formats)))
+        if len(self.layouts) < MAX_ENCODER_LAYOUTS:
+            self.layouts[text_sizes] = layout
+        return layout
+
+    def size(self, values: List[DavisBaseType]) -> int:
+        if list(map(type, values)) != self.value_types:
+            return None
+        size = self.fixed_size
+        for index in self.text_columns:
+            text = values[index].value
+            size += len(text) if text.isascii() else len(text.encode('utf-8'))
+        return size
+
+    def encode(self, values: List[DavisBaseType]) -> bytes:
+        if list(map(type, values)) != self.value_types:
+            return None
+        raw_values = [value.value for value in values]
+        text_sizes = []
+        for index in self.text_columns:
+            text = raw_values[index] = raw_values[index].encode('utf-8')
+            if len(text) > MAX_INLINE_TEXT_SIZE:
+                return None
+            text_sizes.append(len(text))
+        for index, packer in self.native_columns:
+            raw_values[index] = packer.pack(raw_values[index])
+        text_sizes = tuple(text_sizes)
+        header, packer = self.layouts.get(text_sizes) or self.layout(text_sizes)
+        return header + packer.pack(*raw_values)
+
+
+def column_struct(column_format: str) -> struct.Struct:
+    decoder = RecordDecoder.COLUMN_STRUCTS.get(column_format)
+    if decoder is None:
+        decoder = RecordDecoder.COLUMN_STRUCTS[column_format] = struct.Struct(column_format)
+    return decoder
 
-    def read_byte(self) -> int:
-        return self.read_int(1)
 
-    def read_short(self) -> int:
-        return self.read_int(2)
+class PageReader:
+    def __init__(self, page_bytes, file: 'TableFile' = None):
+        self.page_bytes = page_bytes
+        self.file: TableFile = file
 
     def read_page(self) -> TablePage:
-        log_debug("reading page")
-        page_type = self.read_byte()
-        log_debug("type", page_type)
-        number_of_cells = self.read_short()
-        log_debug("number_of_cells={}".format(number_of_cells))
-        content_area_offset = self.read_short()
-        log_debug("content_area_offset={}".format(content_area_offset))
-        page_number = self.read_int()
-        log_debug("page_number={}".format(page_number))
-        page_parent = self.read_int()
-        log_debug("page_parent={}".format(page_parent))
-        cells_offsets = [self.read_short() for i in range(number_of_cells)]
-        log_debug("cells_offsets={}".format(cells_offsets))
-        page = TableLeafPage(page_number=page_number, page_parent=page_parent)
-        for cell_offset in cells_offsets:
-            self.seek(cell_offset)
-            log_debug("reading cell at cell_offset={}".format(cell_offset))
-            if page_type == TABLE_BTREE_LEAF_PAGE:
-                cell_payload_size = self.read_short()
-                log_debug("cell_payload_size={}".format(cell_payload_size))
-                row_id = self.read_int()
-                log_debug("row_id={}".format(row_id))
-                number_of_columns = self.read_byte()
-                log_debug("number_of_columns", number_of_columns)
-                column_data_types = [self.read_byte() for i in range(number_of_columns)]
-                log_debug("column_data_types={}".format(column_data_types))
-                page.data_types = column_data_types
-                values = [DATA_TYPES[column_type](self.read(get_column_size(column_type))) for column_type in
-                          column_data_types]
-                log_debug("values={}".format([str(v) for v in values]))
-                page.add_cell(row_id, LeafCell(row_id, Record(values)))
+        with memoryview(self.page_bytes) as page_bytes:
+            page_type, number_of_cells, content_area_offset, page_number, page_parent = \
+                PAGE_HEADER.unpack_from(page_bytes)
+            log_debug("read page", page_number, "type", page_type, "cells", number_of_cells)
+            cells = {}
+            if page_type == FREE_PAGE:
+                return FreePage(page_number, page_parent)
+            if page_type == OVERFLOW_PAGE:
+                data_start = PAGE_HEADER.size
+                return OverflowPage(page_number, page_parent,
+                                    bytes(page_bytes[data_start:data_start + content_area_offset]))
             if page_type == TABLE_BTREE_INTERIOR_PAGE:
-                left_child_page_number = self.read_int()
-                row_id = self.read_int()
-                # table.add_cell(row_id, LeafCell(row_id, Record(data_types, values)))
-        return page
+                right_child_page, = RIGHT_CHILD_PAGE.unpack_from(page_bytes, PAGE_HEADER.size)
+                offsets = cell_offsets_struct(number_of_cells).unpack_from(page_bytes,
+                                                                           PAGE_HEADER.size + RIGHT_CHILD_PAGE.size)
+                for cell_offset in offsets:
+                    left_child_page, row_id = INTERIOR_CELL.unpack_from(page_bytes, cell_offset)
+                    cells[row_id] = InternalCell(row_id, left_child_page)
+                return TableInteriorPage(page_number, page_parent, cells, right_child_page)
+
+            # the cells keep the page bytes for lazy decoding, copying the page once lets a mapped file be closed
+            page_copy = bytes(page_bytes)
+            offsets = array('H', cell_offsets_struct(number_of_cells).unpack_from(page_bytes, PAGE_HEADER.size))
+            row_ids = array('I')
+            cells_size = 0
+            for cell_offset in offsets:
+                payload_size, row_id, number_of_columns = LEAF_CELL_HEADER.unpack_from(page_bytes, cell_offset)
+                row_ids.append(row_id)
+                cells_size += leaf_cell_header_size() + payload_size
+            packed = PageCells(page_copy, row_ids, offsets, cells_size, self.file)
+            if any(row_ids[i] >= row_ids[i + 1] for i in range(len(row_ids) - 1)):
+                # pages written before cells were kept in row id order
+                cells = {cell.row_id: cell for cell in sorted(packed.values(), key=lambda cell: cell.row_id)}
+                return TableLeafPage(page_number, page_parent, cells)
+            return TableLeafPage(page_number, page_parent, packed)
 
 
 class TableFile:
 
-    def __init__(self, path: str):
+    def __init__(self, path: str = None, use_mmap: bool = False):
         self.path = path
         self.table_file = None
-        self.file_size = os.path.getsize(self.path)
+        self.file_size = os.path.getsize(self.path) if path and os.path.isfile(path) else 0
+        # pages allocated so far, including the ones not written to the file yet
+        self.page_count = math.ceil(self.file_size / PAGE_SIZE)
+        # with use_mmap pages are slices of the mapped file, served from the OS page cache without a read per page
+        self.use_mmap = use_mmap
+        self.mapped = None
+        self.mapped_view = None
+        # reads the pages of overflow chains, a table reads them through its buffer pool instead
+        self.chain_page: Callable[[int], TablePage] = self.read_page
 
     def read_pages(self) -> List[TablePage]:
-        self.table_file = open(self.path, "rb")
-        pages = [self.read_page() for _ in range(math.ceil(self.file_size / 512))]
+        pages = [self.read_page(page_number) for page_number in range(self.written_page_count())]
         self.close()
         return pages
 
     def write(self, table: DavisTable):
+        self.close()
         self.table_file = open(self.path, "wb")
         self.table_file.write(bytes(table))
         self.table_file.close()
+        self.table_file = None
+        self.file_size = self.page_count * PAGE_SIZE
 
-    def read_page(self) -> TablePage:
-        return PageReader(self.table_file.read(512)).read_page()
+    def write_pages(self, pages: List[TablePage]):
+        # writes each page at its own offset, the rest of the file is left untouched
+        self.close()
+        with open(self.path, "r+b" if os.path.isfile(self.path) else "wb") as table_file:
+            for page in pages:
+                table_file.seek(page.page_number * PAGE_SIZE)
+                table_file.write(bytes(page))
+            if self.file_size > self.page_count * PAGE_SIZE:
+                # the table was rebuilt or recreated with fewer pages
+                table_file.truncate(self.page_count * PAGE_SIZE)
+            # the write ahead log is emptied once the pages are durable here
+            table_file.flush()
+            os.fsync(table_file.fileno())
+        self.file_size = self.page_count * PAGE_SIZE
+
+    def written_page_count(self) -> int:
+        # pages in the file itself, pages allocated since are only in the buffer pool
+        return math.ceil(self.file_size / PAGE_SIZE)
+
+    def read_page(self, page_number: int) -> TablePage:
+        page_bytes = self.page_bytes(page_number)
+        try:
+            return self.decode_page(page_bytes)
+        finally:
+            if isinstance(page_bytes, memoryview):
+                page_bytes.release()
+
+    def decode_page(self, page_bytes: bytes or memoryview) -> TablePage:
+        return PageReader(page_bytes, self).read_page()
+
+    def page_bytes(self, page_number: int) -> bytes or memoryview:
+        if self.use_mmap:
+            if self.mapped is None:
+                self.table_file = open(self.path, "rb")
+                self.mapped = mmap.mmap(self.table_file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.mapped_view = memoryview(self.mapped)
+            return self.mapped_view[page_number * PAGE_SIZE:(page_number + 1) * PAGE_SIZE]
+        if self.table_file is None:
+            self.table_file = open(self.path, "rb")
+        self.table_file.seek(page_number * PAGE_SIZE)
+        return self.table_file.read(PAGE_SIZE)
+
+    def allocate(self) -> int:
+        self.page_count += 1
+        return self.page_count - 1
+
+    def read_text(self, first_page: int, size: int) -> str:
+        chunks = []
+        page_number = first_page
+        while page_number:
+            page = self.chain_page(page_number)
+            chunks.append(page.data)
+            page_number = page.page_parent
+        return b''.join(chunks)[:size].decode('utf-8')
 
     def close(self):
-        self.table_file.close()
+        if self.mapped is not None:
+            self.mapped_view.release()
+            self.mapped.close()
+            self.mapped = None
+            self.mapped_view = None
+        if self.table_file:
+            self.table_file.close()
+            self.table_file = None
 
 
 def create_path_if_not_exists(path: str):
@@ -474,8 +1929,9 @@ class DavisBaseFS:
     CATALOG_FOLDER_PATH = 'catalog'
     DATA_FOLDER_PATH = 'storage'
 
-    def __init__(self, folder: str):
+    def __init__(self, folder: str, use_mmap: bool = True):
         self.folder: str = os.path.abspath(folder)
+        self.use_mmap: bool = use_mmap
         create_path_if_not_exists(self.catalog_folder_path())
         create_path_if_not_exists(self.storage_folder_path())
 
@@ -485,51 +1941,188 @@ class DavisBaseFS:
     def storage_folder_path(self) -> str:
         return self.folder + "/" + self.DATA_FOLDER_PATH
 
-    def read_catalog_table(self, name) -> List[TablePage]:
-        path = self.catalog_folder_path() + '/' + name + ".tbl"
-        if os.path.isfile(path):
-            pages = TableFile(os.path.abspath(path)).read_pages()
-            # log_debug("pages read", pages)
-            return pages
-        # else:
-        #     log_debug("catalog table not found", name)
-        return []
+    def catalog_table_file(self, name: str) -> TableFile:
+        return TableFile(os.path.abspath(self.catalog_folder_path() + '/' + name + ".tbl"), self.use_mmap)
 
-    def read_storage_table(self, name):
+    def storage_table_file(self, name: str) -> TableFile:
         path = self.storage_folder_path() + '/' + name + ".tbl"
-        if os.path.isfile(path):
-            log_debug("storage table found, reading ", name)
-            pages = TableFile(os.path.abspath(path)).read_pages()
-            log_debug("pages read", pages)
-            return pages
-        else:
-            log_debug("storage table not found", name)
-        return []
+        log_debug("storage table found" if os.path.isfile(path) else "storage table not found", name)
+        return TableFile(os.path.abspath(path), self.use_mmap)
 
-    def read_tables_table(self) -> List[TablePage]:
-        return self.read_catalog_table('davisbase_table')
+    def create_storage_table_file(self, name: str) -> TableFile:
+        # a dropped table may have left its file behind, its pages are overwritten by the new table
+        table_file = self.storage_table_file(name)
+        table_file.page_count = 0
+        return table_file
 
-    def read_columns_table(self) -> List[TablePage]:
-        return self.read_catalog_table('davisbase_columns')
+    def tables_table_file(self) -> TableFile:
+        return self.catalog_table_file('davisbase_table')
+
+    def columns_table_file(self) -> TableFile:
+        return self.catalog_table_file('davisbase_columns')
 
     def write_columns_table(self, table: DavisTable):
         return self.write_catalog_table(table)
 
     def write_data_table(self, table: DavisTable):
-        path = self.storage_folder_path() + '/' + table.name + ".tbl"
-        self.write_table(path, table)
+        self.write_table(table)
 
     def write_catalog_table(self, table: DavisTable):
-        path = self.catalog_folder_path() + '/' + table.name + ".tbl"
-        self.write_table(path, table)
+        self.write_table(table)
+
+    def write_table(self, table: DavisTable):
+        # only the pages changed since the last commit are written, the table file was opened from this folder
+        table.file.write_pages(table.dirty_pages())
 
-    def write_table(self, path: str, table: DavisTable):
-        with open(path, "wb") as table_file:
-            table_file.write(bytes(table))
-            table_file.close()
+    def index_file_path(self, table_name: str, column_name: str) -> str:
+        return os.path.abspath(self.storage_folder_path() + '/' + table_name + '_' + column_name + ".ndx")
 
     def write_index(self, index: DavisIndex):
-        pass
+        # only the index pages changed since the last commit are written
+        index.tree.flush()
+
+    def remove_index(self, index: DavisIndex):
+        if os.path.isfile(index.tree.file.path):
+            os.remove(index.tree.file.path)
+
+    def wal_path(self) -> str:
+        return self.folder + '/davisbase.wal'
+
+    def relative_path(self, path: str) -> str:
+        return os.path.relpath(path, self.folder)
+
+    def replay(self, wal: WriteAheadLog):
+        # writes the pages of every complete statement of the log to their files, in log order, and empties the log.
+        # Runs before any table or index file is opened.
+        page_counts = {}
+        files = {}
+        try:
+            for payload in wal.records():
+                for path, page_count, pages in decode_statement(payload, PAGE_SIZE):
+                    table_file = files.get(path)
+                    if table_file is None:
+                        full_path = os.path.join(self.folder, path)
+                        table_file = files[path] = open(full_path, "r+b" if os.path.isfile(full_path) else "wb")
+                    for page_number, page_bytes in pages.items():
+                        table_file.seek(page_number * PAGE_SIZE)
+                        table_file.write(page_bytes)
+                    page_counts[path] = page_count
+            for path, table_file in files.items():
+                table_file.truncate(page_counts[path] * PAGE_SIZE)
+                table_file.flush()
+                os.fsync(table_file.fileno())
+        finally:
+            for table_file in files.values():
+                table_file.close()
+        if files:
+            log_debug("replayed the write ahead log into", len(files), "files")
+        wal.truncate()
+
+
+# Schemas of the tables of a database, read once from davisbase_tables and davisbase_columns into dictionaries by
+# table name when the database is opened, so opening a table or inserting rows does not scan the catalog tables.
+# Creating and dropping tables and moving the row id of a table write through to the catalog tables, whose rows are
+# found by the row ids kept here.
+class Catalog:
+    def __init__(self, tables_table: DavisTable, columns_table: DavisTable):
+        self.tables_table: DavisTable = tables_table
+        self.columns_table: DavisTable = columns_table
+        # table name -> row id of the row of the table in davisbase_tables
+        self.table_row_ids: Dict[str, int] = {}
+        # table name -> table_rowid of that row
+        self.current_row_ids: Dict[str, int] = {}
+        # table name -> (column name, data type, ordinal position, row id in davisbase_columns) of its columns
+        self.columns: Dict[str, List[tuple]] = {}
+        self.load()
+
+    @staticmethod
+    def rows(table: DavisTable, column_indexes: List[int]):
+        # (row id, raw values of the columns) of every row of a catalog table
+        for leaf in table.leaves():
+            for cell in leaf.cells.values():
+                yield cell.row_id, [cell[index].value for index in column_indexes]
+
+    def load(self):
+        for row_id, (table_name, current_row_id) in self.rows(self.tables_table, [1, 2]):
+            self.table_row_ids[table_name] = row_id
+            self.current_row_ids[table_name] = current_row_id
+        for row_id, (table_name, column_name, data_type, position) in self.rows(self.columns_table, [1, 2, 3, 4]):
+            self.columns.setdefault(table_name, []).append((column_name, data_type, position, row_id))
+
+    def table_names(self) -> List[str]:
+        return list(self.table_row_ids)
+
+    def columns_metadata(self, table_name: str) -> TableColumnsMetadata:
+        # later rows of a column replace earlier ones, the rows of dropped tables used to be left behind
+        return TableColumnsMetadata({column_name: ColumnDefinition(data_type, position)
+                                     for column_name, data_type, position, row_id in self.columns.get(table_name, [])})
+
+    def add_table(self, table_name: str, columns_metadata: TableColumnsMetadata):
+        row_id = self.tables_table.current_row_id
+        self.tables_table.insert([[row_id, table_name, 0]])
+        self.table_row_ids[table_name] = row_id
+        self.current_row_ids[table_name] = 0
+        rows = []
+        columns = []
+        for position, column_name in enumerate(columns_metadata.columns):
+            data_type = columns_metadata.column_definition(column_name).data_type_str
+            row_id = self.columns_table.current_row_id + position
+            rows.append([row_id, table_name, column_name, data_type, position, 'YES'])
+            columns.append((column_name, data_type, position, row_id))
+        self.columns_table.insert(rows)
+        self.columns[table_name] = columns
+
+    def remove_table(self, table_name: str):
+        row_id = self.table_row_ids.pop(table_name, None)
+        self.current_row_ids.pop(table_name, None)
+        if row_id is not None:
+            self.tables_table.delete_where(RowIdCondition("=", Int(row_id)))
+        for column_name, data_type, position, row_id in self.columns.pop(table_name, []):
+            self.columns_table.delete_where(RowIdCondition("=", Int(row_id)))
+
+    def set_current_row_id(self, table_name: str, current_row_id: int):
+        row_id = self.table_row_ids.get(table_name)
+        if row_id is None or self.current_row_ids[table_name] == current_row_id:
+            return
+        self.tables_table.update_where("table_rowid", str(current_row_id), RowIdCondition("=", Int(row_id)))
+        self.current_row_ids[table_name] = current_row_id
+
+
+# Runs a DavisBase statement under the database lock and makes its changes durable before returning. The pages the
+# statement changed are appended to the write ahead log while the lock is held, so the log keeps the order of the
+# statements. The fsync happens after the lock is released, statements of other threads can share it. The work of
+# the statement is counted and added to the totals of its table, named by its first argument.
+def statement(method):
+    @functools.wraps(method)
+    def run(self, *args, **kwargs):
+        table_name = kwargs.get('table_name', args[0] if args else None)
+        counters = Counters()
+        with self.lock:
+            current = self.stats.current
+            self.stats.current = counters
+            try:
+                start = clock()
+                try:
+                    result = method(self, *args, **kwargs)
+                except BaseException:
+                    self.roll_back()
+                    raise
+                start = counters.add_scan(start, (0.0, 0.0))
+                position = self.log_statement()
+                start = counters.add_commit(start)
+            finally:
+                self.stats.current = current
+            if not position:
+                self.stats.record(table_name, counters)
+                return result
+        self.wal.sync(position)
+        if self.wal.size >= self.checkpoint_bytes:
+            self.checkpointer.request()
+        counters.add_commit(start)
+        with self.lock:
+            self.stats.record(table_name, counters)
+        return result
+    return run
 
 
 class DavisBase:
@@ -548,21 +2141,37 @@ class DavisBase:
         "is_nullable": ColumnDefinition("TEXT", 5)
     }
 
-    def __init__(self):
+    def __init__(self, folder: str = None, buffer_pool_pages: int = DEFAULT_BUFFER_POOL_PAGES, use_mmap: bool = True,
+                 vectorized: bool = True, scan_workers: int = None, wal: bool = True,
+                 group_commit_delay: float = 0.0, checkpoint_bytes: int = DEFAULT_CHECKPOINT_BYTES):
         self.tables: Dict[str, DavisTable] = {}
+        self.stats: Stats = Stats()
+        self.vectorized: bool = vectorized
+        # one worker per cpu unless given, a single worker turns parallel scans off
+        self.scanner: ParallelScanner = ParallelScanner(scan_workers)
         self.indexes = {}
-        self.fs = DavisBaseFS(os.path.dirname(__file__) + '/../data')
+        self.fs = DavisBaseFS(folder if folder else os.path.dirname(__file__) + '/../data', use_mmap)
+        self.pool = BufferPool(buffer_pool_pages, self.stats)
+        # statements and checkpoints hold the lock, the buffer pool and the tables are not shared otherwise
+        self.lock = threading.RLock()
+        # without a write ahead log changes are only durable after commit
+        self.wal: WriteAheadLog = WriteAheadLog(self.fs.wal_path(), group_commit_delay) if wal else None
+        # a checkpoint starts in the background once the log grows past checkpoint_bytes
+        self.checkpoint_bytes: int = checkpoint_bytes
+        self.checkpointer: Checkpointer = Checkpointer(self.commit)
+        if self.wal:
+            self.fs.replay(self.wal)
 
-        table_pages = self.fs.read_tables_table()
         tables_metadata = TableColumnsMetadata(self.TABLES_TABLE_COLUMN_METADATA)
-        self.davisbase_tables = DavisTable('davisbase_table', columns_metadata=tables_metadata, pages=table_pages)
-        self.davisbase_tables.current_row_id = self.davisbase_tables.row_count() + 1
+        self.davisbase_tables = DavisTable('davisbase_table', columns_metadata=tables_metadata,
+                                           file=self.fs.tables_table_file(), pool=self.pool, vectorized=vectorized)
+        self.davisbase_tables.current_row_id = self.davisbase_tables.max_row_id() + 1
         if self.davisbase_tables.row_count() == 0:
             self.davisbase_tables.insert([[1, 'davisbase_tables', 2], [2, 'davisbase_columns', 9]])
-        columns_pages = self.fs.read_columns_table()
         columns_metadata = TableColumnsMetadata(self.COLUMNS_TABLE_COLUMN_METADATA)
-        self.davisbase_columns = DavisTable('davisbase_columns', columns_metadata=columns_metadata, pages=columns_pages)
-        self.davisbase_columns.current_row_id = self.davisbase_columns.row_count() + 1
+        self.davisbase_columns = DavisTable('davisbase_columns', columns_metadata=columns_metadata,
+                                            file=self.fs.columns_table_file(), pool=self.pool, vectorized=vectorized)
+        self.davisbase_columns.current_row_id = self.davisbase_columns.max_row_id() + 1
         if self.davisbase_columns.row_count() == 0:
             self.davisbase_columns.insert([
                 [1, 'davis_tables', 'rowid', 'INT', 1, 'NO'],
@@ -574,84 +2183,258 @@ class DavisBase:
                 [7, 'davisbase_columns', 'ordinal_position', 'TINYINT', 5, 'NO'],
                 [8, 'davisbase_columns', 'is_nullable', 'TEXT', 6, 'NO']])
         self.tables['davisbase_tables'] = self.davisbase_tables
-        self.tables['davisbase_columns'] = self.davisbase_tables
+        self.tables['davisbase_columns'] = self.davisbase_columns
+        self.catalog: Catalog = Catalog(self.davisbase_tables, self.davisbase_columns)
+        # the catalog of a new database is logged with the first statement, but must not be rolled back with it
+        self.log_statement()
 
+    @statement
     def show_tables(self):
-        rows = self.davisbase_tables.select("rowid", ">=", "0", ['table_name'])
-        for row in rows:
-            for c in row:
-                print(str(c))
-
+        for table_name in self.catalog.table_names():
+            print(table_name)
+
+    @statement
+    def show_stats(self):
+        columns = ('table',) + COUNTS[:-1] + ('bytes',) + tuple(name + '_ms' for name in TIMES)
+        print(' '.join(['{:>14}'.format(column) for column in columns]))
+        for table_name, counters in sorted(self.stats.tables.items()):
+            values = counters.as_dict()
+            print(' '.join(['{:>14}'.format(table_name)] + ['{:>14}'.format(values[name]) for name in COUNTS] +
+                           ['{:>14.3f}'.format(values[name] * 1000) for name in TIMES]))
+
+    def statistics(self, table_name: str = None) -> dict:
+        # counters of every statement run on the table since the database was opened, or of every table by name
+        with self.lock:
+            if table_name is not None:
+                return self.stats.tables.get(table_name, Counters()).as_dict()
+            return {name: counters.as_dict() for name, counters in self.stats.tables.items()}
+
+    def last_statement_stats(self) -> dict:
+        with self.lock:
+            return self.stats.last.as_dict() if self.stats.last is not None else None
+
+    @statement
     def create_table(self, name: str, columns_metadata: TableColumnsMetadata) -> DavisTable:
-        table = DavisTable(name, columns_metadata=columns_metadata)
+        table = DavisTable(name, columns_metadata=columns_metadata, file=self.fs.create_storage_table_file(name),
+                           pool=self.pool, vectorized=self.vectorized, scanner=self.scanner)
         self.tables[name] = table
-        self.davisbase_tables.insert([[self.davisbase_tables.current_row_id, name, 0]])
-
-        columns = []
-        current_row_id = self.davisbase_columns.row_count()
-        position = 0
-        for column_name in columns_metadata.columns:
-            columns.append(
-                [current_row_id, name, column_name, columns_metadata.column_definition(column_name).data_type_str,
-                 position, 'YES'])
-            current_row_id += 1
-            position += 1
-        self.davisbase_columns.insert(columns)
-
+        self.catalog.add_table(name, columns_metadata)
         return table
 
+    @statement
     def drop_table(self, table_name: str):
-        if table_name in self.tables:
-            del self.tables[table_name]
-        self.davisbase_tables.delete('table_name', "=", table_name)
-
-    def create_index(self):
-        # Index_Btree(self,5)
-        pass
+        self.load_table_if_not_loaded(table_name)
+        # the log must not keep pages of the index files removed below, a replay would bring them back
+        self.commit()
+        for index in self.tables[table_name].indexes.values():
+            self.fs.remove_index(index)
+            del self.indexes[index.name]
+        self.pool.discard(self.tables[table_name].file)
+        del self.tables[table_name]
+        self.catalog.remove_table(table_name)
+
+    @statement
+    def create_index(self, table_name: str, column_name: str, fill_factor: float = DEFAULT_FILL_FACTOR) -> DavisIndex:
+        self.load_table_if_not_loaded(table_name)
+        table = self.tables[table_name]
+        name = table_name + '_' + column_name
+        if name in self.indexes:
+            return self.indexes[name]
+        path = self.fs.index_file_path(table_name, column_name)
+        if os.path.isfile(path):
+            os.remove(path)
+        index = DavisIndex(name, table.columns_metadata.index(column_name), Index_Btree(DEFAULT_ORDER, path))
+        table.add_index(index, fill_factor)
+        self.indexes[name] = index
+        return index
 
+    @statement
     def select(self, table_name: str, column_name: str, operator: str, value: str, column_names: List[str] = None) -> List[
         DavisBaseType]:
         self.load_table_if_not_loaded(table_name)
         return self.tables[table_name].select(column_name, operator, value, column_names)
 
+    @statement
+    def select_where(self, table_name: str, where: tuple = None, column_names: List[str] = None, limit: int = None,
+                     offset: int = 0) -> List[DavisBaseType]:
+        # where is a clause tree as taken by DavisTable.where, compiled once for the whole statement
+        self.load_table_if_not_loaded(table_name)
+        table = self.tables[table_name]
+        return list(table.cursor(self.where(table, where), column_names, limit, offset))
+
+    def cursor(self, table_name: str, where: tuple = None, column_names: List[str] = None, limit: int = None,
+               offset: int = 0):
+        # the rows of select_where, produced lazily as the table is scanned. The database lock is held while a row
+        # is produced, not in between, and the statement is counted once the cursor is closed.
+        counters = Counters()
+        with self.lock:
+            current = self.stats.current
+            self.stats.current = counters
+            try:
+                start = clock()
+                self.load_table_if_not_loaded(table_name)
+                table = self.tables[table_name]
+                rows = table.cursor(self.where(table, where), column_names, limit, offset)
+                counters.add_scan(start, (0.0, 0.0))
+            finally:
+                self.stats.current = current
+        return self.locked_rows(table_name, rows, counters)
+
+    def locked_rows(self, table_name: str, rows, counters: Counters):
+        stats = self.stats
+        try:
+            while True:
+                with self.lock:
+                    current = stats.current
+                    stats.current = counters
+                    try:
+                        nested = counters.nested()
+                        start = clock()
+                        row = next(rows, None)
+                        counters.add_scan(start, nested)
+                    finally:
+                        stats.current = current
+                if row is None:
+                    return
+                yield row
+        finally:
+            with self.lock:
+                rows.close()
+                stats.record(table_name, counters)
+
+    def where(self, table: DavisTable, where: tuple = None) -> Condition:
+        start = clock()
+        condition = table.where(where)
+        self.stats.current.add_parse(start)
+        return condition
+
+    @statement
+    def count_where(self, table_name: str, where: tuple = None) -> int:
+        self.load_table_if_not_loaded(table_name)
+        table = self.tables[table_name]
+        return table.count_where(self.where(table, where))
+
     def insert(self, table_name: str, rows: List[str], column_names: List[str] = None):
+        self.insert_many(table_name, [rows], column_names)
+
+    @statement
+    def insert_many(self, table_name: str, rows: List[List[str]], column_names: List[str] = None):
+        # the catalog row id of the table is updated once for the whole batch
         self.load_table_if_not_loaded(table_name)
-        self.tables[table_name].insert([rows], column_names)
-        self.davisbase_tables.update("table_rowid", str(self.tables[table_name].current_row_id), "table_name", "=",
-                                     table_name)
+        self.tables[table_name].insert(rows, column_names)
+        self.catalog.set_current_row_id(table_name, self.tables[table_name].current_row_id)
 
+    @statement
     def update(self, table_name: str, column_name: str, value: str, condition_column_name: str, operator: str,
                condition_column_value: str):
         self.load_table_if_not_loaded(table_name)
         self.tables[table_name].update(column_name, value, condition_column_name, operator, condition_column_value)
 
+    @statement
+    def update_where(self, table_name: str, column_name: str, value: str, where: tuple = None):
+        self.load_table_if_not_loaded(table_name)
+        table = self.tables[table_name]
+        table.update_where(column_name, value, self.where(table, where))
+
+    @statement
     def delete(self, table_name: str, condition_column_name: str, operator: str, condition_column_value: str):
         self.load_table_if_not_loaded(table_name)
         self.tables[table_name].delete(condition_column_name, operator, condition_column_value)
 
+    @statement
+    def delete_where(self, table_name: str, where: tuple = None):
+        self.load_table_if_not_loaded(table_name)
+        table = self.tables[table_name]
+        table.delete_where(self.where(table, where))
+
+    @statement
+    def vacuum(self, table_name: str):
+        self.load_table_if_not_loaded(table_name)
+        self.tables[table_name].vacuum()
+
     def load_table_if_not_loaded(self, table_name: str):
         if table_name not in self.tables:
-            pages = self.fs.read_storage_table(table_name)
-            result = self.davisbase_columns.select( 'table_name', "=",
-                                                   table_name,['column_name', 'data_type', 'ordinal_position'])
-            metadata = {}
-            for r in result:
-                name = r[0]
-                data_type =r[1]
-                position =r[2]
-                metadata[name.value] = ColumnDefinition(data_type.value, position.value)
-            table = DavisTable(table_name, columns_metadata=TableColumnsMetadata(metadata), pages=pages)
+            # an unknown name must not open a table, the file would be created by the next commit
+            if table_name not in self.catalog.table_row_ids:
+                raise ValueError("Table {} does not exist".format(table_name))
+            columns_metadata = self.catalog.columns_metadata(table_name)
+            metadata = columns_metadata.columns
+            table = DavisTable(table_name, columns_metadata=columns_metadata,
+                               file=self.fs.storage_table_file(table_name), pool=self.pool,
+                               vectorized=self.vectorized, scanner=self.scanner)
+            # row ids of deleted rows at the end of the table are not handed out again
+            table.current_row_id = max(self.catalog.current_row_ids.get(table_name, 0), table.max_row_id() + 1)
+            for column_name in metadata:
+                path = self.fs.index_file_path(table_name, column_name)
+                if os.path.isfile(path):
+                    index = DavisIndex(table_name + '_' + column_name, metadata[column_name].index,
+                                       Index_Btree(DEFAULT_ORDER, path))
+                    table.indexes[index.column_index] = index
+                    self.indexes[index.name] = index
             self.tables[table_name] = table
         return None
 
+    def log_statement(self) -> int:
+        # appends the pages changed since the last statement to the write ahead log, returns the log position to sync
+        # or 0 when nothing changed. Without a log the images are still taken, a failed statement is rolled back to
+        # them.
+        counters = self.stats.current
+        files = []
+        for file in self.pool.unlogged_files():
+            files.append((self.fs.relative_path(file.path), file.page_count, self.pool.take_unlogged(file)))
+        for index in self.indexes.values():
+            if index.tree.unlogged:
+                files.append((self.fs.relative_path(index.tree.file.path), index.tree.page_count,
+                              index.tree.take_unlogged()))
+        if not files or self.wal is None:
+            return 0
+        payload = encode_statement(files)
+        counters.pages_written += sum([len(pages) for path, page_count, pages in files])
+        counters.bytes_serialized += len(payload)
+        return self.wal.append(payload)
+
+    def roll_back(self):
+        # puts back the pages changed by a failed statement as they were after the last statement
+        for file in self.pool.unlogged_files():
+            self.pool.roll_back(file)
+        for index in self.indexes.values():
+            if index.tree.unlogged:
+                index.tree.roll_back()
+        for table in self.tables.values():
+            # the directory may hold leaves that were dropped
+            table.directory = None
+
+    def close(self):
+        # writes every change to the table files, the log is left empty
+        self.checkpointer.stop()
+        self.commit()
+        self.scanner.close()
+        if self.wal:
+            self.wal.close()
+
     def commit(self):
+        # checkpoint: the dirty pages are written to the table and index files and synced, then the log is emptied
+        with self.lock:
+            start = clock()
+            self.write_all()
+            if self.wal:
+                self.wal.truncate()
+            self.stats.current.add_commit(start)
+
+    def write_all(self):
+        counters = self.stats.current
         for table_name in self.tables:
+            pages_written = len(self.pool.dirty.get(self.tables[table_name].file, ()))
+            counters.pages_written += pages_written
+            counters.bytes_serialized += pages_written * PAGE_SIZE
             if table_name == 'davisbase_tables':
                 self.fs.write_catalog_table(self.davisbase_tables)
-                continue
             elif table_name == 'davisbase_columns':
                 self.fs.write_catalog_table(self.davisbase_columns)
-                continue
-            self.fs.write_data_table(self.tables[table_name])
+            else:
+                self.fs.write_data_table(self.tables[table_name])
+            self.pool.mark_clean(self.tables[table_name].file)
         for index_name in self.indexes:
+            counters.pages_written += len(self.indexes[index_name].tree.dirty)
+            counters.bytes_serialized += len(self.indexes[index_name].tree.dirty) * PAGE_SIZE
             self.fs.write_index(self.indexes[index_name])
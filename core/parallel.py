@@ -0,0 +1,70 @@
+import heapq
+import os
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+from typing import List, Tuple
+
+# tables with fewer pages are scanned in the calling process, starting workers would cost more than the scan
+PARALLEL_SCAN_MIN_PAGES = 512
+# page ranges handed out per worker, more ranges than workers evens out ranges holding more leaves than others
+RANGES_PER_WORKER = 4
+
+
+def scan_pages(path: str, first_page: int, last_page: int, condition, column_indexes: List[int] = None):
+    # runs in a worker: reads the pages of the range straight from the table file and returns the (row id, row) of
+    # the matching cells ordered by row id, or only their number without column indexes
+    from core.model import TableFile, TableLeafPage, matching_batch, read_overflow
+    table_file = TableFile(path, use_mmap=True)
+    try:
+        leaves = [page for page in [table_file.read_page(page_number) for page_number in range(first_page, last_page)]
+                  if isinstance(page, TableLeafPage)]
+        if condition.vectorized:
+            matches = matching_batch(leaves, condition)
+        else:
+            matches = [(leaf, leaf.matching(condition)) for leaf in leaves]
+        if column_indexes is None:
+            return sum([len(cells) for leaf, cells in matches])
+        # long texts are read from their overflow pages while the file is open, they are sent back as plain text
+        rows = [(cell.row_id, [cell[index] for index in column_indexes]) for leaf, cells in matches for cell in cells]
+        read_overflow([row for row_id, row in rows], range(len(column_indexes)))
+    finally:
+        table_file.close()
+    rows.sort(key=itemgetter(0))
+    return rows
+
+
+# Scans a committed table file with a pool of worker processes. The file is split into page ranges, every worker
+# decodes and filters its ranges on its own and the results are merged back in row id order. Leaves are spread over
+# the whole file, so ranges are by page number and not by row id. The pool is started on the first parallel scan.
+class ParallelScanner:
+    def __init__(self, workers: int = None, min_pages: int = PARALLEL_SCAN_MIN_PAGES):
+        self.workers: int = workers if workers is not None else os.cpu_count() or 1
+        self.min_pages: int = min_pages
+        self.executor: ProcessPoolExecutor = None
+
+    def is_worthwhile(self, page_count: int) -> bool:
+        return self.workers > 1 and page_count >= self.min_pages
+
+    def ranges(self, page_count: int) -> List[Tuple[int, int]]:
+        range_count = min(page_count, self.workers * RANGES_PER_WORKER)
+        bounds = [page_count * i // range_count for i in range(range_count + 1)]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    def submit(self, path: str, page_count: int, condition, column_indexes: List[int] = None):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(self.workers)
+        futures = [self.executor.submit(scan_pages, path, first_page, last_page, condition, column_indexes)
+                   for first_page, last_page in self.ranges(page_count)]
+        return [future.result() for future in futures]
+
+    def select(self, path: str, page_count: int, condition, column_indexes: List[int]) -> List[List]:
+        results = self.submit(path, page_count, condition, column_indexes)
+        return [row for row_id, row in heapq.merge(*results, key=itemgetter(0))]
+
+    def count(self, path: str, page_count: int, condition) -> int:
+        return sum(self.submit(path, page_count, condition))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
@@ -0,0 +1,87 @@
+import time
+from typing import Dict
+
+# work counted for every statement
+COUNTS = ('statements', 'pages_read', 'pages_written', 'cells_decoded', 'rows_matched', 'bytes_serialized')
+# wall clock and CPU seconds of the phases of a statement: compiling its where clause, running it against the pages
+# and making it durable (logging the changed pages, syncing the log, checkpoints)
+TIMES = ('parse_wall', 'parse_cpu', 'scan_wall', 'scan_cpu', 'commit_wall', 'commit_cpu')
+
+
+# Counters are added to once or more per page and statement, so they are plain attributes
+class Counters:
+    __slots__ = COUNTS + TIMES
+
+    def __init__(self):
+        self.statements = self.pages_read = self.pages_written = self.cells_decoded = self.rows_matched = \
+            self.bytes_serialized = 0
+        self.parse_wall = self.parse_cpu = self.scan_wall = self.scan_cpu = self.commit_wall = self.commit_cpu = 0.0
+
+    def add(self, other: 'Counters'):
+        self.statements += other.statements
+        self.pages_read += other.pages_read
+        self.pages_written += other.pages_written
+        self.cells_decoded += other.cells_decoded
+        self.rows_matched += other.rows_matched
+        self.bytes_serialized += other.bytes_serialized
+        self.parse_wall += other.parse_wall
+        self.parse_cpu += other.parse_cpu
+        self.scan_wall += other.scan_wall
+        self.scan_cpu += other.scan_cpu
+        self.commit_wall += other.commit_wall
+        self.commit_cpu += other.commit_cpu
+
+    # the phases add the time since start and return the clock they read, the start of the next phase
+
+    def add_parse(self, start: (float, float)) -> (float, float):
+        now = clock()
+        self.parse_wall += now[0] - start[0]
+        self.parse_cpu += now[1] - start[1]
+        return now
+
+    def nested(self) -> (float, float):
+        return self.parse_wall + self.commit_wall, self.parse_cpu + self.commit_cpu
+
+    def add_scan(self, start: (float, float), nested: (float, float)) -> (float, float):
+        # time spent parsing or committing since start, nested was taken then, is counted in those phases only
+        now = clock()
+        nested_wall, nested_cpu = self.nested()
+        self.scan_wall += now[0] - start[0] - (nested_wall - nested[0])
+        self.scan_cpu += now[1] - start[1] - (nested_cpu - nested[1])
+        return now
+
+    def add_commit(self, start: (float, float)) -> (float, float):
+        now = clock()
+        self.commit_wall += now[0] - start[0]
+        self.commit_cpu += now[1] - start[1]
+        return now
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def clock() -> (float, float):
+    # CPU time of the calling thread, statements of other threads are not counted
+    return time.perf_counter(), time.thread_time()
+
+
+# Counters of the statements of a database. Pages, tables and the database add to the counters of the running
+# statement, which are swapped in under the database lock, so statements of other threads never add to them. Work
+# done outside statements, opening the database or checkpoints of the background thread, and statements on no table
+# are counted apart from the tables.
+class Stats:
+    def __init__(self):
+        self.other: Counters = Counters()
+        self.current: Counters = self.other
+        # table name -> counters of every statement run on the table
+        self.tables: Dict[str, Counters] = {}
+        # counters of the last statement that ended
+        self.last: Counters = None
+
+    def record(self, table_name: str, counters: Counters):
+        counters.statements += 1
+        self.last = counters
+        totals = self.tables.get(table_name) if table_name is not None else self.other
+        if totals is None:
+            totals = self.tables[table_name] = Counters()
+        totals.add(counters)
@@ -1,6 +1,7 @@
 from typing import AnyStr, List
 
-from core.datum import Null, TinyInt, SmallInt, Int, Long, Float, Double, Year, Time, DateTime, Date, Text
+from core.datum import Null, TinyInt, SmallInt, Int, Long, Float, Double, Year, Time, DateTime, Date, Text, \
+    OverflowText
 
 IS_DEBUG_LOGGING_ENABLED = False
 
@@ -51,6 +52,12 @@ for i in range(12, 115):
 
 data_type_encodings = {v: k for k, v in DATA_TYPE_NAMES.items()}
 
+# type number of the empty text, longer texts add their size to it
+TEXT_TYPE = 11
+# longer texts can not be given a type number, they are moved to overflow pages
+MAX_INLINE_TEXT_SIZE = 114 - TEXT_TYPE
+DATA_TYPES[OverflowText.TYPE_NUMBER] = OverflowText
+
 
 def is_int(data_type: int) -> bool:
     return 0 < DATA_TYPE_NAMES[data_type] < 5
@@ -69,10 +76,18 @@ def int_to_bytes(number: int, size: int = 4) -> AnyStr:
 
 
 def get_column_size(column_type: int) -> int:
+    if column_type == OverflowText.TYPE_NUMBER:
+        # size of the text and first overflow page
+        return 8
     return {0: 0, 1: 1, 2: 2, 3: 4, 4: 8, 5: 4, 6: 8, 7: 1, 8: 4, 9: 8, 10: 8}[column_type] \
         if column_type < 11 else column_type - 11
 
 
+# struct format of the fixed width types. Integers are big endian, floats are stored in native byte order
+STRUCT_FORMATS = {1: 'b', 2: 'h', 3: 'i', 4: 'q', 5: 'f', 6: 'd', 7: 'b', 8: 'i', 9: 'q', 10: 'q', 115: 'Q'}
+NATIVE_ORDER_TYPES = {5, 6}
+
+
 def value_to_bytes(value: str or int, value_byte_size: int) -> AnyStr:
     return bytes(value, 'utf-8') if isinstance(value, str) else int_to_bytes(value, value_byte_size)
 
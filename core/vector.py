@@ -0,0 +1,82 @@
+import operator
+from typing import Dict, List
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# numpy type of the stored bytes of the fixed width types. Integers are big endian, floats are stored in native byte
+# order, the same layouts as STRUCT_FORMATS
+STORED_DTYPES = {1: 'i1', 2: '>i2', 3: '>i4', 4: '>i8', 5: '=f4', 6: '=f8', 7: 'i1', 8: '>i4', 9: '>i8', 10: '>i8'}
+FLOAT_TYPES = {5, 6}
+
+COMPARISONS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<>": operator.ne,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+
+def is_available() -> bool:
+    return numpy is not None
+
+
+def all_rows(length: int):
+    return numpy.ones(length, dtype=bool)
+
+
+def is_vectorizable(data_type: int, operator_str: str) -> bool:
+    return numpy is not None and data_type in STORED_DTYPES and operator_str in COMPARISONS
+
+
+# Values of one fixed width column for a list of cells. The values stored in page buffers are gathered with one
+# fancy index per buffer, values already decoded are copied one by one. Integers are widened to int64 and floats to
+# float64 so comparisons with python numbers give the same answers as the row by row path. Rows holding NULL are
+# left out of valid.
+class ColumnVector:
+    def __init__(self, data_type: int, length: int):
+        self.data_type: int = data_type
+        self.values = numpy.zeros(length, dtype=numpy.float64 if data_type in FLOAT_TYPES else numpy.int64)
+        self.valid = numpy.zeros(length, dtype=bool)
+        # id of the buffer -> (buffer, positions of the cells, offsets of their values in the buffer)
+        self.stored: Dict[int, tuple] = {}
+
+    def add_stored(self, position: int, buffer, offset: int):
+        stored = self.stored.get(id(buffer))
+        if stored is None:
+            stored = self.stored[id(buffer)] = (buffer, [], [])
+        stored[1].append(position)
+        stored[2].append(offset)
+
+    def add_value(self, position: int, value: int or float):
+        self.values[position] = value
+        self.valid[position] = True
+
+    def gather(self) -> 'ColumnVector':
+        stored_dtype = numpy.dtype(STORED_DTYPES[self.data_type])
+        byte_offsets = numpy.arange(stored_dtype.itemsize)
+        for buffer, positions, offsets in self.stored.values():
+            data = numpy.frombuffer(buffer, dtype=numpy.uint8)
+            value_bytes = data[numpy.array(offsets)[:, None] + byte_offsets]
+            self.values[positions] = value_bytes.view(stored_dtype).ravel()
+            self.valid[positions] = True
+        self.stored = {}
+        return self
+
+    def mask(self, operator_str: str, value: int or float):
+        # NULL is only different from a value, it never satisfies =, <, <=, > or >=
+        if operator_str == "!=":
+            return (self.values != value) | ~self.valid
+        return COMPARISONS[operator_str](self.values, value) & self.valid
+
+    def null_mask(self):
+        return ~self.valid
+
+
+def positions(mask) -> List[int]:
+    return numpy.flatnonzero(mask).tolist()
@@ -0,0 +1,179 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Callable, Dict, List, Tuple
+
+from core.util import log_debug
+
+# Every statement is one record of the log: its payload size and checksum, then the payload. The payload holds, for
+# every file changed by the statement, the path of the file relative to the database folder, the number of pages of
+# the file after the statement and the image of every page it changed.
+RECORD_HEADER = struct.Struct('>II')  # payload size, crc32 of the payload
+FILE_HEADER = struct.Struct('>HII')  # path size, page count of the file, number of page images
+PAGE_NUMBER = struct.Struct('>I')
+FILE_COUNT = struct.Struct('>H')
+
+# (path relative to the database folder, page count, page images by page number)
+FileChanges = Tuple[str, int, Dict[int, bytes]]
+
+
+def encode_statement(files: List[FileChanges]) -> bytes:
+    parts = [FILE_COUNT.pack(len(files))]
+    for path, page_count, pages in files:
+        path_bytes = path.encode('utf-8')
+        parts.append(FILE_HEADER.pack(len(path_bytes), page_count, len(pages)))
+        parts.append(path_bytes)
+        for page_number in sorted(pages):
+            parts.append(PAGE_NUMBER.pack(page_number))
+            parts.append(pages[page_number])
+    return b''.join(parts)
+
+
+def decode_statement(payload: bytes, page_size: int) -> List[FileChanges]:
+    files = []
+    file_count, = FILE_COUNT.unpack_from(payload)
+    offset = FILE_COUNT.size
+    for _ in range(file_count):
+        path_size, page_count, page_images = FILE_HEADER.unpack_from(payload, offset)
+        offset += FILE_HEADER.size
+        path = payload[offset:offset + path_size].decode('utf-8')
+        offset += path_size
+        pages = {}
+        for _ in range(page_images):
+            page_number, = PAGE_NUMBER.unpack_from(payload, offset)
+            offset += PAGE_NUMBER.size
+            pages[page_number] = payload[offset:offset + page_size]
+            offset += page_size
+        files.append((path, page_count, pages))
+    return files
+
+
+# Append only log of the page images written by statements. append adds a record to the OS file and returns the log
+# position after it, sync makes the log durable up to a position. Statements running at the same time share fsyncs:
+# the first one to sync leads, waits group_commit_delay seconds for others to append, and syncs every record appended
+# so far while the others wait for it instead of issuing their own fsync.
+class WriteAheadLog:
+    def __init__(self, path: str, group_commit_delay: float = 0.0):
+        self.path: str = path
+        self.group_commit_delay: float = group_commit_delay
+        self.log_file = open(path, 'ab')
+        self.size: int = self.log_file.tell()
+        self.lock = threading.Lock()
+        self.synced = threading.Condition(self.lock)
+        # positions only grow, truncating the log does not reset them
+        self.appended_position: int = 0
+        self.synced_position: int = 0
+        self.syncing: bool = False
+        self.sync_count: int = 0
+
+    def append(self, payload: bytes) -> int:
+        with self.lock:
+            self.log_file.write(RECORD_HEADER.pack(len(payload), zlib.crc32(payload)))
+            self.log_file.write(payload)
+            self.size += RECORD_HEADER.size + len(payload)
+            self.appended_position += RECORD_HEADER.size + len(payload)
+            return self.appended_position
+
+    def sync(self, position: int):
+        with self.lock:
+            while self.synced_position < position:
+                if self.syncing:
+                    # another statement leads the group, its fsync may cover this record
+                    self.synced.wait()
+                    continue
+                self.syncing = True
+                try:
+                    if self.group_commit_delay:
+                        self.lock.release()
+                        try:
+                            time.sleep(self.group_commit_delay)
+                        finally:
+                            self.lock.acquire()
+                    target = self.appended_position
+                    self.log_file.flush()
+                    self.lock.release()
+                    try:
+                        os.fsync(self.log_file.fileno())
+                    finally:
+                        self.lock.acquire()
+                    self.sync_count += 1
+                    self.synced_position = max(self.synced_position, target)
+                finally:
+                    self.syncing = False
+                    self.synced.notify_all()
+
+    def truncate(self):
+        # called once every logged page is durable in its own file
+        with self.lock:
+            self.log_file.flush()
+            self.log_file.truncate(0)
+            os.fsync(self.log_file.fileno())
+            self.size = 0
+            self.synced_position = self.appended_position
+            self.synced.notify_all()
+
+    def records(self) -> List[bytes]:
+        # payloads of the complete records, a record torn by a crash and anything after it are left out
+        with self.lock:
+            self.log_file.flush()
+        payloads = []
+        with open(self.path, 'rb') as log_file:
+            data = log_file.read()
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            size, checksum = RECORD_HEADER.unpack_from(data, offset)
+            payload = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + size]
+            if len(payload) < size or zlib.crc32(payload) != checksum:
+                break
+            payloads.append(payload)
+            offset += RECORD_HEADER.size + size
+        return payloads
+
+    def close(self):
+        self.log_file.close()
+
+
+# Background thread running checkpoint whenever it is requested, so the statement that fills the log does not wait
+# for the table files to be written.
+class Checkpointer:
+    def __init__(self, checkpoint: Callable[[], None]):
+        self.checkpoint: Callable[[], None] = checkpoint
+        self.requested = threading.Event()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.stopped: bool = False
+        self.thread: threading.Thread = None
+
+    def request(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='davisbase-checkpoint', daemon=True)
+            self.thread.start()
+        self.idle.clear()
+        self.requested.set()
+
+    def run(self):
+        while True:
+            self.requested.wait()
+            self.requested.clear()
+            if self.stopped:
+                return
+            try:
+                self.checkpoint()
+            except Exception as error:
+                # the log still holds every change, the next checkpoint or the next start writes them
+                log_debug("checkpoint failed", error)
+            finally:
+                if not self.requested.is_set():
+                    self.idle.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        return self.idle.wait(timeout)
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopped = True
+            self.requested.set()
+            self.thread.join()
+            self.thread = None
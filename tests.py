@@ -1,8 +1,16 @@
+import contextlib
+import io
+import os
+import tempfile
+import threading
 import unittest
 
 from core.model import DavisBase, Record, LeafCell, TableLeafPage, DavisTable, TableColumnsMetadata, UpdateArgs, \
-    Condition, SelectArgs, DeleteArgs, ColumnDefinition
-from core.datum import Null, TinyInt, SmallInt, Int, Long, Float, Double, Year, Time, DateTime, Date, Text
+    Condition, SelectArgs, DeleteArgs, ColumnDefinition, TableInteriorPage, PageReader, PAGE_SIZE, TableFile, \
+    OverflowPage, PageCells, RecordEncoder, AndCondition
+from Index import Index_Btree
+from core.datum import Null, TinyInt, SmallInt, Int, Long, Float, Double, Year, Time, DateTime, Date, Text, \
+    OverflowText
 
 
 class FileIoTests(unittest.TestCase):
@@ -139,6 +147,920 @@ class FileIoTests(unittest.TestCase):
     def empty_database_init(self):
         pass
 
+    def test_read_page_all_types(self):
+        values = [Null(), TinyInt(-3), SmallInt(300), Int(-70000), Long(2 ** 40), Float(1.5), Double(-2.25),
+                  Year(19), Time(3600), DateTime(1500000000), Date(1500000000), Text(''), Text('hello')]
+        page = TableLeafPage(4, 2, {7: LeafCell(7, Record(values)), 9: LeafCell(9, Record([Int(1), Null()]))})
+        read = PageReader(bytes(page)).read_page()
+        self.assertEqual((read.page_number, read.page_parent), (4, 2))
+        self.assertEqual(list(read.cells), [7, 9])
+        self.assertEqual([type(value) for value in read.cells[7].values()], [type(value) for value in values])
+        self.assertEqual([str(value) for value in read.cells[7].values()], [str(value) for value in values])
+        self.assertEqual(bytes(read), bytes(page))
+
+    def test_lazy_decoding(self):
+        cells = {row_id: LeafCell(row_id, Record([Int(row_id), Text('name ' + str(row_id)), Double(row_id / 2)]))
+                 for row_id in range(1, 6)}
+        page = PageReader(bytes(TableLeafPage(0, 0, cells))).read_page()
+        matching = page.matching(Condition(0, '>', Int(3)))
+        selected = page.select(SelectArgs([2]), matching)
+        self.assertEqual([[value.value for value in row] for row in selected], [[2.0], [2.5]])
+        record = matching[0].record
+        self.assertEqual([record.is_decoded(index) for index in range(3)], [True, False, True])
+        self.assertFalse(page.cells[1].record.is_decoded(0))
+        self.assertEqual(bytes(page), bytes(TableLeafPage(0, 0, cells)))
+        page.update(UpdateArgs(1, Text('changed'), Condition(0, '=', Int(2))))
+        self.assertEqual(str(PageReader(bytes(page)).read_page().cells[2]), "2: ['2', 'changed', '1.0']")
+
+    def test_packed_cells(self):
+        cells = {row_id: LeafCell(row_id, Record([Int(row_id), Text('name ' + str(row_id))])) for row_id in range(1, 6)}
+        page = PageReader(bytes(TableLeafPage(3, 1, cells))).read_page()
+        self.assertIsInstance(page.cells, PageCells)
+        self.assertEqual((list(page.cells), list(reversed(page.cells)), len(page.cells)), ([1, 2, 3, 4, 5],
+                                                                                          [5, 4, 3, 2, 1], 5))
+        self.assertEqual(str(page.cells[3]), "3: ['3', 'name 3']")
+        self.assertIsNone(page.cells.get(6))
+        self.assertNotIn(6, page.cells)
+        self.assertEqual(page.payload_size(), sum([len(cell) for cell in cells.values()]))
+        page.page_parent = 2
+        self.assertEqual(bytes(page), bytes(TableLeafPage(3, 2, cells)))
+        # the first change gives the page cells of its own
+        page.delete(DeleteArgs(Condition(0, '<', Int(3))))
+        self.assertIsInstance(page.cells, dict)
+        self.assertEqual(list(page.cells), [3, 4, 5])
+        self.assertEqual(page.payload_size(), sum([len(cells[row_id]) for row_id in [3, 4, 5]]))
+
+
+class BTreeTests(unittest.TestCase):
+
+    def table(self, rows: int) -> DavisTable:
+        table = DavisTable("test", columns_metadata=TableColumnsMetadata(
+            {"a": ColumnDefinition("INT", 0), "b": ColumnDefinition("TEXT", 1)}))
+        table.insert([[str(i), 'value ' + str(i)] for i in range(rows)])
+        return table
+
+    def assert_tree(self, table: DavisTable):
+        for page_number in range(table.page_count()):
+            page = table.page(page_number)
+            self.assertEqual(page.page_number, page_number)
+            self.assertEqual(len(bytes(page)), PAGE_SIZE)
+            if isinstance(page, TableInteriorPage):
+                for child_page in page.child_pages():
+                    self.assertEqual(table.page(child_page).page_parent, page_number)
+
+    def test_root_split(self):
+        table = self.table(100)
+        self.assertIsInstance(table.root(), TableInteriorPage)
+        self.assertEqual(table.depth(), 2)
+        self.assert_tree(table)
+        self.assertEqual([cell.row_id for leaf in table.leaves() for cell in leaf.cells.values()],
+                         list(range(1, 101)))
+
+    def test_point_and_range_lookup(self):
+        table = self.table(5000)
+        self.assertEqual(table.depth(), 3)
+        self.assert_tree(table)
+        self.assertEqual(str(table.find(1234)[0]), '1233')
+        self.assertEqual(len(list(table.leaves(1234, 1234))), 1)
+        self.assertEqual([str(row[0]) for row in table.select("rowid", "=", "4000")], ['3999'])
+        self.assertEqual([str(row[0]) for row in table.select("rowid", ">", "4997")], ['4997', '4998', '4999'])
+        self.assertEqual(len(table.select("rowid", "<=", "10")), 10)
+
+    def test_update_splits_overflowing_leaf(self):
+        table = self.table(200)
+        table.update("b", "x" * 100, "a", "<", "50")
+        self.assert_tree(table)
+        self.assertEqual(table.row_count(), 200)
+        self.assertEqual(len(table.select("b", "=", "x" * 100)), 50)
+
+    def test_read_interior_pages(self):
+        table = self.table(3000)
+        table.delete("a", ">=", "1000")
+        data = bytes(table)
+        pages = [PageReader(data[i:i + PAGE_SIZE]).read_page() for i in range(0, len(data), PAGE_SIZE)]
+        read = DavisTable("test", columns_metadata=table.columns_metadata, pages=pages)
+        self.assert_tree(read)
+        self.assertEqual(read.row_count(), 1000)
+        self.assertEqual(read.max_row_id(), 1000)
+        self.assertEqual(str(read.find(500)[1]), 'value 499')
+
+    def test_leaf_page_size_is_tracked(self):
+        table = self.table(300)
+        table.update("b", "longer value", "a", "<", "40")
+        table.delete("a", ">=", "250")
+        table.insert([['1000', 'x' * 30]])
+        for leaf in table.leaves():
+            self.assertEqual(leaf.payload_size(), sum([len(cell) for cell in leaf.cells.values()]))
+            self.assertEqual(PageReader(bytes(leaf)).read_page().payload_size(), leaf.payload_size())
+
+
+def create_database(folder: str, rows: int = 0) -> DavisBase:
+    davis_base = DavisBase(folder, buffer_pool_pages=8)
+    davis_base.create_table("t", TableColumnsMetadata({"a": ColumnDefinition("INT", 0),
+                                                       "b": ColumnDefinition("TEXT", 1)}))
+    for i in range(rows):
+        davis_base.insert("t", [str(i), 'row ' + str(i)], ["a", "b"])
+    davis_base.commit()
+    return davis_base
+
+
+class RowIdDirectoryTests(unittest.TestCase):
+
+    @staticmethod
+    def descend(table: DavisTable, row_id: int) -> int:
+        page = table.root()
+        while isinstance(page, TableInteriorPage):
+            page = table.page(page.child_page(row_id))
+        return page.page_number
+
+    def assert_directory(self, table: DavisTable):
+        directory = table.row_id_directory()
+        self.assertEqual(len(directory), len([page for page in map(table.page, range(table.page_count()))
+                                              if isinstance(page, TableLeafPage)]))
+        for row_id in range(0, table.current_row_id + 10, 7):
+            self.assertEqual(directory.page_for(row_id), self.descend(table, row_id))
+        table.directory = None
+        self.assertEqual(list(table.row_id_directory().fences), list(directory.fences))
+        self.assertEqual(list(table.row_id_directory().page_numbers), list(directory.page_numbers))
+
+    def test_directory_follows_splits_and_merges(self):
+        table = DavisTable("test", columns_metadata=TableColumnsMetadata(
+            {"a": ColumnDefinition("INT", 0), "b": ColumnDefinition("TEXT", 1)}))
+        table.insert([[str(i), 'value ' + str(i)] for i in range(100)])
+        table.row_id_directory()
+        table.insert([[str(i), 'value ' + str(i)] for i in range(100, 5000)])
+        self.assert_directory(table)
+        table.update("b", "x" * 100, "a", "<", "300")
+        self.assert_directory(table)
+        table.delete_where(table.where(("or", [("a", "<", "2000"), ("a", ">", "4990")])))
+        self.assert_directory(table)
+        self.assertEqual([str(row[0]) for row in table.select("rowid", "=", "2500", ["b"])], ['value 2499'])
+
+    def test_point_statements_read_one_page(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 3000)
+        table = davis_base.tables["t"]
+        leaf = table.leaf_for(1500)
+        first, second = list(leaf.cells)[1:3]
+        fetched = []
+        fetch = davis_base.pool.fetch
+
+        def counting_fetch(file, page_number):
+            fetched.append(page_number)
+            return fetch(file, page_number)
+        davis_base.pool.fetch = counting_fetch
+        davis_base.update_where("t", "b", "changed", ("rowid", "=", str(first)))
+        davis_base.delete_where("t", ("rowid", "=", str(second)))
+        self.assertEqual(fetched, [leaf.page_number] * 2)
+        self.assertEqual([str(row[0]) for row in davis_base.select_where("t", ("rowid", ">=", str(first)), ["b"],
+                                                                         limit=2)], ['changed', 'row ' + str(second)])
+
+
+class BufferPoolTests(unittest.TestCase):
+
+    def test_pool_stays_bounded(self):
+        folder = tempfile.mkdtemp()
+        create_database(folder, 2000)
+        davis_base = DavisBase(folder, buffer_pool_pages=8)
+        self.assertEqual([str(row[0]) for row in davis_base.select("t", "a", ">=", "1998", ["b"])],
+                         ['row 1998', 'row 1999'])
+        self.assertGreater(davis_base.tables["t"].page_count(), 8)
+        self.assertLessEqual(len(davis_base.pool), 8)
+
+    def test_dirty_and_pinned_pages_are_not_evicted(self):
+        folder = tempfile.mkdtemp()
+        create_database(folder, 2000)
+        davis_base = DavisBase(folder, buffer_pool_pages=8)
+        davis_base.update("t", "b", "changed", "a", "<", "1000")
+        leaves = davis_base.tables["t"].leaves()
+        first = next(leaves)
+        self.assertEqual(davis_base.pool.frames[(davis_base.tables["t"].file, first.page_number)].pin_count, 1)
+        leaves.close()
+        self.assertEqual(davis_base.pool.frames[(davis_base.tables["t"].file, first.page_number)].pin_count, 0)
+        self.assertGreater(len(davis_base.pool), 8)
+        davis_base.commit()
+        self.assertLessEqual(len(davis_base.pool), 8)
+        self.assertEqual(len(DavisBase(folder).select("t", "b", "=", "changed")), 1000)
+
+
+class CommitTests(unittest.TestCase):
+
+    def test_one_row_update_writes_one_page(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 3000)
+        table = davis_base.tables["t"]
+        self.assertEqual(davis_base.tables["davisbase_tables"].dirty_pages(), [])
+        davis_base.update("t", "b", "changed", "a", "=", "1500")
+        self.assertEqual(len(table.dirty_pages()), 1)
+        davis_base.insert("t", ['3000', 'last'], ["a", "b"])
+        self.assertEqual(len(table.dirty_pages()), 2)
+        self.assertEqual(len(davis_base.tables["davisbase_tables"].dirty_pages()), 1)
+        file_size = table.file.file_size
+        davis_base.commit()
+        self.assertEqual(table.dirty_pages(), [])
+        self.assertEqual(table.file.file_size, file_size)
+        reopened = DavisBase(folder)
+        self.assertEqual([str(row[0]) for row in reopened.select("t", "b", "=", "changed", ["a"])], ['1500'])
+        self.assertEqual([str(row[0]) for row in reopened.select("t", "a", "=", "3000", ["b"])], ['last'])
+        self.assertEqual(reopened.tables["t"].row_count(), 3001)
+
+
+class InsertManyTests(unittest.TestCase):
+
+    def test_insert_many(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 10)
+        davis_base.create_index("t", "a")
+        davis_base.insert_many("t", [[str(i), 'row ' + str(i)] for i in range(10, 3000)], ["a", "b"])
+        davis_base.insert_many("t", [['x'], ['y']], ["b"])
+        davis_base.commit()
+        reopened = DavisBase(folder)
+        self.assertEqual(len(reopened.select("t", "rowid", ">", "0")), 3002)
+        self.assertEqual([str(row[0]) for row in reopened.select("t", "rowid", ">=", "3001", ["a"])], ['NULL', 'NULL'])
+        self.assertEqual([str(row[0]) for row in reopened.select("t", "a", "=", "2999", ["b"])], ['row 2999'])
+        self.assertEqual([str(row[0]) for row in reopened.select("davisbase_tables", "table_name", "=", "t",
+                                                                 ["table_rowid"])], ['3003'])
+
+    def test_rows_of_the_wrong_length_are_rejected(self):
+        davis_base = create_database(tempfile.mkdtemp(), 2)
+        with self.assertRaises(ValueError):
+            davis_base.insert_many("t", [['5', 'five'], ['6', 'six', 'extra']], ["a", "b"])
+        with self.assertRaises(ValueError):
+            davis_base.insert_many("t", [['7']], ["a", "b"])
+        with self.assertRaises(ValueError):
+            davis_base.insert("t", ['8'])
+        self.assertEqual(len(davis_base.select("t", "rowid", ">", "0")), 2)
+
+
+class MmapTests(unittest.TestCase):
+
+    def test_mapped_pages_match_file_reads(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 1000)
+        path = davis_base.tables["t"].file.path
+        mapped = TableFile(path, use_mmap=True)
+        self.assertIsInstance(mapped.page_bytes(1), memoryview)
+        self.assertEqual(bytes(mapped.page_bytes(3)), TableFile(path).page_bytes(3))
+        self.assertEqual([str(page) for page in mapped.read_pages()], [str(page) for page in TableFile(path).read_pages()])
+
+    def test_commit_after_mapped_reads(self):
+        folder = tempfile.mkdtemp()
+        create_database(folder, 1000)
+        davis_base = DavisBase(folder, use_mmap=True)
+        self.assertEqual(len(davis_base.select("t", "a", "<", "10")), 10)
+        for i in range(1000, 1500):
+            davis_base.insert("t", [str(i), 'row ' + str(i)], ["a", "b"])
+        davis_base.commit()
+        self.assertEqual(len(davis_base.select("t", "a", ">=", "990")), 510)
+        self.assertEqual(len(DavisBase(folder, use_mmap=False).select("t", "a", ">=", "0")), 1500)
+
+
+class VectorizedScanTests(unittest.TestCase):
+
+    def test_vectorized_scan_matches_row_scan(self):
+        metadata = TableColumnsMetadata({"a": ColumnDefinition("INT", 0), "b": ColumnDefinition("TEXT", 1),
+                                         "c": ColumnDefinition("FLOAT", 2), "d": ColumnDefinition("SMALLINT", 3)})
+        tables = []
+        for vectorized in [False, True]:
+            table = DavisTable("test", columns_metadata=metadata, vectorized=vectorized)
+            table.insert([[str(i), 'v' * (i % 7), str(i / 10), str(i % 300 - 150)] for i in range(3000)])
+            table.insert([['5000', 'no d', '1.5']], ["a", "b", "c"])
+            pages = [PageReader(bytes(table.page(n))).read_page() for n in range(table.page_count())]
+            table = DavisTable("test", columns_metadata=metadata, pages=pages, vectorized=vectorized)
+            table.update("b", "changed", "a", "<", "20")
+            tables.append(table)
+        self.assertTrue(tables[1].condition("c", ">", "0.1").vectorized)
+        self.assertFalse(tables[1].condition("b", ">", "x").vectorized)
+        for column, operator, value in [("a", ">=", "1500"), ("c", "<", "0.3"), ("c", "=", "0.1"), ("d", "=", "-3"),
+                                        ("d", "!=", "-3"), ("a", "<=", "25")]:
+            scanned, vectorized = [[[str(value) for value in row] for row in table.select(column, operator, value)]
+                                   for table in tables]
+            self.assertEqual(vectorized, scanned)
+        for table in tables:
+            table.delete("a", ">=", "2500")
+        self.assertEqual(tables[1].row_count(), tables[0].row_count())
+
+
+class PredicateTests(unittest.TestCase):
+
+    def test_compound_conditions(self):
+        metadata = TableColumnsMetadata({"a": ColumnDefinition("INT", 0), "b": ColumnDefinition("TEXT", 1),
+                                         "c": ColumnDefinition("DOUBLE", 2)})
+        rows = [[str(i), 'v' + str(i % 5), str(i / 4)] for i in range(1000)]
+        tables = [DavisTable("test", columns_metadata=metadata, vectorized=vectorized) for vectorized in [False, True]]
+        for table in tables:
+            table.insert(rows)
+            table.insert([['1000', 'no c']], ["a", "b"])
+        clauses = [
+            (("and", [("a", ">=", "100"), ("a", "<", "110"), ("not", ("b", "=", "v3"))]),
+             lambda a, b, c: 100 <= a < 110 and b != 'v3'),
+            (("or", [("a", "<", "3"), ("c", "is null"), ("not", ("a", "<>", "500"))]),
+             lambda a, b, c: a < 3 or c is None or a == 500),
+            (("and", [("c", "is not null"), ("or", [("a", "=", "7"), ("c", ">", "248.5")])]),
+             lambda a, b, c: c is not None and (a == 7 or c > 248.5)),
+            (("and", [("rowid", ">", "10"), ("rowid", "<=", "20"), ("b", "!=", "v0")]),
+             lambda a, b, c: 9 < a <= 19 and b != 'v0'),
+        ]
+        self.assertTrue(tables[1].where(clauses[1][0]).vectorized)
+        self.assertFalse(tables[1].where(clauses[3][0]).vectorized)
+        self.assertEqual(tables[0].where(clauses[3][0]).row_id_range(), (11, 20))
+        for clause, expected in clauses:
+            rows = [[row[0].value for row in table.select_where(table.where(clause), ["a"])] for table in tables]
+            self.assertEqual(rows[0], rows[1])
+            self.assertEqual(rows[0], [row[0].value for row in tables[0].select_where(tables[0].where())
+                                       if expected(row[0].value, row[1].value, row[2].value)])
+        self.assertEqual(len(tables[0].select("c", ">", "1000")), 0)
+
+    def test_where_statements(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 500)
+        davis_base.create_index("t", "a")
+        where = ("and", [("b", "<>", "row 3"), ("a", "<", "5")])
+        table = davis_base.tables["t"]
+        self.assertEqual(table.indexed_condition(table.where(where)).column_index, 0)
+        self.assertEqual([str(row[0]) for row in davis_base.select_where("t", where, ["a"])], ['0', '1', '2', '4'])
+        davis_base.update_where("t", "b", "small", ("or", [("a", "<", "2"), ("a", ">", "497")]))
+        davis_base.delete_where("t", ("and", [("b", "=", "small"), ("not", ("a", "=", "1"))]))
+        self.assertEqual([str(row[0]) for row in davis_base.select_where("t", ("b", "=", "small"), ["a"])], ['1'])
+        self.assertEqual(len(davis_base.select_where("t")), 497)
+
+
+class CursorTests(unittest.TestCase):
+
+    def test_limit_stops_the_scan(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 3000)
+        table = davis_base.tables["t"]
+        cursor = davis_base.cursor("t", ("a", ">=", "100"), ["a"])
+        self.assertEqual(str(next(cursor)[0]), '100')
+        pinned = [key for key, frame in davis_base.pool.frames.items() if frame.pin_count]
+        self.assertEqual(len(pinned), 1)
+        cursor.close()
+        self.assertTrue(all([frame.pin_count == 0 for frame in davis_base.pool.frames.values()]))
+        read = []
+        original_read_page = table.file.read_page
+        table.file.read_page = lambda page_number: read.append(page_number) or original_read_page(page_number)
+        davis_base.pool.discard(table.file)
+        rows = davis_base.select_where("t", ("a", ">=", "100"), ["a"], limit=5, offset=40)
+        self.assertEqual([str(row[0]) for row in rows], ['140', '141', '142', '143', '144'])
+        self.assertLess(len(read), 10)
+        self.assertEqual([str(row[0]) for row in davis_base.select_where("t", None, ["a"], offset=2998)],
+                         ['2998', '2999'])
+        self.assertEqual(davis_base.select_where("t", None, ["a"], limit=0), [])
+
+
+class ParallelScanTests(unittest.TestCase):
+
+    def test_parallel_scan_matches_serial_scan(self):
+        folder = tempfile.mkdtemp()
+        create_database(folder, 3000)
+        serial = DavisBase(folder, scan_workers=1)
+        parallel = DavisBase(folder, scan_workers=2)
+        parallel.scanner.min_pages = 1
+        try:
+            where = ("or", [("a", "<", "40"), ("b", "=", "row 2500"), ("a", ">", "2990")])
+            parallel.load_table_if_not_loaded("t")
+            self.assertTrue(parallel.tables["t"].scans_in_parallel(parallel.tables["t"].where(where)))
+            for davis_base in [serial, parallel]:
+                davis_base.update("t", "b", "changed", "a", "=", "5")
+                davis_base.commit()
+            rows = [[[str(value) for value in row] for row in davis_base.select_where("t", where, offset=1)]
+                    for davis_base in [serial, parallel]]
+            self.assertEqual(rows[0], rows[1])
+            self.assertEqual(len(rows[1]), 49)
+            self.assertEqual(parallel.count_where("t", ("a", ">=", "100")), 2900)
+            parallel.delete("t", "a", "<", "10")
+            self.assertFalse(parallel.tables["t"].scans_in_parallel(parallel.tables["t"].where()))
+            self.assertEqual(parallel.count_where("t"), 2990)
+        finally:
+            parallel.scanner.close()
+
+
+class IndexTests(unittest.TestCase):
+    def test_paged_index_round_trip(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 't_a.ndx')
+            tree = Index_Btree(8, path)
+            for row_id in range(1, 2001):
+                tree.insert(['key %d' % (row_id % 500), row_id])
+            for row_id in range(1, 2001, 3):
+                tree.remove('key %d' % (row_id % 500), row_id)
+            tree.flush()
+            self.assertEqual(os.path.getsize(path), tree.page_count * 512)
+            expected = sorted([['key %d' % (row_id % 500), row_id] for row_id in range(1, 2001) if row_id % 3 != 1])
+            self.assertEqual(list(Index_Btree(8, path)), expected)
+
+    def test_change_touches_one_path(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 't_a.ndx')
+            tree = Index_Btree(32, path)
+            for row_id in range(10000):
+                tree.insert([row_id * 7 % 10007, row_id])
+            tree.flush()
+            tree = Index_Btree(32, path)
+            tree.insert([5, -1])
+            self.assertLess(len(tree.nodes), 8)
+            self.assertLess(len(tree.dirty), 4)
+            tree.flush()
+            self.assertIn([5, -1], Index_Btree(32, path))
+
+    def test_search_and_range(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 't_a.ndx')
+            tree = Index_Btree(16, path)
+            for row_id in range(5000):
+                tree.insert([row_id % 1000, row_id])
+            tree.flush()
+            tree = Index_Btree(16, path)
+            self.assertIn(tree.search(10), [10, 1010, 2010, 3010, 4010])
+            self.assertIsNone(tree.search(1000))
+            self.assertEqual(sorted(tree.search_all(10)), [10, 1010, 2010, 3010, 4010])
+            self.assertEqual(list(tree.range(998, include_lo=False)),
+                             [[999, 999], [999, 1999], [999, 2999], [999, 3999], [999, 4999]])
+            self.assertEqual([element[0] for element in tree.range(5, 7, include_hi=False)], [5] * 5 + [6] * 5)
+            self.assertLess(len(tree.nodes), 12)
+
+    def test_bulk_load(self):
+        elements = [[row_id * 7919 % 10007, row_id] for row_id in range(10000)]
+        inserted = Index_Btree(32)
+        for element in elements:
+            inserted.insert(element)
+        loaded = Index_Btree(32)
+        loaded.bulk_load(elements, 1.0)
+        self.assertEqual(list(loaded), sorted(elements))
+        self.assertLess(loaded.page_count, inserted.page_count * 0.85)
+        self.assertTrue(all([len(bytes(node)) == 512 for node in loaded.nodes.values()]))
+        for row_id in range(0, 10000, 2):
+            loaded.remove(row_id * 7919 % 10007, row_id)
+        loaded.insert([5, -1])
+        self.assertEqual(list(loaded), sorted([element for element in elements if element[1] % 2] + [[5, -1]]))
+        with self.assertRaises(ValueError):
+            loaded.bulk_load(elements)
+
+    def test_texts_longer_than_a_key(self):
+        davis_base = create_database(tempfile.mkdtemp(), 5)
+        davis_base.create_index("t", "b")
+        # prefixes cut between characters of different widths, ties on the prefix and texts around the key size
+        texts = ['x' * 98 + 'a' * 20, 'x' * 98 + '\u00e9' + 'z' * 10, 'x' * 98 + 'aa', 'x' * 102 + '\u20ac' + 'q',
+                 'x' * 102 + 'b', 'x' * 103, 'x' * 104, 'y' * 150, 'x' * 98 + 'a' * 30]
+        davis_base.insert_many("t", [[str(10 + i), text] for i, text in enumerate(texts)], ["a", "b"])
+        davis_base.update_where("t", "b", 'x' * 98 + '\u00e9' + 'y' * 40, ("a", "=", "2"))
+        davis_base.delete_where("t", ("b", "=", 'y' * 150))
+        complements = {"=": "!=", ">": "<=", ">=": "<", "<": ">=", "<=": ">"}
+        values = texts + ['x' * 98 + '\u00e9' + 'y' * 40, 'x' * 98, 'x' * 100, 'row 3', 'x' * 102 + '\u20ac']
+        for value in values:
+            for operator, complement in complements.items():
+                indexed = davis_base.select_where("t", ("b", operator, value), ["a"])
+                scanned = davis_base.select_where("t", ("not", ("b", complement, value)), ["a"])
+                self.assertEqual([str(row[0]) for row in indexed], [str(row[0]) for row in scanned],
+                                 (operator, value))
+        self.assertEqual([str(row[0]) for row in davis_base.select_where("t", ("b", "=", texts[0]), ["a"])], ['10'])
+        davis_base.close()
+
+
+class IndexPlanningTests(unittest.TestCase):
+
+    def test_index_lookups_match_scans(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 2000)
+        davis_base.update("t", "a", "7", "a", ">=", "1990")
+        scans = [davis_base.select("t", "a", operator, "7", ["b"]) for operator in ["=", "<", "<=", ">", ">="]]
+        davis_base.create_index("t", "a")
+        table = davis_base.tables["t"]
+        self.assertIsNotNone(table.index_for(table.condition("a", "=", "7")))
+        self.assertIsNone(table.index_for(table.condition("a", "!=", "7")))
+        for operator, scan in zip(["=", "<", "<=", ">", ">="], scans):
+            self.assertEqual([str(row[0]) for row in davis_base.select("t", "a", operator, "7", ["b"])],
+                             [str(row[0]) for row in scan])
+        self.assertEqual(len(list(table.leaves_matching(table.condition("a", "=", "1500")))), 1)
+
+    def test_index_is_maintained(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 500)
+        davis_base.create_index("t", "a")
+        davis_base.insert("t", ['1000', 'new'], ["a", "b"])
+        davis_base.update("t", "a", "2000", "b", "=", "row 10")
+        davis_base.delete("t", "a", "<", "5")
+        davis_base.commit()
+        reopened = DavisBase(folder)
+        self.assertEqual([str(row[0]) for row in reopened.select("t", "a", "=", "1000", ["b"])], ['new'])
+        self.assertEqual([str(row[0]) for row in reopened.select("t", "a", ">=", "1000", ["b"])], ['row 10', 'new'])
+        self.assertEqual(reopened.select("t", "a", "=", "10"), [])
+        self.assertEqual(len(reopened.select("t", "a", "<", "100")), 94)
+        index = reopened.indexes["t_a"]
+        self.assertEqual(len(list(index.tree)), 496)
+        reopened.drop_table("t")
+        self.assertFalse(os.path.isfile(index.tree.file.path))
+
+
+class WriteAheadLogTests(unittest.TestCase):
+
+    def test_statements_survive_a_crash(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 100)
+        davis_base.create_index("t", "a")
+        davis_base.insert_many("t", [[str(i), 'row ' + str(i)] for i in range(100, 300)], ["a", "b"])
+        davis_base.delete("t", "a", "<", "50")
+        davis_base.update("t", "b", "changed", "a", "=", "60")
+        # no commit, the table files only hold the first 100 rows
+        reopened = DavisBase(folder, buffer_pool_pages=8)
+        self.assertEqual(reopened.count_where("t"), 250)
+        self.assertEqual(str(reopened.select("t", "a", "=", "60", ["b"])[0][0]), 'changed')
+        self.assertEqual(len(reopened.select("t", "a", ">=", "250", ["b"])), 50)
+        self.assertIn("t_a", reopened.indexes)
+        self.assertEqual(os.path.getsize(reopened.fs.wal_path()), 0)
+
+    def test_torn_record_is_ignored(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 10)
+        davis_base.insert("t", ["10", "row 10"], ["a", "b"])
+        davis_base.insert("t", ["11", "row 11"], ["a", "b"])
+        with open(davis_base.fs.wal_path(), "r+b") as log_file:
+            log_file.truncate(os.path.getsize(davis_base.fs.wal_path()) - 10)
+        reopened = DavisBase(folder, buffer_pool_pages=8)
+        self.assertEqual([str(row[0]) for row in reopened.select_where("t", ("a", ">=", "9"), ["a"])], ['9', '10'])
+
+    def test_concurrent_statements_share_fsyncs(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder)
+        davis_base.wal.group_commit_delay = 0.005
+
+        def insert(first):
+            for i in range(first, first + 20):
+                davis_base.insert("t", [str(i), 'row ' + str(i)], ["a", "b"])
+        threads = [threading.Thread(target=insert, args=(first,)) for first in range(0, 80, 20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLess(davis_base.wal.sync_count, 80)
+        self.assertEqual(davis_base.count_where("t"), 80)
+
+    def test_background_checkpoint(self):
+        folder = tempfile.mkdtemp()
+        davis_base = DavisBase(folder, buffer_pool_pages=8, checkpoint_bytes=16 * 1024)
+        davis_base.create_table("t", TableColumnsMetadata({"a": ColumnDefinition("INT", 0),
+                                                           "b": ColumnDefinition("TEXT", 1)}))
+        for i in range(500):
+            davis_base.insert("t", [str(i), 'row ' + str(i)], ["a", "b"])
+        self.assertIsNotNone(davis_base.checkpointer.thread)
+        self.assertTrue(davis_base.checkpointer.wait(10))
+        self.assertLess(os.path.getsize(davis_base.fs.wal_path()), 64 * 1024)
+        self.assertGreater(os.path.getsize(davis_base.fs.storage_folder_path() + '/t.tbl'), 0)
+        davis_base.close()
+        self.assertEqual(os.path.getsize(davis_base.fs.wal_path()), 0)
+        reopened = DavisBase(folder, buffer_pool_pages=8, wal=False)
+        self.assertEqual(reopened.count_where("t"), 500)
+
+    def test_failed_statements_leave_nothing_behind(self):
+        for wal in (True, False):
+            folder = tempfile.mkdtemp()
+            create_database(folder, 300).close()
+            davis_base = DavisBase(folder, buffer_pool_pages=8, wal=wal)
+            davis_base.create_index("t", "a")
+            # logged but not committed, the failed statements must not undo it
+            davis_base.insert_many("t", [[str(i), 'row ' + str(i)] for i in range(300, 310)], ["a", "b"])
+            tree = davis_base.tables["t"].indexes[0].tree
+            for name, statement in [("insert", lambda: davis_base.insert_many(
+                                        "t", [[str(i), 'new ' + str(i)] for i in range(1000, 2000)], ["a", "b"])),
+                                    ("remove", lambda: davis_base.delete_where("t", ("a", "<", "200")))]:
+                calls = []
+
+                def fail(*args, change=getattr(tree, name)):
+                    calls.append(args)
+                    if len(calls) > 50:
+                        raise RuntimeError("failed partway")
+                    return change(*args)
+                setattr(tree, name, fail)
+                with self.assertRaises(RuntimeError):
+                    statement()
+                delattr(tree, name)
+            davis_base.insert("t", ['5000', 'row 5000'], ["a", "b"])
+            if not wal:
+                davis_base.commit()
+            for database in [davis_base, DavisBase(folder, buffer_pool_pages=8, wal=wal)]:
+                self.assertEqual(database.count_where("t"), 311)
+                self.assertEqual([str(row[0]) for row in database.select_where("t", ("a", ">=", "299"), ["a"])],
+                                 ['299'] + [str(i) for i in range(300, 310)] + ['5000'])
+                self.assertEqual(len(database.select_where("t", ("a", "<", "200"))), 200)
+                self.assertEqual(len(database.select_where("t", ("not", ("a", ">=", "200")))), 200)
+
+
+class FreeSpaceTests(unittest.TestCase):
+
+    def test_deleted_pages_are_reused(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 2000)
+        table = davis_base.tables["t"]
+        page_count = table.page_count()
+        davis_base.delete("t", "a", "<", "1500")
+        self.assertNotEqual(table.root().page_parent, 0)
+        self.assertEqual([str(row[0]) for row in davis_base.select("t", "a", ">=", "1998", ["a"])], ['1998', '1999'])
+        davis_base.insert_many("t", [[str(i), 'row ' + str(i)] for i in range(2000, 3500)], ["a", "b"])
+        # the new rows are a little longer, without the free pages the file would grow by 70 pages
+        self.assertLess(table.page_count(), page_count * 1.1)
+        davis_base.commit()
+        reopened = DavisBase(folder, buffer_pool_pages=8)
+        self.assertEqual(reopened.count_where("t"), 2000)
+        self.assertEqual([str(row[0]) for row in reopened.select_where("t", ("a", "<", "1502"), ["a"])],
+                         ['1500', '1501'])
+
+    def test_underfull_leaves_are_merged(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 2000)
+        table = davis_base.tables["t"]
+        leaves = len(list(table.leaves()))
+        for first in range(0, 2000, 10):
+            davis_base.delete_where("t", ("and", [("a", ">=", str(first)), ("a", "<", str(first + 7))]))
+        remaining = [[str(value) for value in row] for row in davis_base.select_where("t", None, ["a", "b"])]
+        self.assertEqual(remaining, [[str(i), 'row ' + str(i)] for i in range(2000) if i % 10 >= 7])
+        self.assertLess(len(list(table.leaves())), leaves // 2)
+        davis_base.delete("t", "a", ">=", "0")
+        self.assertIsInstance(table.root(), TableLeafPage)
+        davis_base.insert("t", ["1", "row 1"], ["a", "b"])
+        self.assertEqual(davis_base.count_where("t"), 1)
+
+    def test_vacuum(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 3000)
+        davis_base.create_index("t", "a")
+        davis_base.delete_where("t", ("or", [("a", "<", "2500"), ("a", "=", "2700")]))
+        davis_base.commit()
+        path = davis_base.fs.storage_folder_path() + '/t.tbl'
+        size = os.path.getsize(path)
+        davis_base.vacuum("t")
+        davis_base.commit()
+        self.assertLess(os.path.getsize(path), size // 4)
+        reopened = DavisBase(folder, buffer_pool_pages=8)
+        self.assertEqual(reopened.count_where("t"), 499)
+        self.assertEqual(reopened.tables["t"].root().page_parent, 0)
+        self.assertEqual([str(row[0]) for row in reopened.select("t", "a", "=", "2900", ["b"])], ['row 2900'])
+
+
+class OverflowTests(unittest.TestCase):
+
+    @staticmethod
+    def payload(i: int) -> str:
+        return '{"id": %d, "tags": [%s], "note": "caf\u00e9"}' % (i, ', '.join(['"tag %d"' % t for t in range(i % 90)]))
+
+    def create_database(self, folder: str) -> DavisBase:
+        davis_base = DavisBase(folder, buffer_pool_pages=8)
+        davis_base.create_table("t", TableColumnsMetadata({"a": ColumnDefinition("INT", 0),
+                                                           "b": ColumnDefinition("TEXT", 1),
+                                                           "c": ColumnDefinition("TEXT", 2)}))
+        davis_base.insert_many("t", [[str(i), self.payload(i), 'row ' + str(i)] for i in range(300)], ["a", "b", "c"])
+        return davis_base
+
+    def test_long_texts(self):
+        folder = tempfile.mkdtemp()
+        davis_base = self.create_database(folder)
+        rows = davis_base.select_where("t", ("a", ">=", "80"), ["a", "b"], limit=3)
+        self.assertEqual([str(row[1]) for row in rows], [self.payload(i) for i in range(80, 83)])
+        self.assertGreater(len(self.payload(89).encode('utf-8')), PAGE_SIZE)
+        davis_base.update("t", "b", "short", "a", "<", "100")
+        davis_base.update("t", "c", 'x' * 1000, "a", "=", "200")
+        davis_base.delete("t", "a", ">", "250")
+        davis_base.commit()
+        reopened = DavisBase(folder, buffer_pool_pages=8)
+        self.assertEqual(str(reopened.select("t", "b", "=", self.payload(150), ["a"])[0][0]), '150')
+        self.assertEqual([str(value) for value in reopened.select("t", "a", "=", "200", ["b", "c"])[0]],
+                         [self.payload(200), 'x' * 1000])
+        self.assertEqual([str(row[0]) for row in reopened.select("t", "a", "<", "2", ["b"])], ['short', 'short'])
+        self.assertEqual(reopened.count_where("t"), 251)
+
+    def test_freed_chains_are_reused(self):
+        folder = tempfile.mkdtemp()
+        davis_base = self.create_database(folder)
+        table = davis_base.tables["t"]
+        page_count = table.page_count()
+        davis_base.delete("t", "a", ">=", "0")
+        davis_base.insert_many("t", [[str(i), self.payload(i), 'row ' + str(i)] for i in range(300)], ["a", "b", "c"])
+        self.assertLessEqual(table.page_count(), page_count + 2)
+        davis_base.delete("t", "a", "<", "150")
+        davis_base.vacuum("t")
+        self.assertLess(table.page_count(), page_count * 0.75)
+        self.assertEqual([str(row[0]) for row in davis_base.select_where("t", None, ["b"])],
+                         [self.payload(i) for i in range(150, 300)])
+
+    def test_scans_skip_overflow_pages(self):
+        folder = tempfile.mkdtemp()
+        self.create_database(folder).commit()
+        davis_base = DavisBase(folder, buffer_pool_pages=4096)
+
+        def overflow_pages():
+            return len([frame for frame in davis_base.pool.frames.values() if isinstance(frame.page, OverflowPage)])
+        self.assertEqual(len(davis_base.select_where("t", ("c", ">=", "row 2"), ["a", "c"])), 188)
+        self.assertEqual(overflow_pages(), 0)
+        self.assertEqual(str(davis_base.select_where("t", ("a", "=", "200"), ["b"])[0][0]), self.payload(200))
+        self.assertGreater(overflow_pages(), 0)
+
+    def test_parallel_scan_reads_long_texts(self):
+        folder = tempfile.mkdtemp()
+        self.create_database(folder).commit()
+        davis_base = DavisBase(folder, scan_workers=2)
+        davis_base.scanner.min_pages = 1
+        try:
+            rows = davis_base.select_where("t", ("a", ">=", "290"), ["b"])
+            self.assertEqual([str(row[0]) for row in rows], [self.payload(i) for i in range(290, 300)])
+        finally:
+            davis_base.scanner.close()
+
+    def test_update_to_a_wide_row(self):
+        folder = tempfile.mkdtemp()
+        davis_base = DavisBase(folder, buffer_pool_pages=8)
+        columns = ["a", "b", "c", "d", "e", "f"]
+        davis_base.create_table("t", TableColumnsMetadata({name: ColumnDefinition("TEXT", position)
+                                                           for position, name in enumerate(columns)}))
+        davis_base.insert_many("t", [['%s%d' % (name, i) for name in columns] for i in range(20)], columns)
+        for name in columns:
+            davis_base.update_where("t", name, name * 100, ("rowid", "=", "5"))
+        davis_base.close()
+        reopened = DavisBase(folder, buffer_pool_pages=8)
+        self.assertEqual([str(value) for value in reopened.select_where("t", ("rowid", "=", "5"))[0]],
+                         [name * 100 for name in columns])
+        self.assertEqual([str(value) for value in reopened.select_where("t", ("rowid", "=", "6"))[0]],
+                         ['%s5' % name for name in columns])
+        reopened.close()
+
+    def test_single_leaf_table_with_overflow_pages_is_reopened(self):
+        folder = tempfile.mkdtemp()
+        davis_base = DavisBase(folder)
+        davis_base.create_table("t", TableColumnsMetadata({"a": ColumnDefinition("INT", 0),
+                                                           "b": ColumnDefinition("TEXT", 1)}))
+        davis_base.insert("t", ['1', 'A' * 300], ["a", "b"])
+        davis_base.close()
+        reopened = DavisBase(folder)
+        reopened.insert("t", ['2', 'B' * 300], ["a", "b"])
+        reopened.close()
+        reopened = DavisBase(folder)
+        self.assertEqual([str(row[0]) for row in reopened.select_where("t", None, ["b"])], ['A' * 300, 'B' * 300])
+        reopened.close()
+
+
+class RecordEncoderTests(unittest.TestCase):
+
+    def test_same_bytes_as_record(self):
+        encoder = RecordEncoder.for_types([1, 3, 114, 5, 6, 114, 9])
+        self.assertIs(RecordEncoder.for_types((1, 3, 114, 5, 6, 114, 9)), encoder)
+        rows = [[TinyInt(-3), Int(70000), Text('caf\u00e9'), Float(1.5), Double(-2.25), Text(''), DateTime(1500000000)],
+                [TinyInt(1), Null(), Text('a'), Float(0.0), Null(), Text('b' * 20), DateTime(0)],
+                [TinyInt(1), Int(2), OverflowText(500, 7), Float(0.5), Double(1.0), Text('c'), DateTime(0)]]
+        for values in rows:
+            encoded = Record(values, encoder)
+            self.assertEqual(bytes(encoded), bytes(Record(values)))
+            self.assertEqual(len(encoded), len(Record(values)))
+        self.assertIsNone(encoder.encode(rows[1]))
+        self.assertIsNotNone(encoder.encode(rows[0]))
+
+    def test_table_records_read_back(self):
+        table = DavisTable("t", columns_metadata=TableColumnsMetadata({"a": ColumnDefinition("INT", 0),
+                                                                       "b": ColumnDefinition("TEXT", 1),
+                                                                       "c": ColumnDefinition("DOUBLE", 2)}))
+        table.insert([[str(i), 'row %d' % i, str(i / 4)] for i in range(100)], ["a", "b", "c"])
+        table.insert([["100", "0"]], ["a", "c"])
+        self.assertEqual([str(row[1]) for row in table.select_where(AndCondition(), ["a", "b", "c"])[98:]],
+                         ['row 98', 'row 99', 'NULL'])
+        self.assertEqual([[str(value) for value in row] for row in table.select("a", "=", "10", ["b", "c"])],
+                         [['row 10', '2.5']])
+
+
+class CatalogTests(unittest.TestCase):
+
+    def test_tables_are_opened_without_scanning_the_catalog(self):
+        folder = tempfile.mkdtemp()
+        davis_base = DavisBase(folder)
+        for i in range(50):
+            davis_base.create_table("t%d" % i, TableColumnsMetadata({"a": ColumnDefinition("INT", 0),
+                                                                     "b": ColumnDefinition("TEXT", 1)}))
+        davis_base.close()
+        reopened = DavisBase(folder)
+        self.assertEqual(reopened.catalog.table_names()[:3], ['davisbase_tables', 'davisbase_columns', 't0'])
+
+        for table in [reopened.davisbase_tables, reopened.davisbase_columns]:
+            def leaves(low: int = None, high: int = None, table_leaves=table.leaves):
+                # row id lookups are fine, scans of every leaf are not
+                self.assertFalse(low is None and high is None, "the catalog tables were scanned")
+                return table_leaves(low, high)
+            table.leaves = leaves
+        reopened.insert_many("t42", [['1', 'one'], ['2', 'two']], ["a", "b"])
+        self.assertEqual([str(row[0]) for row in reopened.select("t42", "a", "=", "2", ["b"])], ['two'])
+        self.assertEqual(reopened.catalog.current_row_ids["t42"], 3)
+
+    def test_drop_and_create_again(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 3)
+        davis_base.drop_table("t")
+        davis_base.create_table("t", TableColumnsMetadata({"c": ColumnDefinition("DOUBLE", 0)}))
+        davis_base.insert("t", ['1.5'], ["c"])
+        davis_base.close()
+        reopened = DavisBase(folder)
+        self.assertEqual(reopened.catalog.table_names()[-1], 't')
+        self.assertEqual(list(reopened.catalog.columns_metadata("t").columns), ["c"])
+        self.assertEqual([str(row[0]) for row in reopened.select_where("t", None, ["c"])], ['1.5'])
+        self.assertEqual([str(row[0]) for row in reopened.select("davisbase_tables", "table_name", "=", "t",
+                                                                 ["table_rowid"])], ['2'])
+
+    def test_row_ids_of_deleted_rows_are_not_reused(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 5)
+        davis_base.delete_where("t", ("rowid", ">=", "4"))
+        davis_base.close()
+        reopened = DavisBase(folder)
+        reopened.insert("t", ['6', 'row 6'], ["a", "b"])
+        self.assertEqual([row_id for row_id in reopened.tables["t"].leaf_for(6).cells], [1, 2, 3, 6])
+        reopened.close()
+
+    def test_unknown_tables_are_not_created(self):
+        folder = tempfile.mkdtemp()
+        davis_base = create_database(folder, 1)
+        with self.assertRaises(ValueError):
+            davis_base.select_where("nope")
+        with self.assertRaises(ValueError):
+            davis_base.insert("nope", ['1'])
+        davis_base.commit()
+        self.assertNotIn("nope", davis_base.tables)
+        self.assertFalse(os.path.exists(os.path.join(folder, 'storage', 'nope.tbl')))
+        davis_base.close()
+
+
+class StatsTests(unittest.TestCase):
+
+    def test_statements_are_counted_by_table(self):
+        folder = tempfile.mkdtemp()
+        create_database(folder, 300).close()
+        davis_base = DavisBase(folder, buffer_pool_pages=8)
+        self.assertEqual(len(davis_base.select_where("t", ("a", "<", "10"))), 10)
+        stats = davis_base.last_statement_stats()
+        leaves = len(davis_base.tables["t"].row_id_directory())
+        self.assertEqual((stats["cells_decoded"], stats["rows_matched"], stats["pages_written"]), (300, 10, 0))
+        self.assertGreaterEqual(stats["pages_read"], leaves)
+        self.assertGreater(stats["scan_wall"], 0)
+        self.assertGreater(stats["parse_wall"], 0)
+
+        davis_base.select_where("t", ("rowid", "=", "7"))
+        stats = davis_base.last_statement_stats()
+        self.assertEqual((stats["cells_decoded"], stats["rows_matched"]), (1, 1))
+
+        davis_base.update_where("t", "b", "changed", ("rowid", "=", "7"))
+        stats = davis_base.last_statement_stats()
+        self.assertEqual((stats["rows_matched"], stats["pages_written"]), (1, 1))
+        self.assertGreater(stats["bytes_serialized"], PAGE_SIZE)
+        self.assertGreater(stats["commit_wall"], 0)
+
+        # a cursor is counted once it is closed
+        rows = davis_base.cursor("t", ("a", ">=", "295"))
+        self.assertEqual(len(list(rows)), 5)
+        self.assertEqual(davis_base.last_statement_stats()["rows_matched"], 5)
+
+        totals = davis_base.statistics("t")
+        self.assertEqual((totals["statements"], totals["rows_matched"]), (4, 17))
+        self.assertEqual(list(davis_base.statistics()), ["t"])
+        self.assertEqual(davis_base.statistics("missing")["statements"], 0)
+        davis_base.close()
+
+    def test_show_stats(self):
+        davis_base = create_database(tempfile.mkdtemp(), 3)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            davis_base.show_stats()
+        header, line = output.getvalue().splitlines()
+        self.assertEqual(header.split()[:3], ["table", "statements", "pages_read"])
+        self.assertEqual(line.split()[:2], ["t", "4"])
+        davis_base.close()
+
+
+class CliTests(unittest.TestCase):
+
+    def setUp(self):
+        from DavisBaseCLI import prompt
+        self.prompt = prompt
+        self.davis_base = prompt.davis_base = DavisBase(tempfile.mkdtemp())
+
+    def tearDown(self):
+        self.davis_base.close()
+        self.prompt.davis_base = None
+
+    def run_command(self, command: str) -> str:
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.prompt.parseUserCommand(command)
+        return output.getvalue()
+
+    def test_update_sets_one_column(self):
+        self.run_command("create table people (id int, name text, age int);")
+        self.run_command("insert into people (id, name, age) values (1, ann, 30), (2, bob, 40);")
+        self.assertIn("Only one column", self.run_command("update people set name = carl, age = 50 where id = 2;"))
+        self.run_command("update people set age = 41 where id = 2;")
+        self.assertEqual(self.run_command("select name, age from people where id = 2;"), "['bob', '41']\n")
+
+    def test_quoted_values_round_trip(self):
+        self.run_command("create table people (id int, name text);")
+        self.run_command("insert into people (id, name) values (1, 'bob'), (2, \"ann\");")
+        self.assertEqual(self.run_command("select name from people where name = 'bob';"), "['bob']\n")
+        self.assertEqual(self.run_command("select id from people where name = ann;"), "['2']\n")
+        self.run_command("update people set name = 'carl' where name = \"bob\";")
+        self.assertEqual(self.run_command("select name from people where id = 1;"), "['carl']\n")
+
 
 if __name__ == '__main__':
     unittest.main()